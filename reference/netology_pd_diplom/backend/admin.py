@@ -4,7 +4,11 @@ from baton.admin import InputFilter
 from baton.autodiscover import admin
 
 from backend.models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
-    Contact, ConfirmEmailToken
+    Contact, ConfirmEmailToken, ShopOrder
+from backend.catalog import refresh_catalog, refresh_catalog_for
+from backend.reservations import sync_order_state
+from backend.totals import reprice_baskets, update_order_totals
+from backend.versions import bump_category_version, bump_shop_versions
 
 
 class EmailFilter(InputFilter):
@@ -63,8 +67,45 @@ class CustomUserAdmin(UserAdmin):
     )
 
 
+class CatalogRefreshMixin:
+    """
+    Пересобирает каталог (CatalogEntry) для предложений, затронутых правкой в админке.
+    catalog_filter - путь от ProductInfo к редактируемой модели.
+    """
+    catalog_filter = None
+
+    def refresh_catalog(self, obj):
+        refresh_catalog_for(**{self.catalog_filter: obj})
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.refresh_catalog(obj)
+
+    def delete_model(self, request, obj):
+        offers = self.catalog_offers(**{self.catalog_filter: obj})
+        super().delete_model(request, obj)
+        self.refresh_deleted(offers)
+
+    def delete_queryset(self, request, queryset):
+        offers = self.catalog_offers(**{f'{self.catalog_filter}__in': queryset})
+        super().delete_queryset(request, queryset)
+        self.refresh_deleted(offers)
+
+    @staticmethod
+    def catalog_offers(**filters):
+        return list(ProductInfo.objects.filter(**filters).values_list('id', 'shop_id'))
+
+    def refresh_deleted(self, offers):
+        # Уцелевшие предложения пересобираются; строки удаленных ушли каскадом,
+        # поэтому версия их магазинов поднимается отдельно, иначе ETag не изменится
+        refresh_catalog(ProductInfo.objects.filter(id__in=[offer_id for offer_id, _ in offers])
+                        .values_list('id', flat=True))
+        bump_shop_versions(id__in={shop_id for _, shop_id in offers})
+
+
 @admin.register(Shop)
-class ShopAdmin(admin.ModelAdmin):
+class ShopAdmin(CatalogRefreshMixin, admin.ModelAdmin):
+    catalog_filter = 'shop'
     list_display = ('name', 'url', 'state')
     list_filter = ('state',)
     search_fields = ('name',)
@@ -73,16 +114,30 @@ class ShopAdmin(admin.ModelAdmin):
         ('admin/shop_description.html', 'bottom', 'description'),
     ]
 
+    def refresh_catalog(self, obj):
+        super().refresh_catalog(obj)
+        bump_shop_versions(id=obj.id)
+
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(CatalogRefreshMixin, admin.ModelAdmin):
+    catalog_filter = 'product__category'
     list_display = ('name',)
     search_fields = ('name',)
     prepopulated_fields = {"slug": ("name",)}
 
+    def refresh_catalog(self, obj):
+        super().refresh_catalog(obj)
+        bump_category_version()
+
+    def refresh_deleted(self, offers):
+        super().refresh_deleted(offers)
+        bump_category_version()
+
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(CatalogRefreshMixin, admin.ModelAdmin):
+    catalog_filter = 'product'
     list_display = ('name', 'category', 'get_shops')
     list_filter = ('category',)
     search_fields = ('name', 'category__name')
@@ -99,7 +154,8 @@ class ProductAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProductInfo)
-class ProductInfoAdmin(admin.ModelAdmin):
+class ProductInfoAdmin(CatalogRefreshMixin, admin.ModelAdmin):
+    catalog_filter = 'pk'
     list_display = ('product', 'shop', 'quantity', 'price', 'price_rrc')
     list_filter = ('shop',)
     search_fields = ('product__name', 'shop__name')
@@ -108,19 +164,36 @@ class ProductInfoAdmin(admin.ModelAdmin):
         ('shop', admin.RelatedOnlyFieldListFilter),
     )
 
+    def refresh_catalog(self, obj):
+        super().refresh_catalog(obj)
+        reprice_baskets([obj.id])
+
 
 @admin.register(Parameter)
-class ParameterAdmin(admin.ModelAdmin):
+class ParameterAdmin(CatalogRefreshMixin, admin.ModelAdmin):
+    catalog_filter = 'product_parameters__parameter'
     list_display = ('name',)
     search_fields = ('name',)
 
 
 @admin.register(ProductParameter)
-class ProductParameterAdmin(admin.ModelAdmin):
+class ProductParameterAdmin(CatalogRefreshMixin, admin.ModelAdmin):
     list_display = ('product_info', 'parameter', 'value')
     list_filter = ('parameter',)
     search_fields = ('product_info__product__name', 'parameter__name')
 
+    def refresh_catalog(self, obj):
+        refresh_catalog([obj.product_info_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.refresh_catalog(obj)
+
+    def delete_queryset(self, request, queryset):
+        offer_ids = set(queryset.values_list('product_info_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_catalog(offer_ids)
+
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -143,7 +216,7 @@ class OrderAdmin(admin.ModelAdmin):
     )
 
     def total_sum(self, obj):
-        return sum(item.quantity * item.product_info.price for item in obj.ordered_items.all())
+        return obj.items_total
     total_sum.short_description = 'Total Sum'
 
     def total_sum_formatted(self, obj):
@@ -164,6 +237,24 @@ class OrderAdmin(admin.ModelAdmin):
     state_badge.allow_tags = True
     state_badge.short_description = 'State'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Отмена возвращает товар на склад, прием магазином снимает срок резерва
+        if change and 'state' in form.changed_data:
+            sync_order_state(obj.id, obj.state)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Позиции правятся во вложенной форме: сумма пересчитывается после их сохранения
+        update_order_totals(id=form.instance.id)
+
+
+@admin.register(ShopOrder)
+class ShopOrderAdmin(admin.ModelAdmin):
+    list_display = ('order', 'shop', 'state', 'items_total', 'items_count', 'created_at')
+    list_filter = ('state', 'shop')
+    search_fields = ('order__user__email', 'shop__name')
+
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -172,9 +263,22 @@ class OrderItemAdmin(admin.ModelAdmin):
     search_fields = ('order__user__email', 'product_info__product__name')
 
     def total_price(self, obj):
-        return obj.quantity * obj.product_info.price
+        return obj.quantity * (obj.product_info.price if obj.price is None else obj.price)
     total_price.short_description = 'Total Price'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        update_order_totals(id=obj.order_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        update_order_totals(id=obj.order_id)
+
+    def delete_queryset(self, request, queryset):
+        order_ids = set(queryset.values_list('order_id', flat=True))
+        super().delete_queryset(request, queryset)
+        update_order_totals(id__in=order_ids)
+
 
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
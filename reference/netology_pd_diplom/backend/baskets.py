@@ -0,0 +1,278 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from backend.models import Order, OrderItem, ProductInfo
+from backend.projections import format_datetime, project_basket, project_orders
+from backend.totals import update_order_totals
+
+# Где хранятся корзины: 'database' - строки Order/OrderItem, 'cache' - кэш с отложенной записью в базу
+BASKET_BACKEND = getattr(settings, 'BASKET_BACKEND', 'database')
+# Кэш для корзин при BASKET_BACKEND = 'cache'
+BASKET_CACHE = getattr(settings, 'BASKET_CACHE', 'default')
+# Сколько корзина живет в кэше без изменений (после этого читается из базы)
+BASKET_TIMEOUT = getattr(settings, 'BASKET_TIMEOUT', 7 * 24 * 60 * 60)
+
+BASKET_KEY = 'basket:{user_id}'
+BASKET_DIRTY_KEY = 'basket:dirty'
+
+
+class BasketError(ValueError):
+    """
+    Ошибка изменения корзины: ни одна строка запроса не применяется
+    """
+
+
+def _positive_int(value, field):
+    # bool - подкласс int, но количество True не имеет смысла
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise BasketError(f'Поле {field} должно быть целым числом больше нуля')
+    return value
+
+
+def parse_lines(items, key):
+    """
+    Проверяет строки запроса вида [{key: id, 'quantity': n}, ...] и сводит
+    повторы одного id в одну строку. Возвращает {id: количество}.
+    """
+    if not isinstance(items, list) or not items:
+        raise BasketError('Неверный формат запроса')
+    lines = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise BasketError('Неверный формат запроса')
+        line_id = _positive_int(item.get(key), key)
+        lines[line_id] = lines.get(line_id, 0) + _positive_int(item.get('quantity'), 'quantity')
+    return lines
+
+
+def check_offers(offer_ids):
+    """
+    Проверяет одним запросом, что предложения есть и их магазины принимают заказы
+    """
+    available = set(ProductInfo.objects.filter(id__in=offer_ids, shop__state=True).values_list('id', flat=True))
+    missing = sorted(set(offer_ids) - available)
+    if missing:
+        raise BasketError(f'Предложения недоступны: {", ".join(map(str, missing))}')
+
+
+def add_items(basket, lines):
+    """
+    Добавляет предложения в корзину: {id предложения: количество}.
+
+    Все предложения проверяются одним запросом; если какого-то нет или магазин
+    не принимает заказы, корзина не меняется. Новые строки вставляются, у уже
+    лежащих в корзине заменяется количество - одним INSERT ... ON CONFLICT.
+    """
+    check_offers(lines)
+    now = timezone.now()
+    with transaction.atomic():
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=basket, product_info_id=offer_id, quantity=quantity, created_at=now, updated_at=now)
+             for offer_id, quantity in lines.items()],
+            update_conflicts=True,
+            unique_fields=('order', 'product_info'),
+            update_fields=('quantity', 'updated_at')
+        )
+        update_order_totals(id=basket.id)
+    return len(lines)
+
+
+def update_items(basket, lines):
+    """
+    Меняет количество в строках корзины: {id строки: количество}.
+    Если какой-то строки нет в корзине, не меняется ни одна; иначе все
+    количества пишутся одним UPDATE ... CASE.
+    """
+    with transaction.atomic():
+        items = list(OrderItem.objects.select_for_update().filter(order=basket, id__in=lines))
+        missing = sorted(set(lines) - {item.id for item in items})
+        if missing:
+            raise BasketError(f'Позиций нет в корзине: {", ".join(map(str, missing))}')
+
+        now = timezone.now()
+        for item in items:
+            item.quantity = lines[item.id]
+            item.updated_at = now
+        OrderItem.objects.bulk_update(items, ('quantity', 'updated_at'))
+        update_order_totals(id=basket.id)
+    return len(items)
+
+
+def delete_items(basket, item_ids):
+    """
+    Удаляет строки корзины одним DELETE
+    """
+    with transaction.atomic():
+        deleted = OrderItem.objects.filter(order=basket, id__in=item_ids).delete()[0]
+        if deleted:
+            update_order_totals(id=basket.id)
+    return deleted
+
+
+class DatabaseBasketStore:
+    """
+    Корзина в строках Order(state='basket') и OrderItem, каждое изменение пишется в базу
+    """
+
+    def _basket(self, user_id):
+        return Order.objects.get_or_create(user_id=user_id, state='basket')[0]
+
+    def orders(self, user_id):
+        return project_orders(Order.objects.filter(user_id=user_id, state='basket'))
+
+    def add(self, user_id, lines):
+        return add_items(self._basket(user_id), lines)
+
+    def update(self, user_id, lines):
+        return update_items(self._basket(user_id), lines)
+
+    def delete(self, user_id, item_ids):
+        return delete_items(self._basket(user_id), item_ids)
+
+    def flush(self, user_id):
+        pass
+
+    def forget(self, user_id):
+        pass
+
+
+class CacheBasketStore:
+    """
+    Корзина в кэше (Redis в боевых настройках, LocMem в тестах) с отложенной записью.
+
+    Правки корзины меняют только запись в кэше; строки OrderItem пишутся при
+    оформлении заказа (flush из OrderView) и периодической задачей flush_baskets_task.
+    Строка Order(state='basket') создается один раз при первом добавлении, чтобы у
+    корзины был постоянный id для оформления. Строка корзины - предложение:
+    id строки в ответе и в PUT/DELETE совпадает с id предложения.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = caches[cache or BASKET_CACHE]
+
+    def _key(self, user_id):
+        return BASKET_KEY.format(user_id=user_id)
+
+    def _load(self, user_id):
+        basket = self.cache.get(self._key(user_id))
+        if basket is not None:
+            return basket
+
+        # В кэше корзины нет (истекла или еще не заводилась) - берем сохраненную в базе
+        order = Order.objects.filter(user_id=user_id, state='basket').values('id', 'dt', 'created_at',
+                                                                            'updated_at').first()
+        basket = {'order': None, 'user': user_id, 'lines': {}}
+        if order:
+            basket.update(order=order['id'], dt=format_datetime(order['dt']),
+                          created_at=format_datetime(order['created_at']),
+                          updated_at=format_datetime(order['updated_at']))
+            for offer_id, quantity, created_at, updated_at in OrderItem.objects.filter(
+                order_id=order['id']
+            ).values_list('product_info_id', 'quantity', 'created_at', 'updated_at'):
+                basket['lines'][str(offer_id)] = [quantity, format_datetime(created_at), format_datetime(updated_at)]
+        return basket
+
+    def _save(self, user_id, basket):
+        basket['updated_at'] = format_datetime(timezone.now())
+        self.cache.set(self._key(user_id), basket, BASKET_TIMEOUT)
+        self._mark_dirty({user_id})
+
+    def _mark_dirty(self, user_ids):
+        # Реестр корзин для периодической записи. Параллельная правка реестра может потерять
+        # отметку - тогда корзина запишется при следующей правке или при оформлении
+        dirty = self.cache.get(BASKET_DIRTY_KEY) or set()
+        if not user_ids <= dirty:
+            self.cache.set(BASKET_DIRTY_KEY, dirty | user_ids, None)
+
+    def orders(self, user_id):
+        basket = self._load(user_id)
+        return [project_basket(basket)] if basket['order'] else []
+
+    def add(self, user_id, lines):
+        check_offers(lines)
+        basket = self._load(user_id)
+        if basket['order'] is None:
+            order = Order.objects.get_or_create(user_id=user_id, state='basket')[0]
+            basket.update(order=order.id, dt=format_datetime(order.dt), created_at=format_datetime(order.created_at))
+        now = format_datetime(timezone.now())
+        for offer_id, quantity in lines.items():
+            line = basket['lines'].get(str(offer_id))
+            basket['lines'][str(offer_id)] = [quantity, line[1] if line else now, now]
+        self._save(user_id, basket)
+        return len(lines)
+
+    def update(self, user_id, lines):
+        basket = self._load(user_id)
+        missing = sorted(offer_id for offer_id in lines if str(offer_id) not in basket['lines'])
+        if missing:
+            raise BasketError(f'Позиций нет в корзине: {", ".join(map(str, missing))}')
+        now = format_datetime(timezone.now())
+        for offer_id, quantity in lines.items():
+            basket['lines'][str(offer_id)][0::2] = [quantity, now]
+        self._save(user_id, basket)
+        return len(lines)
+
+    def delete(self, user_id, item_ids):
+        basket = self._load(user_id)
+        deleted = [item_id for item_id in set(item_ids) if basket['lines'].pop(str(item_id), None)]
+        if deleted:
+            self._save(user_id, basket)
+        return len(deleted)
+
+    def flush(self, user_id):
+        """
+        Записывает корзину из кэша в OrderItem: одна вставка с обновлением и одно удаление.
+        Строки с предложениями, которые импорт успел удалить, выбрасываются из корзины.
+        Уже оформленный заказ не меняется.
+        """
+        basket = self.cache.get(self._key(user_id))
+        if basket is None or basket['order'] is None:
+            return
+        offer_ids = set(ProductInfo.objects.filter(
+            id__in=[int(offer_id) for offer_id in basket['lines']]
+        ).values_list('id', flat=True))
+        removed = [offer_id for offer_id in basket['lines'] if int(offer_id) not in offer_ids]
+        if removed:
+            for offer_id in removed:
+                del basket['lines'][offer_id]
+            self.cache.set(self._key(user_id), basket, BASKET_TIMEOUT)
+        with transaction.atomic():
+            # Заказ блокируется до записи: если его успели оформить, копия в кэше устарела
+            # и менять позиции уже нельзя - остатки зарезервированы, заказ разделен по магазинам
+            if Order.objects.select_for_update().filter(id=basket['order'], state='basket').first() is None:
+                return
+            OrderItem.objects.filter(order_id=basket['order']).exclude(product_info_id__in=offer_ids).delete()
+            OrderItem.objects.bulk_create(
+                [OrderItem(order_id=basket['order'], product_info_id=int(offer_id), quantity=quantity)
+                 for offer_id, (quantity, _, _) in basket['lines'].items()],
+                update_conflicts=True,
+                unique_fields=('order', 'product_info'),
+                update_fields=('quantity', 'updated_at')
+            )
+            update_order_totals(id=basket['order'])
+
+    def forget(self, user_id):
+        # После оформления корзина стала заказом, следующая начнется с пустой
+        self.cache.delete(self._key(user_id))
+
+    def flush_all(self):
+        """
+        Записывает в базу все измененные корзины. Возвращает число записанных;
+        корзины, которые записать не удалось, остаются в реестре до следующего прохода.
+        """
+        dirty = self.cache.get(BASKET_DIRTY_KEY) or set()
+        self.cache.delete(BASKET_DIRTY_KEY)
+        failed = set()
+        for user_id in dirty:
+            try:
+                self.flush(user_id)
+            except DatabaseError:
+                failed.add(user_id)
+        if failed:
+            self._mark_dirty(failed)
+        return len(dirty) - len(failed)
+
+
+def get_basket_store():
+    return CacheBasketStore() if BASKET_BACKEND == 'cache' else DatabaseBasketStore()
@@ -0,0 +1,251 @@
+import os
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from django.db import connection
+from backend.exports import render_csv_feed, render_jsonl_feed, render_yaml_feed
+
+# Категории генератора по образцу data/shop1.yaml: бренды, линейки и параметры с весами значений.
+# Первые значения встречаются чаще, как в реальных прайсах.
+CATEGORY_TEMPLATES = (
+    {
+        'name': 'Смартфоны',
+        'kind': 'Смартфон',
+        'brands': {'Apple': ('iPhone XS', 'iPhone XR', 'iPhone 11'), 'Samsung': ('Galaxy S20', 'Galaxy Note20'),
+                   'Xiaomi': ('Mi 10T Pro', 'Redmi Note 9'), 'Huawei': ('P40', 'Nova 5T')},
+        'price': (10.5, 0.5),
+        'parameters': {
+            'Диагональ (дюйм)': ('6.1', '6.5', '5.8', '6.7'),
+            'Разрешение (пикс)': ('1792x828', '2688x1242', '2400x1080', '3200x1440'),
+            'Встроенная память (Гб)': ('128', '64', '256', '512'),
+            'Цвет': ('черный', 'белый', 'синий', 'красный', 'золотистый', 'зеленый'),
+        },
+    },
+    {
+        'name': 'Аксессуары',
+        'kind': 'Кабель',
+        'brands': {'Apple': ('Lightning', 'USB-C'), 'Anker': ('PowerLine', 'PowerLine II'), 'Baseus': ('Cafule',)},
+        'price': (7.0, 0.6),
+        'parameters': {
+            'Длина (м)': ('1', '2', '0.5', '3'),
+            'Цвет': ('черный', 'белый', 'серый'),
+        },
+    },
+    {
+        'name': 'Flash-накопители',
+        'kind': 'Flash-накопитель',
+        'brands': {'SanDisk': ('Ultra Flair', 'Cruzer Blade'), 'Kingston': ('DataTraveler', 'DataTraveler Exodia'),
+                   'Transcend': ('JetFlash',)},
+        'price': (7.3, 0.7),
+        'parameters': {
+            'Объем (Гб)': ('32', '64', '16', '128', '256'),
+            'Цвет': ('черный', 'серебристый', 'красный', 'синий'),
+        },
+    },
+    {
+        'name': 'Телевизоры',
+        'kind': 'Телевизор',
+        'brands': {'Samsung': ('QLED Q90R', 'UE55TU7100'), 'LG': ('OLED55CX', 'NanoCell 55NANO'),
+                   'Sony': ('Bravia KD-55', 'Bravia XR-65')},
+        'price': (11.0, 0.6),
+        'parameters': {
+            'Диагональ (дюйм)': ('55', '65', '43', '50', '75'),
+            'Разрешение (пикс)': ('3840x2160', '1920x1080', '7680x4320'),
+            'Smart TV': ('да', 'нет'),
+        },
+    },
+)
+
+# Примерное число товаров на одну категорию генератора
+GOODS_PER_CATEGORY = 500
+
+
+def _weighted(rng, values):
+    # Распределение Ципфа: i-е значение встречается в ~1/i раз реже первого
+    return rng.choices(values, weights=[1 / (index + 1) for index in range(len(values))])[0]
+
+
+def generate_price_list(goods, seed=0, shop='Связной'):
+    """
+    Генерирует прайс-лист в схеме data/shop1.yaml как поток пар (раздел, значение),
+    совместимый с backend.importers.import_feed. Одинаковые goods и seed дают
+    одинаковый прайс, поэтому замеры разных версий кода сравнимы.
+    """
+    rng = random.Random(seed)
+    category_count = max(len(CATEGORY_TEMPLATES), goods // GOODS_PER_CATEGORY)
+    categories = []
+    for index in range(category_count):
+        template = CATEGORY_TEMPLATES[index % len(CATEGORY_TEMPLATES)]
+        number = index // len(CATEGORY_TEMPLATES)
+        name = template['name'] if not number else f"{template['name']} {number + 1}"
+        categories.append((index + 1, name, template))
+
+    yield 'shop', shop
+    for category_id, name, _ in categories:
+        yield 'category', {'id': category_id, 'name': name}
+
+    for index in range(goods):
+        category_id, _, template = rng.choice(categories)
+        brand = _weighted(rng, list(template['brands']))
+        line = rng.choice(template['brands'][brand])
+        parameters = {name: _weighted(rng, values) for name, values in template['parameters'].items()}
+        price = max(100, round(rng.lognormvariate(*template['price']), -1))
+        details = ' '.join(parameters.values())
+        yield 'good', {
+            'id': 1000000 + index,
+            'category': category_id,
+            'model': f'{brand}/{line}'.lower().replace(' ', '-'),
+            'name': f"{template['kind']} {brand} {line} {details} #{index}"[:80],
+            'price': int(price),
+            'price_rrc': int(price * rng.uniform(1.03, 1.2)),
+            'quantity': int(rng.expovariate(1 / 10)),
+            'parameters': parameters,
+        }
+
+
+def write_yaml(sections, file):
+    """
+    Пишет прайс в YAML в схеме data/shop1.yaml
+    """
+    file.writelines(render_yaml_feed(sections))
+
+
+def write_csv(sections, file):
+    """
+    Пишет прайс в CSV в формате backend.feeds.iter_csv_feed
+    """
+    file.writelines(render_csv_feed(sections))
+
+
+def write_jsonl(sections, file):
+    """
+    Пишет прайс в JSON Lines в формате backend.feeds.iter_json_feed
+    """
+    file.writelines(render_jsonl_feed(sections))
+
+
+FEED_WRITERS = {
+    'yaml': ('.yaml', write_yaml),
+    'csv': ('.csv', write_csv),
+    'jsonl': ('.jsonl', write_jsonl),
+}
+
+
+def write_price_list(path, fmt, goods, seed=0):
+    """
+    Генерирует прайс на goods товаров и пишет его в файл в формате fmt
+    """
+    _, writer = FEED_WRITERS[fmt]
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer(generate_price_list(goods, seed), file)
+    return path
+
+
+@contextmanager
+def measure(rows, trace_memory=True):
+    """
+    Замер импорта: время, число SQL-запросов, пиковая память Python (Мб) и строки в секунду.
+    Запросы считаются через execute_wrapper, поэтому журнал запросов не растет.
+    """
+    stats = {'queries': 0}
+
+    def count_queries(execute, sql, params, many, context):
+        stats['queries'] += 1
+        return execute(sql, params, many, context)
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_queries):
+            yield stats
+    finally:
+        seconds = time.perf_counter() - started
+        if trace_memory:
+            stats['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+            tracemalloc.stop()
+        stats['seconds'] = round(seconds, 3)
+        stats['rows_per_sec'] = round(rows / seconds, 1) if seconds else rows
+
+
+@contextmanager
+def serve_directory(directory):
+    """
+    Локальный HTTP-сервер, с которого PartnerUpdate скачивает прайс
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_import(importer, path, user, base_url=None):
+    """
+    Запускает один импорт файла: importer='file' - backend.utils.import_file,
+    importer='partner' - задача обновления прайса PartnerUpdate по ссылке
+    """
+    if importer == 'partner':
+        from backend.models import PriceListSource
+        from backend.tasks import partner_update_task
+        # Иначе повторный замер того же файла получит 304 и импорт не запустится
+        PriceListSource.objects.filter(user=user).delete()
+        result = partner_update_task(user.id, f'{base_url}/{os.path.basename(path)}')
+        if result['status'] != 'success':
+            raise RuntimeError(result.get('error', result['status']))
+        return result['result']
+
+    from backend.utils import import_file
+    return import_file(path, user)
+
+
+def render_orders(orders, fast=True):
+    """
+    Тело ответа списка заказов: fast=True - проекция values() и orjson,
+    иначе OrderSerializer и JSONRenderer, как было до быстрого пути
+    """
+    if fast:
+        from backend.projections import project_orders
+        from backend.renderers import ORJSONRenderer
+        return ORJSONRenderer().render(project_orders(orders))
+
+    from rest_framework.renderers import JSONRenderer
+    from backend.serializers import OrderSerializer
+    orders = orders.select_related('contact').prefetch_related(
+        'ordered_items__product_info__product__category',
+        'ordered_items__product_info__shop',
+        'ordered_items__product_info__product_parameters__parameter',
+    )
+    return JSONRenderer().render(OrderSerializer(orders, many=True).data)
+
+
+def render_products(offer_ids, fast=True):
+    """
+    Тело страницы товаров: fast=True - фрагменты каталога и orjson,
+    иначе ProductInfoSerializer и JSONRenderer
+    """
+    if fast:
+        from backend.fragments import fragment_list_response, render_fragments
+        from backend.models import CatalogEntry
+        entries = CatalogEntry.objects.filter(offer_id__in=offer_ids).order_by('offer_id')
+        return fragment_list_response(render_fragments(entries.values_list('offer_id', 'version'))).content
+
+    from rest_framework.renderers import JSONRenderer
+    from backend.models import ProductInfo
+    from backend.serializers import ProductInfoSerializer
+    offers = ProductInfo.objects.filter(id__in=offer_ids).order_by('id').select_related(
+        'shop', 'product__category'
+    ).prefetch_related('product_parameters__parameter')
+    return JSONRenderer().render({'results': ProductInfoSerializer(offers, many=True).data})
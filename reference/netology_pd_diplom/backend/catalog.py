@@ -0,0 +1,155 @@
+from itertools import islice
+from django.conf import settings
+from django.db.models import Count, Q
+from backend.fragments import invalidate_fragments
+from backend.models import CatalogEntry, CatalogFacet, ProductInfo
+from backend.serializers import ProductInfoSerializer
+from backend.versions import bump_shop_versions
+
+# Сколько предложений пересобирается в каталоге за один запрос
+CATALOG_BATCH_SIZE = getattr(settings, 'CATALOG_BATCH_SIZE', 1000)
+# Сколько значений каждого параметра отдавать в счетчиках фильтров
+CATALOG_FACET_LIMIT = getattr(settings, 'CATALOG_FACET_LIMIT', 50)
+
+# Фильтр по параметрам: filter=<параметр>:<значение>|<значение>
+FACET_SEPARATOR = ':'
+FACET_VALUES_SEPARATOR = '|'
+
+CATALOG_UPDATE_FIELDS = ('shop', 'shop_state', 'category', 'product', 'product_name', 'price', 'quantity',
+                         'discount', 'document', 'version', 'updated_at')
+
+
+def refresh_catalog(offer_ids):
+    """
+    Пересобирает строки каталога (CatalogEntry) для указанных предложений.
+
+    Карточка строится тем же ProductInfoSerializer, что и раньше отдавал поиск,
+    и хранится целиком, поэтому выдача каталога - один запрос без join-ов.
+    Вместе со строкой обновляется индекс фильтров CatalogFacet.
+    Строки удаленных предложений удаляются каскадом вместе с ними.
+    """
+    offer_ids = iter(offer_ids)
+    while True:
+        batch = list(islice(offer_ids, CATALOG_BATCH_SIZE))
+        if not batch:
+            return
+        offers = list(
+            ProductInfo.objects.filter(id__in=batch)
+            .select_related('shop', 'product__category')
+            .prefetch_related('product_parameters__parameter')
+        )
+        documents = ProductInfoSerializer(offers, many=True).data
+        # Версия строки растет при каждой пересборке, фрагменты прошлых версий удаляются из кэша
+        versions = dict(CatalogEntry.objects.filter(offer_id__in=batch).values_list('offer_id', 'version'))
+        CatalogEntry.objects.bulk_create(
+            [
+                CatalogEntry(
+                    offer_id=offer.id,
+                    shop_id=offer.shop_id,
+                    shop_state=offer.shop.state,
+                    category_id=offer.product.category_id,
+                    product_id=offer.product_id,
+                    product_name=offer.product.name,
+                    price=offer.price,
+                    quantity=offer.quantity,
+                    discount=offer.discount,
+                    document=document,
+                    version=versions.get(offer.id, 0) + 1
+                )
+                for offer, document in zip(offers, documents)
+            ],
+            update_conflicts=True,
+            unique_fields=('offer',),
+            update_fields=CATALOG_UPDATE_FIELDS
+        )
+        invalidate_fragments(versions)
+        # Клиенты с сохраненным ETag выдачи получат новые данные
+        bump_shop_versions(id__in={offer.shop_id for offer in offers})
+
+        # Инвертированный индекс параметров пересобирается вместе со строкой
+        # Старые значения есть только у предложений, которые уже были в каталоге
+        if versions:
+            CatalogFacet.objects.filter(entry_id__in=versions).delete()
+        CatalogFacet.objects.bulk_create([
+            CatalogFacet(entry_id=offer.id, parameter=product_parameter.parameter.name, value=product_parameter.value)
+            for offer in offers
+            for product_parameter in offer.product_parameters.all()
+        ])
+
+
+def refresh_catalog_for(**filters):
+    """
+    Пересобирает каталог для предложений, выбранных фильтром ProductInfo,
+    например refresh_catalog_for(shop_id=1) после изменения магазина
+    """
+    refresh_catalog(ProductInfo.objects.filter(**filters).values_list('id', flat=True).iterator())
+
+
+def parse_catalog_filters(params):
+    """
+    Разбирает фильтры выдачи каталога: price_min, price_max (включительно),
+    in_stock=1 (только в наличии) и discount_min (скидка не меньше, %).
+    Возвращает условие для CatalogEntry, на неверное значение бросает ValueError.
+    """
+    query = Q()
+    for param, lookup in (('price_min', 'price__gte'), ('price_max', 'price__lte'), ('discount_min', 'discount__gte')):
+        value = params.get(param)
+        if value in (None, ''):
+            continue
+        if not value.isdigit():
+            raise ValueError(f'Неверное значение {param}: ожидается неотрицательное целое число')
+        query &= Q(**{lookup: int(value)})
+
+    in_stock = params.get('in_stock', '').lower()
+    if in_stock in ('1', 'true', 'yes'):
+        query &= Q(quantity__gt=0)
+    elif in_stock not in ('', '0', 'false', 'no'):
+        raise ValueError(f'Неверное значение in_stock: {in_stock}')
+    # Со скидкой от 1% запрос подходит под частичный индекс по discount > 0
+    if params.get('discount_min', '').isdigit() and int(params['discount_min']) > 0:
+        query &= Q(discount__gt=0)
+    return query
+
+
+def parse_facet_filters(values):
+    """
+    Разбирает фильтры по параметрам из значений filter=<параметр>:<значение>|<значение>.
+    Значения одного параметра объединяются через ИЛИ, разные параметры - через И.
+    """
+    filters = {}
+    for item in values:
+        parameter, separator, value = item.partition(FACET_SEPARATOR)
+        if not separator or not parameter or not value:
+            raise ValueError(f'Неверный фильтр {item}: ожидается <параметр>:<значение>')
+        filters.setdefault(parameter, set()).update(value.split(FACET_VALUES_SEPARATOR))
+    return filters
+
+
+def filter_by_facets(queryset, filters):
+    """
+    Оставляет в выборке каталога предложения, подходящие под все фильтры.
+    Каждый фильтр - подзапрос к индексу (параметр, значение, предложение).
+    """
+    for parameter, values in filters.items():
+        queryset = queryset.filter(
+            offer_id__in=CatalogFacet.objects.filter(parameter=parameter, value__in=values).values('entry_id')
+        )
+    return queryset
+
+
+def facet_counts(queryset, limit=None):
+    """
+    Счетчики значений параметров для текущей выборки каталога:
+    {параметр: {значение: число предложений}}, самые частые значения первыми
+    """
+    limit = limit or CATALOG_FACET_LIMIT
+    rows = CatalogFacet.objects.filter(
+        entry_id__in=queryset.values('offer_id')
+    ).values('parameter', 'value').annotate(count=Count('id')).order_by('parameter', '-count', 'value')
+
+    facets = {}
+    for row in rows:
+        values = facets.setdefault(row['parameter'], {})
+        if len(values) < limit:
+            values[row['value']] = row['count']
+    return facets
@@ -0,0 +1,207 @@
+import csv
+import json
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from backend.importers import chunked
+from backend.models import Category, OrderItem, ProductInfo, ProductParameter, STATE_CHOICES
+
+# Сколько строк читается из курсора базы за раз при выгрузке
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+# Примерный размер куска ответа: строки склеиваются, чтобы не отдавать их по одной
+EXPORT_BUFFER_SIZE = getattr(settings, 'EXPORT_BUFFER_SIZE', 64 * 1024)
+
+CSV_FEED_COLUMNS = ('shop', 'id', 'category', 'category_name', 'model', 'name', 'price', 'price_rrc',
+                    'quantity', 'discount', 'parameters')
+
+ORDER_EXPORT_COLUMNS = ('order', 'dt', 'state', 'status_display', 'email', 'city', 'street', 'house', 'phone',
+                        'id', 'name', 'model', 'quantity', 'price', 'sum')
+
+STATE_NAMES = dict(STATE_CHOICES)
+
+
+class Echo:
+    """
+    Псевдофайл для csv.writer: строка не копится в буфере, а сразу возвращается
+    """
+
+    def write(self, value):
+        return value
+
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def iter_shop_feed(shop, chunk_size=None):
+    """
+    Выгружает каталог магазина как поток пар (раздел, значение) в схеме
+    data/shop1.yaml - тот же поток, что отдают парсеры backend.feeds.
+
+    Предложения читаются курсором по chunk_size строк, параметры - одним
+    запросом на каждый кусок, поэтому память не зависит от размера каталога.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    yield 'shop', shop.name
+    categories = Category.objects.filter(shops=shop).order_by('id').values_list('id', 'name')
+    for category_id, name in categories.iterator(chunk_size=chunk_size):
+        yield 'category', {'id': category_id, 'name': name}
+
+    offers = ProductInfo.objects.filter(shop=shop).order_by('id').values_list(
+        'id', 'external_id', 'product__category_id', 'model', 'product__name', 'price', 'price_rrc', 'quantity',
+        'discount'
+    )
+    for batch in chunked(offers.iterator(chunk_size=chunk_size), chunk_size):
+        parameters = {}
+        for offer_id, name, value in ProductParameter.objects.filter(
+            product_info_id__in=[row[0] for row in batch]
+        ).order_by('id').values_list('product_info_id', 'parameter__name', 'value'):
+            parameters.setdefault(offer_id, {})[name] = value
+
+        for offer_id, external_id, category_id, model, name, price, price_rrc, quantity, discount in batch:
+            yield 'good', {
+                'id': external_id,
+                'category': category_id,
+                'model': model,
+                'name': name,
+                'price': price,
+                'price_rrc': price_rrc,
+                'quantity': quantity,
+                'discount': discount,
+                'parameters': parameters.get(offer_id, {}),
+            }
+
+
+def iter_shop_orders(shop, chunk_size=None):
+    """
+    Выгружает позиции заказов магазина (без корзин) по одной строке на позицию.
+    В строку попадают только товары этого магазина.
+    """
+    items = OrderItem.objects.filter(product_info__shop=shop).exclude(order__state='basket').order_by(
+        'order_id', 'id'
+    ).values_list(
+        'order_id', 'order__dt', 'order__state', 'order__user__email', 'order__contact__city',
+        'order__contact__street', 'order__contact__house', 'order__contact__phone', 'product_info__external_id',
+        'product_info__product__name', 'product_info__model', 'quantity',
+        # Цена, зафиксированная при оформлении
+        Coalesce(F('price'), F('product_info__price'))
+    )
+    for order_id, dt, state, email, city, street, house, phone, external_id, name, model, quantity, price \
+            in items.iterator(chunk_size=chunk_size or EXPORT_CHUNK_SIZE):
+        yield {
+            'order': order_id,
+            'dt': dt.isoformat(),
+            'state': state,
+            'status_display': STATE_NAMES.get(state, 'Неизвестный статус'),
+            'email': email,
+            'city': city or '',
+            'street': street or '',
+            'house': house or '',
+            'phone': phone or '',
+            'id': external_id,
+            'name': name,
+            'model': model,
+            'quantity': quantity,
+            'price': price,
+            'sum': quantity * price,
+        }
+
+
+def render_yaml_feed(sections):
+    """
+    Строки прайса в YAML. Значения пишутся как JSON-строки,
+    которые являются корректными YAML-скалярами в двойных кавычках.
+    """
+    current = None
+    for section, value in sections:
+        if section == 'shop':
+            yield f'shop: {_json(value)}\n'
+            continue
+        if section != current:
+            current = section
+            yield 'categories:\n' if section == 'category' else 'goods:\n'
+        items = [(key, item) for key, item in value.items() if key != 'parameters']
+        for position, (key, item) in enumerate(items):
+            prefix = '  - ' if not position else '    '
+            yield f'{prefix}{key}: {_json(item)}\n'
+        if value.get('parameters'):
+            yield '    parameters:\n'
+            for key, item in value['parameters'].items():
+                yield f'      {_json(key)}: {_json(item)}\n'
+
+
+def render_csv_feed(sections):
+    """
+    Строки прайса в CSV в формате backend.feeds.iter_csv_feed
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_FEED_COLUMNS)
+    shop = ''
+    category_names = {}
+    for section, value in sections:
+        if section == 'shop':
+            shop = value
+        elif section == 'category':
+            category_names[value['id']] = value['name']
+        else:
+            yield writer.writerow((shop, value['id'], value['category'], category_names.get(value['category'], ''),
+                                   value['model'], value['name'], value['price'], value['price_rrc'],
+                                   value['quantity'], value.get('discount', ''), _json(value['parameters'])))
+
+
+def render_jsonl_feed(sections):
+    """
+    Строки прайса в JSON Lines в формате backend.feeds.iter_json_feed
+    """
+    for section, value in sections:
+        if section == 'shop':
+            record = {'type': 'shop', 'name': value}
+        elif section == 'category':
+            record = dict(value, type='category')
+        else:
+            record = value
+        yield _json(record) + '\n'
+
+
+def render_csv_orders(rows):
+    """
+    Строки выгрузки заказов в CSV, колонки - ORDER_EXPORT_COLUMNS
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([row[column] for column in ORDER_EXPORT_COLUMNS])
+
+
+def render_jsonl_rows(rows):
+    for row in rows:
+        yield _json(row) + '\n'
+
+
+def buffered(lines, size=None):
+    """
+    Склеивает строки в куски примерно по size символов для StreamingHttpResponse
+    """
+    size = size or EXPORT_BUFFER_SIZE
+    chunk, length = [], 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+# Форматы выгрузки: расширение файла, тип содержимого и генератор строк
+FEED_EXPORTS = {
+    'yaml': ('.yaml', 'application/x-yaml', render_yaml_feed),
+    'csv': ('.csv', 'text/csv', render_csv_feed),
+    'jsonl': ('.jsonl', 'application/x-ndjson', render_jsonl_feed),
+}
+
+ORDER_EXPORTS = {
+    'csv': ('.csv', 'text/csv', render_csv_orders),
+    'jsonl': ('.jsonl', 'application/x-ndjson', render_jsonl_rows),
+}
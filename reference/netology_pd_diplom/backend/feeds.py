@@ -0,0 +1,202 @@
+import csv
+from ujson import loads as load_json
+from yaml import DocumentStartEvent, AliasEvent, ScalarEvent, SequenceStartEvent, SequenceEndEvent, MappingStartEvent, \
+    MappingEndEvent, ScalarNode, SequenceNode, MappingNode
+
+try:
+    # C-парсер libyaml в разы быстрее чистого Python
+    from yaml import CSafeLoader as FeedLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as FeedLoader
+
+# Разделы прайс-листа, которые разбираются поэлементно
+SEQUENCE_SECTIONS = {'categories': 'category', 'goods': 'good'}
+
+# Колонки CSV, которые не относятся к самому товару
+CSV_SERVICE_COLUMNS = ('shop', 'category_name', 'parameters')
+CSV_PARAMETER_PREFIX = 'param:'
+# Длина Shop.name
+SHOP_NAME_MAX_LENGTH = 50
+
+
+def iter_price_list(data):
+    """
+    Представляет уже разобранный прайс-лист как поток пар (раздел, значение)
+    """
+    yield 'shop', data['shop']
+    for category in data.get('categories') or []:
+        yield 'category', category
+    for item in data.get('goods') or []:
+        yield 'good', item
+
+
+def iter_yaml_feed(stream):
+    """
+    Потоково разбирает прайс-лист в формате data/shop1.yaml.
+
+    Вместо построения всего документа читает события парсера и отдает
+    пары ('shop', имя), ('category', {...}), ('good', {...}) по одной,
+    так что в памяти находится только текущий элемент.
+    """
+    loader = FeedLoader(stream)
+    try:
+        loader.get_event()  # StreamStartEvent
+        if not loader.check_event(DocumentStartEvent):
+            raise ValueError('Пустой прайс-лист')
+        loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            raise ValueError('Неверный формат прайс-листа')
+        loader.get_event()
+
+        while not loader.check_event(MappingEndEvent):
+            key = loader.construct_document(_compose(loader, {}))
+            section = SEQUENCE_SECTIONS.get(key)
+
+            if section and loader.check_event(SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(SequenceEndEvent):
+                    yield section, loader.construct_document(_compose(loader, {}))
+                loader.get_event()
+            else:
+                yield key, loader.construct_document(_compose(loader, {}))
+    finally:
+        loader.dispose()
+
+
+def _compose(loader, anchors):
+    """
+    Собирает узел YAML из событий парсера, как это делает yaml.composer,
+    но только для одного элемента прайс-листа
+    """
+    event = loader.get_event()
+
+    if isinstance(event, AliasEvent):
+        if event.anchor not in anchors:
+            raise ValueError(f'Неизвестный якорь {event.anchor}')
+        return anchors[event.anchor]
+
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(ScalarNode, event.value, event.implicit)
+        node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+    elif isinstance(event, SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(SequenceNode, None, event.implicit)
+        node = SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        while not loader.check_event(SequenceEndEvent):
+            node.value.append(_compose(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(MappingNode, None, event.implicit)
+        node = MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        while not loader.check_event(MappingEndEvent):
+            key = _compose(loader, anchors)
+            node.value.append((key, _compose(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
+
+
+def iter_csv_feed(stream):
+    """
+    Потоково разбирает CSV-прайс: одна строка - один товар.
+
+    Колонки совпадают с полями товара из data/shop1.yaml (id, category, name, model,
+    price, price_rrc, quantity, discount). Необязательные колонки: shop, category_name,
+    parameters (JSON-объект) и param:<имя параметра>.
+    """
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.DictReader(stream, dialect=dialect)
+    shop = None
+    categories = set()
+
+    for row in reader:
+        if None in row or None in row.values():
+            yield 'error', {'line': reader.line_num, 'error': 'Неверное число колонок'}
+            continue
+
+        if row.get('shop') and row['shop'] != shop:
+            shop = row['shop']
+            yield 'shop', shop
+
+        if row.get('category_name') and row.get('category') not in categories:
+            categories.add(row['category'])
+            yield 'category', {'id': row['category'], 'name': row['category_name']}
+
+        item = {key: value for key, value in row.items()
+                if key not in CSV_SERVICE_COLUMNS and not key.startswith(CSV_PARAMETER_PREFIX) and value != ''}
+        try:
+            parameters = load_json(row['parameters']) if row.get('parameters') else {}
+        except ValueError:
+            yield 'error', {'line': reader.line_num, 'error': 'Неверный JSON в колонке parameters'}
+            continue
+        for key, value in row.items():
+            if key.startswith(CSV_PARAMETER_PREFIX) and value != '':
+                parameters[key[len(CSV_PARAMETER_PREFIX):]] = value
+        item['parameters'] = parameters
+        yield 'good', item
+
+
+def iter_json_feed(stream):
+    """
+    Потоково разбирает JSON Lines прайс: один объект на строку.
+
+    Строка с "type": "shop" задает магазин ({"type": "shop", "name": ...}),
+    с "type": "category" - категорию, остальные строки - товары в формате data/shop1.yaml.
+    Если файл - один JSON-документ со структурой shop1.yaml, он разбирается целиком.
+    """
+    first_line = stream.readline()
+    try:
+        first = load_json(first_line) if first_line.strip() else None
+    except ValueError:
+        # Многострочный документ: потоковый разбор невозможен
+        stream.seek(0)
+        yield from iter_price_list(load_json(stream.read()))
+        return
+
+    if isinstance(first, dict) and 'goods' in first:
+        yield from iter_price_list(first)
+        return
+
+    def lines():
+        yield 1, first_line
+        for number, line in enumerate(stream, start=2):
+            yield number, line
+
+    for number, line in lines():
+        if not line.strip():
+            continue
+        try:
+            record = load_json(line)
+        except ValueError:
+            yield 'error', {'line': number, 'error': 'Неверный JSON'}
+            continue
+        if not isinstance(record, dict):
+            yield 'error', {'line': number, 'error': 'Ожидается JSON-объект'}
+            continue
+
+        record_type = record.pop('type', 'good')
+        if record_type == 'shop':
+            name = record.get('name')
+            if not isinstance(name, str) or not name.strip():
+                yield 'error', {'line': number, 'error': 'Не указано название магазина'}
+            elif len(name) > SHOP_NAME_MAX_LENGTH:
+                yield 'error', {'line': number, 'error': f'Название магазина длиннее {SHOP_NAME_MAX_LENGTH} символов'}
+            else:
+                yield 'shop', name
+        elif record_type == 'category':
+            yield 'category', record
+        else:
+            yield 'good', record
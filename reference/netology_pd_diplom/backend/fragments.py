@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from backend.models import CatalogEntry
+from backend.renderers import dumps as dump_json
+
+# Кэш готовых JSON-фрагментов карточек каталога и время их жизни (сек)
+CATALOG_FRAGMENT_CACHE = getattr(settings, 'CATALOG_FRAGMENT_CACHE', 'default')
+CATALOG_FRAGMENT_TIMEOUT = getattr(settings, 'CATALOG_FRAGMENT_TIMEOUT', 24 * 60 * 60)
+
+
+def fragment_key(offer_id, version):
+    return f'catalog:offer:{offer_id}:{version}'
+
+
+def render_fragments(entries):
+    """
+    Возвращает JSON-фрагменты карточек для пар (id предложения, версия) в том же порядке.
+    Фрагменты берутся из кэша по ключу id+версия, недостающие читаются из каталога
+    одним запросом, сериализуются и кладутся в кэш.
+    """
+    cache = caches[CATALOG_FRAGMENT_CACHE]
+    keys = {offer_id: fragment_key(offer_id, version) for offer_id, version in entries}
+    fragments = cache.get_many(keys.values())
+
+    missing = [offer_id for offer_id, key in keys.items() if key not in fragments]
+    if missing:
+        rendered = {}
+        for offer_id, version, document in CatalogEntry.objects.filter(
+                offer_id__in=missing).values_list('offer_id', 'version', 'document'):
+            # Строка могла обновиться после чтения версии: фрагмент кладется под актуальной
+            keys[offer_id] = fragment_key(offer_id, version)
+            rendered[keys[offer_id]] = dump_json(document)
+        cache.set_many(rendered, CATALOG_FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+
+    return [fragments[keys[offer_id]] for offer_id, _ in entries if keys[offer_id] in fragments]
+
+
+def invalidate_fragments(versions):
+    """
+    Удаляет из кэша фрагменты устаревших версий: versions - {id предложения: версия}
+    """
+    caches[CATALOG_FRAGMENT_CACHE].delete_many([
+        fragment_key(offer_id, version) for offer_id, version in versions.items()
+    ])
+
+
+def fragment_list_response(fragments, **extra):
+    """
+    Ответ со списком карточек: фрагменты вставляются в тело как есть,
+    без повторной сериализации. extra - прочие ключи ответа (next, previous, facets).
+    """
+    parts = [f'{dump_json(key)}:{dump_json(value)}' for key, value in extra.items()]
+    parts.append(f'"results":[{",".join(fragments)}]')
+    return HttpResponse('{' + ','.join(parts) + '}', content_type='application/json')
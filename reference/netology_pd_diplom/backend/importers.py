@@ -0,0 +1,628 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Sum
+from backend.catalog import refresh_catalog
+from backend.totals import reprice_baskets
+from backend.feeds import iter_price_list
+from backend.jobs import NullTracker
+from backend.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, OrderItem, \
+    StagedOffer, StockReservation
+from backend.versions import bump_category_version, bump_shop_versions
+
+# Размер пакета, которым товары пишутся в базу
+IMPORT_BATCH_SIZE = getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+# Сколько ошибочных строк сохранять в статистике импорта
+IMPORT_MAX_ERROR_ROWS = getattr(settings, 'IMPORT_MAX_ERROR_ROWS', 100)
+
+OFFER_UPDATE_FIELDS = ('product', 'model', 'price', 'price_rrc', 'quantity', 'discount', 'content_hash', 'updated_at')
+STAGED_UPDATE_FIELDS = ('product', 'model', 'price', 'price_rrc', 'quantity', 'discount', 'content_hash', 'parameters')
+
+# Список внешних ИД импорта, по которому после шардов выводятся отсутствующие предложения
+SEEN_IDS_FILE = 'seen.json'
+
+
+def chunked(iterable, size):
+    """
+    Разбивает итерируемый объект на списки длиной не больше size
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _check_length(value, max_length, field):
+    if len(value) > max_length:
+        raise ValueError(f'Поле {field} длиннее {max_length} символов')
+    return value
+
+
+def _positive_int(value, field):
+    value = int(value)
+    if value < 0:
+        raise ValueError(f'Поле {field} не может быть отрицательным')
+    return value
+
+
+def normalize_item(raw):
+    """
+    Приводит товар из прайс-листа к единому виду.
+    Бросает ValueError, если обязательные поля отсутствуют или некорректны.
+    """
+    try:
+        price = _positive_int(raw['price'], 'price')
+        item = {
+            'external_id': _positive_int(raw['id'], 'id'),
+            'category_id': _positive_int(raw['category'], 'category'),
+            'name': _check_length(str(raw['name']), 80, 'name'),
+            'model': _check_length(str(raw.get('model') or ''), 80, 'model'),
+            'price': price,
+            'price_rrc': _positive_int(raw.get('price_rrc', price), 'price_rrc'),
+            'quantity': _positive_int(raw['quantity'], 'quantity'),
+            'discount': _positive_int(raw.get('discount') or 0, 'discount'),
+        }
+        item['parameters'] = {
+            _check_length(str(name), 40, 'parameters'): _check_length(str(value), 100, 'parameters')
+            for name, value in (raw.get('parameters') or {}).items()
+        }
+    except KeyError as error:
+        raise ValueError(f'Не указано поле {error}')
+    except (TypeError, AttributeError):
+        raise ValueError('Неверный формат товара')
+    return item
+
+
+def offer_hash(item):
+    """
+    Хеш содержимого предложения: по нему импорт понимает, изменилось ли оно
+    """
+    content = [
+        item['name'], item['category_id'], item['model'], item['price'],
+        item['price_rrc'], item['quantity'], item['discount'], sorted(item['parameters'].items())
+    ]
+    return hashlib.md5(json.dumps(content, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class PriceListImporter:
+    """
+    Пакетный дифференциальный импорт прайс-листа магазина.
+
+    Предложения сопоставляются по (магазин, внешний ИД) и хешу содержимого:
+    новые вставляются, измененные обновляются, неизмененные не трогаются.
+    Категории, продукты и параметры разрешаются несколькими запросами на пакет.
+    """
+
+    def __init__(self, shop, batch_size=None):
+        self.shop = shop
+        self.batch_size = batch_size or IMPORT_BATCH_SIZE
+        self.stats = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0, 'errors': 0, 'error_rows': []}
+        self.seen_external_ids = set()
+        self.tracker = NullTracker()
+        self._position = 0
+        self._parameter_ids = {}
+        self._started = time.monotonic()
+
+    def add_error(self, error, **context):
+        """
+        Учитывает ошибочную строку прайса, не прерывая импорт
+        """
+        self.stats['errors'] += 1
+        if len(self.stats['error_rows']) < IMPORT_MAX_ERROR_ROWS:
+            self.stats['error_rows'].append(dict(context, error=str(error)))
+
+    def import_categories(self, categories):
+        names = {}
+        for category in categories:
+            try:
+                names[int(category['id'])] = _check_length(str(category['name']), 40, 'name')
+            except (KeyError, TypeError, ValueError) as error:
+                self.add_error(f'Неверная категория: {error}', category=category)
+        if not names:
+            return
+
+        existing = set(Category.objects.filter(id__in=names).values_list('id', flat=True))
+        created = Category.objects.bulk_create(
+            [Category(id=category_id, name=name) for category_id, name in names.items()
+             if category_id not in existing],
+            ignore_conflicts=True
+        )
+
+        through = Category.shops.through
+        linked = set(through.objects.filter(
+            shop_id=self.shop.id,
+            category_id__in=names
+        ).values_list('category_id', flat=True))
+        created += through.objects.bulk_create(
+            [through(category_id=category_id, shop_id=self.shop.id) for category_id in names
+             if category_id not in linked],
+            ignore_conflicts=True
+        )
+        if created:
+            bump_category_version()
+
+    def import_goods(self, goods):
+        for batch in chunked(goods, self.batch_size):
+            items = {}
+            for raw in batch:
+                self._position += 1
+                try:
+                    item = normalize_item(raw)
+                except ValueError as error:
+                    self.add_error(error, row=self._position, id=raw.get('id') if isinstance(raw, dict) else None)
+                    continue
+                # Повтор внешнего ИД в одном пакете сломал бы upsert: побеждает последний
+                items[item['external_id']] = item
+
+            if items:
+                self.write_batch(list(items.values()))
+
+    def write_batch(self, items):
+        with self.tracker.phase('resolve'):
+            dirty, changed = self._diff(items)
+            self.resolve(dirty)
+
+        if dirty:
+            with self.tracker.phase('write'), transaction.atomic():
+                self._write_offers(dirty, changed)
+            self.tracker.add_written(len(dirty))
+
+    def _diff(self, items):
+        """
+        Делит пакет на новые, измененные и неизмененные предложения по хешу содержимого.
+        Возвращает предложения для записи и внешние ИД измененных.
+        """
+        existing = {
+            external_id: content_hash
+            for external_id, content_hash in ProductInfo.objects.filter(
+                shop_id=self.shop.id,
+                external_id__in=[item['external_id'] for item in items]
+            ).values_list('external_id', 'content_hash')
+        }
+
+        dirty = []
+        for item in items:
+            self.seen_external_ids.add(item['external_id'])
+            if 'content_hash' not in item:
+                item['content_hash'] = offer_hash(item)
+            if item['external_id'] not in existing:
+                self.stats['added'] += 1
+                dirty.append(item)
+            elif existing[item['external_id']] != item['content_hash']:
+                self.stats['changed'] += 1
+                dirty.append(item)
+            else:
+                self.stats['unchanged'] += 1
+
+        return dirty, [item['external_id'] for item in dirty if item['external_id'] in existing]
+
+    def resolve(self, items):
+        """
+        Находит или создает продукты и имена параметров для предложений пакета
+        """
+        unresolved = [item for item in items if 'product_id' not in item]
+        if unresolved:
+            product_ids = self._resolve_products(unresolved)
+            for item in unresolved:
+                item['product_id'] = product_ids[(item['name'], item['category_id'])]
+        self._resolve_parameters(items)
+
+    def _reserved(self, external_ids):
+        """
+        Остаток под активными резервами заказов по внешним ИД предложений
+        """
+        if not external_ids:
+            return {}
+        return dict(StockReservation.objects.filter(
+            product_info__shop_id=self.shop.id,
+            product_info__external_id__in=external_ids
+        ).values_list('product_info__external_id').annotate(total=Sum('quantity')).order_by())
+
+    def _write_offers(self, items, changed):
+        # В прайсе остаток склада магазина, а зарезервированное заказами уже продано:
+        # хеш считается по прайсу, в базу пишется остаток за вычетом резервов
+        reserved = self._reserved(changed)
+        ProductInfo.objects.bulk_create(
+            [
+                ProductInfo(
+                    product_id=item['product_id'],
+                    shop_id=self.shop.id,
+                    external_id=item['external_id'],
+                    model=item['model'],
+                    price=item['price'],
+                    price_rrc=item['price_rrc'],
+                    quantity=max(item['quantity'] - reserved.get(item['external_id'], 0), 0),
+                    discount=item['discount'],
+                    content_hash=item['content_hash']
+                )
+                for item in items
+            ],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=('shop', 'external_id'),
+            update_fields=OFFER_UPDATE_FIELDS
+        )
+
+        offer_ids = dict(ProductInfo.objects.filter(
+            shop_id=self.shop.id,
+            external_id__in=[item['external_id'] for item in items]
+        ).values_list('external_id', 'id'))
+
+        if changed:
+            # У измененных предложений набор параметров пересобирается целиком
+            ProductParameter.objects.filter(
+                product_info_id__in=[offer_ids[external_id] for external_id in changed]
+            ).delete()
+
+        ProductParameter.objects.bulk_create(
+            [
+                ProductParameter(
+                    product_info_id=offer_ids[item['external_id']],
+                    parameter_id=self._parameter_ids[name],
+                    value=value
+                )
+                for item in items
+                for name, value in item['parameters'].items()
+            ],
+            batch_size=self.batch_size
+        )
+        # Цена измененных могла поменяться: суммы корзин с ними пересчитываются
+        self.rebuild(offer_ids.values(), [offer_ids[external_id] for external_id in changed])
+
+    def rebuild(self, offer_ids, repriced=()):
+        """
+        Пересчитывает производные данные записанных предложений:
+        суммы корзин с измененными ценами и строки каталога
+        """
+        if repriced:
+            reprice_baskets(repriced)
+        refresh_catalog(offer_ids)
+
+    def publish(self, retire_missing=False):
+        """
+        Завершает импорт. Товары уже записаны пакетами, остается
+        при необходимости вывести из продажи отсутствующие в прайсе.
+        """
+        if retire_missing:
+            with self.tracker.phase('write'):
+                self.retire_missing()
+
+    def close(self):
+        """
+        Освобождает ресурсы импорта; вызывается и при успехе, и при ошибке
+        """
+
+    def retire_missing(self):
+        """
+        Выводит из прайса предложения магазина, которых не было в импорте.
+        Предложения без заказов удаляются, у заказанных обнуляется остаток,
+        чтобы не потерять историю заказов. Уже выведенные прошлыми импортами
+        (остаток 0, хеш сброшен) не трогаются и не считаются повторно.
+        """
+        missing = [
+            offer_id
+            for offer_id, external_id in ProductInfo.objects.filter(
+                shop_id=self.shop.id
+            ).exclude(quantity=0, content_hash='').values_list('id', 'external_id').iterator()
+            if external_id not in self.seen_external_ids
+        ]
+
+        for batch in chunked(missing, self.batch_size):
+            with transaction.atomic():
+                ordered = set(OrderItem.objects.filter(
+                    product_info_id__in=batch
+                ).values_list('product_info_id', flat=True))
+                ProductInfo.objects.filter(id__in=ordered).update(quantity=0, content_hash='')
+                self.rebuild(ordered)
+                ProductInfo.objects.filter(id__in=set(batch) - ordered).delete()
+            self.stats['removed'] += len(batch)
+        if missing:
+            # Строки каталога удаленных предложений ушли каскадом, версию нужно поднять отдельно
+            bump_shop_versions(id=self.shop.id)
+
+    def _resolve_products(self, items):
+        keys = {(item['name'], item['category_id']) for item in items}
+        product_ids = self._fetch_products(keys)
+
+        missing = keys - product_ids.keys()
+        if missing:
+            # Параллельные импорты могут вставить тот же продукт: конфликт по
+            # уникальному ключу игнорируется, ИД перечитываются. Сортировка задает
+            # общий порядок вставки и снижает риск взаимных блокировок.
+            Product.objects.bulk_create(
+                [Product(name=name, category_id=category_id) for name, category_id in sorted(missing)],
+                batch_size=self.batch_size,
+                ignore_conflicts=True
+            )
+            product_ids.update(self._fetch_products(missing))
+        return product_ids
+
+    @staticmethod
+    def _fetch_products(keys):
+        names = {name for name, _ in keys}
+        categories = {category_id for _, category_id in keys}
+        return {
+            (name, category_id): product_id
+            for product_id, name, category_id in Product.objects.filter(
+                name__in=names,
+                category_id__in=categories
+            ).values_list('id', 'name', 'category_id')
+            if (name, category_id) in keys
+        }
+
+    def _resolve_parameters(self, items):
+        names = {name for item in items for name in item['parameters']}
+        missing = names - self._parameter_ids.keys()
+        if missing:
+            self._parameter_ids.update(self._fetch_parameters(missing))
+            missing -= self._parameter_ids.keys()
+        if missing:
+            Parameter.objects.bulk_create([Parameter(name=name) for name in sorted(missing)], ignore_conflicts=True)
+            self._parameter_ids.update(self._fetch_parameters(missing))
+        return self._parameter_ids
+
+    @staticmethod
+    def _fetch_parameters(names):
+        return {
+            name: parameter_id
+            for parameter_id, name in Parameter.objects.filter(name__in=names).values_list('id', 'name')
+        }
+
+    def finish(self):
+        seconds = time.monotonic() - self._started
+        rows = self.stats['added'] + self.stats['changed'] + self.stats['unchanged']
+        self.stats['seconds'] = round(seconds, 3)
+        self.stats['rows_per_sec'] = round(rows / seconds, 1) if seconds else rows
+        return self.stats
+
+
+class StagingImporter(PriceListImporter):
+    """
+    Импорт через промежуточную таблицу.
+
+    Прайс сначала целиком загружается в StagedOffer, где продукты и параметры
+    уже разрешены, и проверяется. Предложения магазина меняются одной транзакцией
+    в publish(), поэтому покупатели видят либо старый прайс, либо новый.
+    Корзины и строки каталога пересчитываются уже после фиксации, не удерживая
+    блокировку магазина.
+    """
+
+    def __init__(self, shop, batch_size=None):
+        super().__init__(shop, batch_size=batch_size)
+        self.import_key = uuid.uuid4().hex
+        self.stats['staged'] = 0
+        self._rebuilt = set()
+        self._repriced = set()
+
+    def write_batch(self, items):
+        with self.tracker.phase('resolve'):
+            for item in items:
+                item['content_hash'] = offer_hash(item)
+            self.resolve(items)
+
+        with self.tracker.phase('stage'):
+            self._stage(items)
+
+    def _stage(self, items):
+        StagedOffer.objects.bulk_create(
+            [
+                StagedOffer(
+                    import_key=self.import_key,
+                    shop_id=self.shop.id,
+                    external_id=item['external_id'],
+                    product_id=item['product_id'],
+                    model=item['model'],
+                    price=item['price'],
+                    price_rrc=item['price_rrc'],
+                    quantity=item['quantity'],
+                    discount=item['discount'],
+                    content_hash=item['content_hash'],
+                    parameters=item['parameters']
+                )
+                for item in items
+            ],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=('import_key', 'external_id'),
+            update_fields=STAGED_UPDATE_FIELDS
+        )
+
+    def staged_items(self):
+        fields = ('external_id', 'product_id', 'model', 'price', 'price_rrc', 'quantity',
+                  'discount', 'content_hash', 'parameters')
+        return StagedOffer.objects.filter(
+            import_key=self.import_key
+        ).order_by('id').values(*fields).iterator(chunk_size=self.batch_size)
+
+    def validate(self):
+        self.stats['staged'] = StagedOffer.objects.filter(import_key=self.import_key).count()
+        if not self.stats['staged']:
+            raise ValidationError('В прайс-листе нет ни одного корректного товара')
+
+    def rebuild(self, offer_ids, repriced=()):
+        # Под блокировкой магазина только запоминаем, что пересчитать после фиксации
+        self._rebuilt.update(offer_ids)
+        self._repriced.update(repriced)
+
+    def publish(self, retire_missing=False):
+        self.validate()
+        with transaction.atomic():
+            # Блокировка магазина не дает двум импортам публиковаться одновременно
+            Shop.objects.select_for_update().filter(id=self.shop.id).first()
+            for batch in chunked(self.staged_items(), self.batch_size):
+                super().write_batch(batch)
+            super().publish(retire_missing=retire_missing)
+        with self.tracker.phase('write'):
+            super().rebuild(sorted(self._rebuilt), sorted(self._repriced))
+
+    def close(self):
+        StagedOffer.objects.filter(import_key=self.import_key).delete()
+
+
+class ShardWriter(PriceListImporter):
+    """
+    Первый проход параллельного импорта.
+
+    Нормализует товары и раскладывает пакеты по кругу в файлы-шарды (JSON Lines),
+    которые затем параллельно импортируют задачи import_shard_task.
+    """
+
+    def __init__(self, shop, batch_size=None, shard_dir=None, shards=2):
+        super().__init__(shop, batch_size=batch_size)
+        self.shard_dir = shard_dir
+        self.shard_paths = [os.path.join(shard_dir, f'shard-{index}.jsonl') for index in range(shards)]
+        self._files = [open(path, 'w', encoding='utf-8') for path in self.shard_paths]
+        self._batches = 0
+        self.stats['sharded'] = 0
+
+    def write_batch(self, items):
+        file = self._files[self._batches % len(self._files)]
+        self._batches += 1
+        for item in items:
+            self.seen_external_ids.add(item['external_id'])
+            file.write(json.dumps(item, ensure_ascii=False))
+            file.write('\n')
+        self.stats['sharded'] += len(items)
+
+    def publish(self, retire_missing=False):
+        self.close()
+        # Описание шардов для второго прохода; пустые шарды не запускаются
+        self.stats['shop_id'] = self.shop.id
+        self.stats['shards'] = self.shard_paths[:self._batches]
+        if retire_missing:
+            with open(os.path.join(self.shard_dir, SEEN_IDS_FILE), 'w') as file:
+                json.dump(sorted(self.seen_external_ids), file)
+
+    def close(self):
+        for file in self._files:
+            file.close()
+
+
+def import_shard(shard_path, shop_id, batch_size=None):
+    """
+    Импортирует один шард, подготовленный ShardWriter
+    """
+    importer = PriceListImporter(Shop.objects.get(id=shop_id), batch_size=batch_size)
+    with open(shard_path, encoding='utf-8') as file:
+        for batch in chunked((json.loads(line) for line in file), importer.batch_size):
+            importer.write_batch(batch)
+    return importer.finish()
+
+
+def merge_import_stats(parts, shop_id=None, shard_dir=None, retire_missing=False, started=None):
+    """
+    Сводит статистику шардов в одну и при необходимости выводит из продажи
+    предложения, которых не было ни в одном шарде
+    """
+    stats = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0, 'errors': 0, 'error_rows': []}
+    for part in parts:
+        for key in ('added', 'changed', 'removed', 'unchanged', 'errors'):
+            stats[key] += part.get(key, 0)
+        stats['error_rows'].extend(part.get('error_rows', []))
+    del stats['error_rows'][IMPORT_MAX_ERROR_ROWS:]
+
+    if retire_missing:
+        importer = PriceListImporter(Shop.objects.get(id=shop_id))
+        with open(os.path.join(shard_dir, SEEN_IDS_FILE)) as file:
+            importer.seen_external_ids = set(json.load(file))
+        importer.retire_missing()
+        stats['removed'] += importer.stats['removed']
+
+    invalidate_catalog_cache()
+
+    if started is not None:
+        seconds = time.time() - started
+        rows = stats['added'] + stats['changed'] + stats['unchanged']
+        stats['seconds'] = round(seconds, 3)
+        stats['rows_per_sec'] = round(rows / seconds, 1) if seconds else rows
+    return stats
+
+
+def invalidate_catalog_cache():
+    """
+    Сбрасывает кэш запросов к каталогу после импорта
+    """
+    if apps.is_installed('cachalot'):
+        from cachalot.api import invalidate
+        invalidate(Category, Product, ProductInfo, Parameter, ProductParameter)
+
+
+def import_feed(sections, user, retire_missing=False, staged=False, batch_size=None, importer_class=None,
+                tracker=None):
+    """
+    Импортирует прайс-лист из потока пар (раздел, значение), которые отдают
+    парсеры из backend.feeds: ('shop', имя), ('category', {...}), ('good', {...}).
+    Товары пишутся пакетами по мере разбора, поэтому память не зависит от размера прайса.
+    При retire_missing=True предложения магазина, которых нет в прайсе, выводятся из продажи.
+    При staged=True прайс публикуется атомарно через промежуточную таблицу.
+    Прогресс и время фаз передаются в tracker (см. backend.jobs).
+    """
+    if importer_class is None:
+        importer_class = StagingImporter if staged else PriceListImporter
+    tracker = tracker or NullTracker()
+    importer = None
+    categories = []
+    goods = []
+    parse_errors = []
+
+    def start(shop):
+        started = importer_class(shop, batch_size=batch_size)
+        started.tracker = tracker
+        return started
+
+    try:
+        for section, value in tracker.track_feed(sections):
+            if section == 'shop':
+                shop, _ = Shop.objects.get_or_create(name=value, user_id=user.id)
+                importer = start(shop)
+            elif section == 'category':
+                categories.append(value)
+            elif section == 'error':
+                parse_errors.append(value)
+            elif section == 'good':
+                if importer is None:
+                    # CSV и JSON Lines могут не указывать магазин: берем магазин пользователя
+                    shop = Shop.objects.filter(user_id=user.id).first()
+                    if shop is None:
+                        raise ValidationError('Магазин должен быть указан до списка товаров')
+                    importer = start(shop)
+                if categories:
+                    importer.import_categories(categories)
+                    categories = []
+                goods.append(value)
+                if len(goods) >= importer.batch_size:
+                    importer.import_goods(goods)
+                    goods = []
+
+        if importer is None:
+            raise ValidationError('Не указан магазин')
+
+        for error in parse_errors:
+            importer.add_error(**error)
+        importer.import_categories(categories)
+        importer.import_goods(goods)
+        importer.publish(retire_missing=retire_missing)
+        with tracker.phase('invalidate'):
+            invalidate_catalog_cache()
+    finally:
+        # Промежуточные строки и файлы не должны остаться и после ошибки разбора
+        if importer is not None:
+            importer.close()
+    return importer.finish()
+
+
+def import_price_list(data, user, retire_missing=False, batch_size=None):
+    """
+    Импортирует разобранный прайс-лист в формате data/shop1.yaml
+    """
+    return import_feed(iter_price_list(data), user, retire_missing=retire_missing, batch_size=batch_size)
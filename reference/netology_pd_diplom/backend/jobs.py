@@ -0,0 +1,121 @@
+import os
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.utils import timezone
+from backend.models import ImportJob
+
+# Как часто (сек) прогресс импорта сохраняется в базу
+IMPORT_PROGRESS_INTERVAL = getattr(settings, 'IMPORT_PROGRESS_INTERVAL', 1.0)
+
+JOB_PROGRESS_FIELDS = ('state', 'phase', 'rows_parsed', 'rows_written', 'bytes_total', 'bytes_read',
+                       'timings', 'updated_at')
+
+
+class NullTracker:
+    """
+    Трекер по умолчанию: импорт идет без записи прогресса
+    """
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def track_feed(self, sections):
+        return sections
+
+    def watch_file(self, file):
+        pass
+
+    def add_written(self, rows):
+        pass
+
+    def start(self):
+        pass
+
+    def finish(self, result=None, state='done'):
+        pass
+
+    def fail(self, error):
+        pass
+
+
+class JobTracker(NullTracker):
+    """
+    Ведет прогресс импорта в ImportJob: текущую фазу, число разобранных
+    и записанных строк, долю прочитанного файла и суммарное время каждой фазы
+    (download, parse, resolve, write, invalidate)
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self._file = None
+        self._saved_at = 0
+
+    @classmethod
+    def for_job(cls, job_id):
+        if job_id is None:
+            return NullTracker()
+        return cls(ImportJob.objects.get(id=job_id))
+
+    @contextmanager
+    def phase(self, name):
+        self.job.phase = name
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.job.timings[name] = round(self.job.timings.get(name, 0) + time.monotonic() - started, 3)
+            self.save()
+
+    def track_feed(self, sections):
+        """
+        Оборачивает поток парсера: время внутри парсера идет в фазу parse
+        """
+        iterator = iter(sections)
+        while True:
+            with self.phase('parse'):
+                try:
+                    section, value = next(iterator)
+                except StopIteration:
+                    return
+            if section == 'good':
+                self.job.rows_parsed += 1
+            yield section, value
+
+    def watch_file(self, file):
+        # У текстовых файлов позиция берется из бинарного буфера под ними
+        self._file = getattr(file, 'buffer', file)
+        self.job.bytes_total = os.fstat(self._file.fileno()).st_size
+
+    def add_written(self, rows):
+        self.job.rows_written += rows
+
+    def start(self):
+        self.job.state = 'running'
+        self.job.started_at = timezone.now()
+        self.job.save(update_fields=JOB_PROGRESS_FIELDS + ('started_at',))
+
+    def save(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._saved_at < IMPORT_PROGRESS_INTERVAL:
+            return
+        self._saved_at = now
+        if self._file is not None and not self._file.closed:
+            self.job.bytes_read = self._file.tell()
+        self.job.save(update_fields=JOB_PROGRESS_FIELDS)
+
+    def finish(self, result=None, state='done'):
+        self.job.state = state
+        self.job.phase = ''
+        self.job.result = result
+        self.job.finished_at = timezone.now()
+        if self.job.bytes_total:
+            self.job.bytes_read = self.job.bytes_total
+        self.job.save(update_fields=JOB_PROGRESS_FIELDS + ('result', 'finished_at'))
+
+    def fail(self, error):
+        self.job.state = 'failed'
+        self.job.error = str(error)
+        self.job.finished_at = timezone.now()
+        self.job.save(update_fields=JOB_PROGRESS_FIELDS + ('error', 'finished_at'))
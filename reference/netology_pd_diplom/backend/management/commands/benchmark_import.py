@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.benchmark import FEED_WRITERS, measure, run_import, serve_directory, write_price_list
+from backend.models import Shop
+
+BENCHMARK_EMAIL = 'benchmark@example.com'
+
+IMPORTERS = ('file', 'partner')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет импорт синтетических прайсов: время, число запросов, пиковую память и строки в секунду. '
+            'Каждый прайс импортируется дважды: в пустой магазин (cold) и повторно без изменений (warm). '
+            'Данные пишутся в базу из настроек от имени пользователя benchmark@example.com.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--goods', type=int, nargs='+', default=[10000],
+                            help='Размеры прайсов, например 10000 100000 1000000')
+        parser.add_argument('--formats', nargs='+', choices=sorted(FEED_WRITERS), default=sorted(FEED_WRITERS))
+        parser.add_argument('--importers', nargs='+', choices=IMPORTERS, default=list(IMPORTERS),
+                            help='file - import_file, partner - обновление по ссылке (PartnerUpdate)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-memory', action='store_true',
+                            help='Не замерять память (tracemalloc замедляет импорт)')
+        parser.add_argument('--output', help='Сохранить результаты в JSON для сравнения между версиями')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(email=BENCHMARK_EMAIL, defaults={'type': 'shop', 'is_active': True})
+        if user.type != 'shop':
+            raise CommandError(f'Пользователь {BENCHMARK_EMAIL} должен быть магазином')
+
+        directory = tempfile.mkdtemp(prefix='benchmark-')
+        results = []
+        try:
+            with serve_directory(directory) as base_url:
+                for goods in options['goods']:
+                    for fmt in options['formats']:
+                        ext, _ = FEED_WRITERS[fmt]
+                        path = write_price_list(os.path.join(directory, f'price-{goods}{ext}'), fmt, goods,
+                                                options['seed'])
+                        for importer in options['importers']:
+                            Shop.objects.filter(user=user).delete()
+                            for run in ('cold', 'warm'):
+                                with measure(goods, trace_memory=not options['no_memory']) as stats:
+                                    result = run_import(importer, path, user, base_url)
+                                stats.update(importer=importer, format=fmt, goods=goods, run=run,
+                                             added=result['added'], changed=result['changed'],
+                                             errors=result['errors'])
+                                results.append(stats)
+                                self.report(stats)
+        finally:
+            Shop.objects.filter(user=user).delete()
+            shutil.rmtree(directory, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    def report(self, stats):
+        self.stdout.write(
+            f"{stats['importer']:<8} {stats['format']:<6} {stats['goods']:>8} {stats['run']:<5} "
+            f"{stats['seconds']:>9.2f} s {stats['queries']:>7} queries "
+            f"{stats.get('peak_mb', '-'):>7} MB {stats['rows_per_sec']:>10} rows/s"
+        )
@@ -0,0 +1,96 @@
+import json
+import random
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.benchmark import generate_price_list, measure, render_orders, render_products
+from backend.fragments import CATALOG_FRAGMENT_CACHE
+from backend.importers import import_feed
+from backend.models import Order, OrderItem, ProductInfo, Shop
+from backend.totals import update_order_totals
+
+BENCHMARK_EMAIL = 'benchmark@example.com'
+BUYER_EMAIL = 'benchmark-buyer@example.com'
+
+PATHS = ('serializer', 'fast')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает чтение горячих списков до и после быстрого пути: ModelSerializer и JSONRenderer '
+            'против проекций values(), фрагментов каталога и orjson. Каталог генерируется и импортируется '
+            'от имени benchmark@example.com, заказы создаются для benchmark-buyer@example.com.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--goods', type=int, default=10000, help='Размер каталога')
+        parser.add_argument('--page-size', type=int, default=100, help='Товаров на странице каталога')
+        parser.add_argument('--orders', type=int, default=20, help='Число заказов покупателя')
+        parser.add_argument('--items', type=int, default=20, help='Позиций в каждом заказе')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-memory', action='store_true',
+                            help='Не замерять память (tracemalloc замедляет сериализацию)')
+        parser.add_argument('--output', help='Сохранить результаты в JSON для сравнения между версиями')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(email=BENCHMARK_EMAIL, defaults={'type': 'shop', 'is_active': True})
+        if user.type != 'shop':
+            raise CommandError(f'Пользователь {BENCHMARK_EMAIL} должен быть магазином')
+        buyer, _ = User.objects.get_or_create(email=BUYER_EMAIL, defaults={'type': 'buyer', 'is_active': True})
+
+        results = []
+        try:
+            Shop.objects.filter(user=user).delete()
+            import_feed(generate_price_list(options['goods'], options['seed']), user)
+            offer_ids = self.create_orders(buyer, options)
+            orders = Order.objects.filter(user=buyer).exclude(state='basket')
+            cases = (
+                ('products', options['page_size'], lambda fast: render_products(offer_ids, fast)),
+                ('orders', options['orders'] * options['items'], lambda fast: render_orders(orders, fast)),
+            )
+            for endpoint, rows, render in cases:
+                bodies = []
+                for path in PATHS:
+                    caches[CATALOG_FRAGMENT_CACHE].clear()
+                    for run in ('cold', 'warm'):
+                        with measure(rows, trace_memory=not options['no_memory']) as stats:
+                            body = render(path == 'fast')
+                        stats.update(endpoint=endpoint, path=path, run=run, rows=rows, bytes=len(body))
+                        results.append(stats)
+                        self.report(stats)
+                    bodies.append(json.loads(body))
+                if bodies[0] != bodies[1]:
+                    raise CommandError(f'Ответы {endpoint} различаются между путями')
+        finally:
+            Order.objects.filter(user=buyer).delete()
+            Shop.objects.filter(user=user).delete()
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    def create_orders(self, buyer, options):
+        """
+        Создает заказы из случайных предложений каталога и возвращает id
+        предложений первой страницы каталога
+        """
+        offer_ids = list(ProductInfo.objects.filter(shop__user__email=BENCHMARK_EMAIL)
+                         .order_by('id').values_list('id', flat=True))
+        rng = random.Random(options['seed'])
+        orders = Order.objects.bulk_create(
+            Order(user=buyer, state='new') for _ in range(options['orders'])
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product_info_id=offer_id, quantity=rng.randint(1, 5))
+            for order in orders
+            for offer_id in rng.sample(offer_ids, min(options['items'], len(offer_ids)))
+        )
+        update_order_totals(user=buyer)
+        return offer_ids[:options['page_size']]
+
+    def report(self, stats):
+        self.stdout.write(
+            f"{stats['endpoint']:<9} {stats['path']:<10} {stats['run']:<5} "
+            f"{stats['seconds']:>9.3f} s {stats['queries']:>6} queries "
+            f"{stats.get('peak_mb', '-'):>7} MB {stats['bytes']:>10} bytes {stats['rows_per_sec']:>10} rows/s"
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from backend.benchmark import FEED_WRITERS, write_price_list
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетический прайс-лист в схеме data/shop1.yaml'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Путь к файлу прайса')
+        parser.add_argument('--goods', type=int, default=10000, help='Число товаров')
+        parser.add_argument('--format', choices=sorted(FEED_WRITERS), default='yaml', dest='fmt')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора')
+
+    def handle(self, *args, **options):
+        path = write_price_list(options['output'], options['fmt'], options['goods'], options['seed'])
+        self.stdout.write(self.style.SUCCESS(f"Прайс на {options['goods']} товаров записан в {path}"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from backend.catalog import refresh_catalog_for
+from backend.models import CatalogEntry
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересобирает каталог для поиска (CatalogEntry) из предложений магазинов'
+
+    def handle(self, *args, **options):
+        refresh_catalog_for()
+        self.stdout.write(self.style.SUCCESS(f'В каталоге {CatalogEntry.objects.count()} предложений'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from backend.totals import update_order_totals
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохраненные суммы и число товаров всех заказов (Order.items_total, Order.items_count)'
+
+    def handle(self, *args, **options):
+        updated = update_order_totals()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано заказов: {updated}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from backend.models import Order
+from backend.shop_orders import split_order
+
+
+class Command(BaseCommand):
+    help = 'Создает части по магазинам (ShopOrder) для оформленных заказов, у которых их еще нет'
+
+    def handle(self, *args, **options):
+        orders = Order.objects.exclude(state='basket').filter(shop_orders__isnull=True).values_list('id', 'state')
+        count = 0
+        for order_id, state in orders.iterator():
+            split_order(order_id, state)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Разделено заказов: {count}'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-17 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0002_order_user_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shoporder',
+            name='shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shop_orders', to='backend.shop', verbose_name='Магазин'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+from django.db import migrations
+from django.db.migrations.operations.base import Operation
+
+CATALOG_TABLE = 'backend_catalogentry'
+SEARCH_TABLES = (('catalog_search', 'unicode61 remove_diacritics 2'), ('catalog_search_trigram', 'trigram'))
+
+
+class VendorOperations(Operation):
+    """
+    Операции схемы только для одной СУБД. Состояние моделей не меняется:
+    индексы поиска у каждой СУБД свои и в моделях не описываются.
+    Операции создаются при применении, чтобы на других СУБД не импортировать их модули.
+    """
+    reversible = True
+    reduces_to_sql = True
+
+    def __init__(self, vendor, operations):
+        self.vendor = vendor
+        self.operations = operations
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.vendor, self.operations], {}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            for operation in self.operations():
+                operation.database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            for operation in reversed(self.operations()):
+                operation.database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return f'Search indexes for {self.vendor}'
+
+
+def postgres_operations():
+    # GIN-индексы полнотекстового поиска и триграмм; выражение FTS совпадает с backend.search.SEARCH_VECTOR
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.contrib.postgres.operations import TrigramExtension
+    from django.contrib.postgres.search import SearchVector
+    return [
+        TrigramExtension(),
+        # Индексы с теми же именами раньше создавались при каждом migrate
+        migrations.RunSQL(
+            ['DROP INDEX IF EXISTS catalog_search_fts_idx', 'DROP INDEX IF EXISTS catalog_search_trigram_idx'],
+            migrations.RunSQL.noop
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=GinIndex(SearchVector('product_name', config='russian'), name='catalog_search_fts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=GinIndex(OpClass('product_name', name='gin_trgm_ops'), name='catalog_search_trigram_idx'),
+        ),
+    ]
+
+
+def sqlite_operations():
+    # Таблицы FTS5 с внешним содержимым: строки берутся из каталога, триггеры
+    # обновляют индекс при каждой записи в каталог, в том числе при импорте
+    return [
+        migrations.RunSQL(
+            [
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(product_name, content='{CATALOG_TABLE}', "
+                f"content_rowid='offer_id', tokenize='{tokenizer}')",
+                f'CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {CATALOG_TABLE} BEGIN '
+                f'INSERT INTO {table}(rowid, product_name) VALUES (new.offer_id, new.product_name); END',
+                f'CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON {CATALOG_TABLE} BEGIN '
+                f"INSERT INTO {table}({table}, rowid, product_name) "
+                f"VALUES ('delete', old.offer_id, old.product_name); END",
+                f'CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF product_name ON {CATALOG_TABLE} BEGIN '
+                f"INSERT INTO {table}({table}, rowid, product_name) "
+                f"VALUES ('delete', old.offer_id, old.product_name); "
+                f'INSERT INTO {table}(rowid, product_name) VALUES (new.offer_id, new.product_name); END',
+                f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+            ],
+            [
+                f'DROP TRIGGER IF EXISTS {table}_update',
+                f'DROP TRIGGER IF EXISTS {table}_delete',
+                f'DROP TRIGGER IF EXISTS {table}_insert',
+                f'DROP TABLE IF EXISTS {table}',
+            ],
+        )
+        for table, tokenizer in SEARCH_TABLES
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0003_shoporder_shop_index'),
+    ]
+
+    operations = [
+        VendorOperations('postgresql', postgres_operations),
+        VendorOperations('sqlite', sqlite_operations),
+    ]
@@ -2,9 +2,9 @@ from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
-from django.db.models import Sum, F
 from django_rest_passwordreset.tokens import get_token_generator
 from easy_thumbnails.fields import ThumbnailerImageField
 
@@ -18,6 +18,19 @@ STATE_CHOICES = (
     ('canceled', 'Отменен'),
 )
 
+IMPORT_JOB_STATE_CHOICES = (
+    ('queued', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('done', 'Завершен'),
+    ('skipped', 'Прайс не изменился'),
+    ('failed', 'Ошибка'),
+)
+
+UPLOAD_STATE_CHOICES = (
+    ('uploading', 'Загружается'),
+    ('complete', 'Загружен'),
+)
+
 USER_TYPE_CHOICES = (
     ('shop', 'Магазин'),
     ('buyer', 'Покупатель'),
@@ -97,6 +110,9 @@ class Shop(models.Model):
                               blank=True, null=True,
                               on_delete=models.CASCADE)
     state = models.BooleanField(verbose_name='статус получения заказов', default=True)
+    # Растет при каждом изменении каталога магазина, из нее строится ETag выдачи
+    version = models.PositiveIntegerField(verbose_name='Версия каталога', default=1)
+    modified_at = models.DateTimeField(verbose_name='Дата изменения каталога', default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
@@ -134,6 +150,9 @@ class Product(models.Model):
         verbose_name = 'Продукт'
         verbose_name_plural = "Список продуктов"
         ordering = ('-name',)
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'category'], name='unique_product'),
+        ]
 
     def __str__(self):
         return f'{self.name} (ID: {self.id})'
@@ -149,6 +168,7 @@ class ProductInfo(models.Model):
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
     discount = models.PositiveIntegerField(verbose_name='Скидка (%)', default=0)
+    content_hash = models.CharField(max_length=32, verbose_name='Хеш содержимого', blank=True)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
@@ -162,7 +182,80 @@ class ProductInfo(models.Model):
         verbose_name = 'Информация о продукте'
         verbose_name_plural = "Информационный список о продуктах"
         constraints = [
-            models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
+            models.UniqueConstraint(fields=['shop', 'external_id'], name='unique_shop_offer'),
+        ]
+        indexes = [
+            # Постраничный вывод предложений магазина по id
+            models.Index(fields=['shop', 'id'], name='productinfo_shop_id_idx'),
+        ]
+
+class CatalogVersion(models.Model):
+    """
+    Версия общих частей каталога, например дерева категорий (name='categories')
+    """
+    name = models.CharField(max_length=40, verbose_name='Название', unique=True)
+    version = models.PositiveIntegerField(verbose_name='Версия', default=1)
+    modified_at = models.DateTimeField(verbose_name='Дата изменения', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Версия каталога'
+        verbose_name_plural = "Версии каталога"
+
+    def __str__(self):
+        return f'{self.name} v{self.version}'
+
+
+class CatalogEntry(models.Model):
+    offer = models.OneToOneField(ProductInfo, verbose_name='Предложение', related_name='catalog_entry',
+                                 primary_key=True, on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='+', on_delete=models.CASCADE,
+                             db_index=False)
+    shop_state = models.BooleanField(verbose_name='Магазин принимает заказы')
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='+', on_delete=models.CASCADE,
+                                 db_index=False)
+    product = models.ForeignKey(Product, verbose_name='Продукт', related_name='+', on_delete=models.CASCADE)
+    product_name = models.CharField(max_length=80, verbose_name='Название для поиска')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    discount = models.PositiveIntegerField(verbose_name='Скидка (%)', default=0)
+    document = models.JSONField(verbose_name='Карточка предложения')
+    version = models.PositiveIntegerField(verbose_name='Версия карточки', default=1)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Строка каталога'
+        verbose_name_plural = "Каталог для поиска"
+        indexes = [
+            # Выдача каталога идет постранично по id предложения внутри фильтра
+            models.Index(fields=['shop_state', 'offer'], name='catalog_state_offer_idx'),
+            models.Index(fields=['shop', 'offer'], name='catalog_shop_offer_idx'),
+            models.Index(fields=['category', 'offer'], name='catalog_category_offer_idx'),
+            # Выдача всегда идет по работающим магазинам, поэтому индексы под фильтры частичные
+            # по shop_state: они меньше полных, а условие совпадает с условием запроса.
+            # id предложения в конце различает равные цены при сортировке
+            models.Index(fields=['price', 'offer'], name='catalog_state_price_idx',
+                         condition=models.Q(shop_state=True)),
+            models.Index(fields=['offer'], name='catalog_instock_offer_idx',
+                         condition=models.Q(shop_state=True, quantity__gt=0)),
+            models.Index(fields=['price', 'offer'], name='catalog_instock_price_idx',
+                         condition=models.Q(shop_state=True, quantity__gt=0)),
+            models.Index(fields=['offer'], name='catalog_discount_offer_idx',
+                         condition=models.Q(shop_state=True, discount__gt=0)),
+            models.Index(fields=['category', 'price', 'offer'], name='catalog_category_price_idx'),
+        ]
+
+class CatalogFacet(models.Model):
+    entry = models.ForeignKey(CatalogEntry, verbose_name='Строка каталога', related_name='facets',
+                              on_delete=models.CASCADE)
+    parameter = models.CharField(max_length=40, verbose_name='Параметр')
+    value = models.CharField(max_length=100, verbose_name='Значение')
+
+    class Meta:
+        verbose_name = 'Значение фильтра'
+        verbose_name_plural = "Индекс фильтров каталога"
+        indexes = [
+            # Инвертированный индекс: (параметр, значение) -> id предложений
+            models.Index(fields=['parameter', 'value', 'entry'], name='catalog_facet_value_idx'),
         ]
 
 class Parameter(models.Model):
@@ -174,6 +267,9 @@ class Parameter(models.Model):
         verbose_name = 'Имя параметра'
         verbose_name_plural = "Список имен параметров"
         ordering = ('-name',)
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_parameter_name'),
+        ]
 
     def __str__(self):
         return self.name
@@ -198,6 +294,111 @@ class ProductParameter(models.Model):
             models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
         ]
 
+class StagedOffer(models.Model):
+    import_key = models.CharField(max_length=32, verbose_name='Ключ импорта')
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='staged_offers',
+                           on_delete=models.CASCADE)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
+    product = models.ForeignKey(Product, verbose_name='Продукт', related_name='staged_offers',
+                              on_delete=models.CASCADE)
+    model = models.CharField(max_length=80, verbose_name='Модель', blank=True)
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    discount = models.PositiveIntegerField(verbose_name='Скидка (%)', default=0)
+    content_hash = models.CharField(max_length=32, verbose_name='Хеш содержимого')
+    parameters = models.JSONField(verbose_name='Параметры', default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    def __str__(self):
+        return f'{self.external_id} ({self.import_key})'
+
+    class Meta:
+        verbose_name = 'Предложение в загрузке'
+        verbose_name_plural = "Промежуточная таблица импорта"
+        constraints = [
+            models.UniqueConstraint(fields=['import_key', 'external_id'], name='unique_staged_offer'),
+        ]
+
+class PriceListSource(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='price_list_sources',
+                           on_delete=models.CASCADE)
+    url = models.URLField(verbose_name='Ссылка на прайс', max_length=500)
+    etag = models.CharField(max_length=200, verbose_name='ETag', blank=True)
+    last_modified = models.CharField(max_length=100, verbose_name='Last-Modified', blank=True)
+    checked_at = models.DateTimeField(verbose_name='Дата проверки', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def __str__(self):
+        return self.url
+
+    class Meta:
+        verbose_name = 'Источник прайса'
+        verbose_name_plural = "Список источников прайсов"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'url'], name='unique_price_list_source'),
+        ]
+
+class PriceListUpload(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='price_list_uploads',
+                           on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='price_list_uploads',
+                           on_delete=models.CASCADE)
+    name = models.CharField(max_length=255, verbose_name='Имя файла')
+    size = models.PositiveBigIntegerField(verbose_name='Размер файла')
+    received = models.PositiveBigIntegerField(verbose_name='Принято байт', default=0)
+    sha256 = models.CharField(max_length=64, verbose_name='SHA-256 содержимого', blank=True, db_index=True)
+    path = models.CharField(max_length=500, verbose_name='Путь в хранилище', blank=True)
+    state = models.CharField(verbose_name='Статус', choices=UPLOAD_STATE_CHOICES, max_length=10,
+                             default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Загрузка прайса'
+        verbose_name_plural = "Список загрузок прайсов"
+        ordering = ('-created_at',)
+
+class ImportJob(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='import_jobs',
+                           on_delete=models.CASCADE)
+    source = models.CharField(max_length=500, verbose_name='Источник')
+    state = models.CharField(verbose_name='Статус', choices=IMPORT_JOB_STATE_CHOICES, max_length=10,
+                             default='queued')
+    phase = models.CharField(max_length=20, verbose_name='Текущая фаза', blank=True)
+    rows_parsed = models.PositiveIntegerField(verbose_name='Разобрано товаров', default=0)
+    rows_written = models.PositiveIntegerField(verbose_name='Записано предложений', default=0)
+    bytes_total = models.PositiveBigIntegerField(verbose_name='Размер файла', null=True, blank=True)
+    bytes_read = models.PositiveBigIntegerField(verbose_name='Прочитано байт', default=0)
+    timings = models.JSONField(verbose_name='Время фаз (сек)', default=dict)
+    result = models.JSONField(verbose_name='Результат', null=True, blank=True)
+    error = models.TextField(verbose_name='Ошибка', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    started_at = models.DateTimeField(verbose_name='Дата запуска', null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name='Дата завершения', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def eta(self):
+        """
+        Оценка оставшегося времени (сек) по доле прочитанного файла
+        """
+        if self.state != 'running' or not self.started_at or not self.bytes_total or not self.bytes_read:
+            return None
+        elapsed = (timezone.now() - self.started_at).total_seconds()
+        return round(elapsed * (self.bytes_total - self.bytes_read) / self.bytes_read, 1)
+
+    def __str__(self):
+        return f'Импорт №{self.id} ({self.source})'
+
+    class Meta:
+        verbose_name = 'Задача импорта'
+        verbose_name_plural = "Список задач импорта"
+        ordering = ('-created_at',)
+
 class Contact(models.Model):
     user = models.ForeignKey(User, verbose_name='Пользователь',
                            related_name='contacts', blank=True,
@@ -222,19 +423,21 @@ class Contact(models.Model):
 class Order(models.Model):
     user = models.ForeignKey(User, verbose_name='Пользователь',
                            related_name='orders', blank=True,
-                           on_delete=models.CASCADE)
+                           on_delete=models.CASCADE, db_index=False)
     dt = models.DateTimeField(auto_now_add=True)
     state = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
     contact = models.ForeignKey(Contact, verbose_name='Контакт',
                               blank=True, null=True,
                               on_delete=models.CASCADE)
     comment = models.TextField(verbose_name='Комментарий к заказу', blank=True)
+    # Сумма и число единиц товара хранятся и пересчитываются backend.totals при изменении позиций
+    items_total = models.PositiveBigIntegerField(verbose_name='Сумма заказа', default=0)
+    items_count = models.PositiveIntegerField(verbose_name='Количество товаров', default=0)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
     def total_sum(self):
-        return self.ordered_items.aggregate(
-            total_sum=Sum(F('quantity') * F('product_info__price'))
-        )['total_sum'] or 0
+        return self.items_total
 
     def get_status_display(self):
         return dict(STATE_CHOICES).get(self.state, 'Неизвестный статус')
@@ -246,6 +449,11 @@ class Order(models.Model):
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказов"
         ordering = ('-dt',)
+        indexes = [
+            # История заказов покупателя: новые первыми. Заменяет индекс внешнего ключа user,
+            # иначе PostgreSQL выбирает его и сортирует историю в памяти
+            models.Index(fields=['user', '-id'], name='order_user_id_idx'),
+        ]
 
     def __str__(self):
         return f'Заказ №{self.id} от {self.dt.strftime("%d.%m.%Y")}'
@@ -257,6 +465,8 @@ class OrderItem(models.Model):
                                    blank=True,
                                    on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    # Цена на момент оформления; у корзины пусто - действует текущая цена предложения
+    price = models.PositiveIntegerField(verbose_name='Цена', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
@@ -270,6 +480,61 @@ class OrderItem(models.Model):
             models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item'),
         ]
 
+class ShopOrder(models.Model):
+    """
+    Часть заказа для одного магазина: создается при подтверждении заказа,
+    по ней магазин видит и обрабатывает только свои позиции
+    """
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='shop_orders', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='shop_orders', on_delete=models.CASCADE,
+                             db_index=False)
+    state = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
+    items_total = models.PositiveBigIntegerField(verbose_name='Сумма', default=0)
+    items_count = models.PositiveIntegerField(verbose_name='Количество товаров', default=0)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Заказ магазина'
+        verbose_name_plural = "Список заказов магазинов"
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'shop'], name='unique_shop_order'),
+        ]
+        indexes = [
+            # Лента заказов магазина: новые первыми, с фильтром по статусу и без него.
+            # Индекс внешнего ключа shop не нужен: его заменяют оба составных индекса
+            models.Index(fields=['shop', 'state', '-id'], name='shoporder_shop_state_idx'),
+            models.Index(fields=['shop', '-id'], name='shoporder_shop_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'Заказ №{self.order_id} ({self.shop_id})'
+
+
+class StockReservation(models.Model):
+    """
+    Резерв остатка под подтвержденный заказ: количество уже списано с ProductInfo.quantity.
+    Резерв снимается, когда магазин принял заказ, и возвращается на склад при отмене
+    или по истечении expires_at. Импорт прайса вычитает активные резервы из остатка прайса.
+    """
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='reservations', on_delete=models.CASCADE)
+    product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', related_name='reservations',
+                                     on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    expires_at = models.DateTimeField(verbose_name='Действует до')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Резерв товара'
+        verbose_name_plural = "Список резервов товаров"
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product_info'], name='unique_order_reservation'),
+        ]
+        indexes = [
+            # Поиск просроченных резервов
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
 class ConfirmEmailToken(models.Model):
     @staticmethod
     def generate_key():
@@ -0,0 +1,55 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+# Размер страницы каталога по умолчанию и максимальный размер, который может запросить клиент
+PRODUCTS_PAGE_SIZE = getattr(settings, 'PRODUCTS_PAGE_SIZE', 20)
+PRODUCTS_MAX_PAGE_SIZE = getattr(settings, 'PRODUCTS_MAX_PAGE_SIZE', 100)
+# То же для лент заказов
+ORDERS_PAGE_SIZE = getattr(settings, 'ORDERS_PAGE_SIZE', 20)
+ORDERS_MAX_PAGE_SIZE = getattr(settings, 'ORDERS_MAX_PAGE_SIZE', 100)
+
+
+# Допустимые значения параметра ordering выдачи каталога
+CATALOG_ORDERINGS = {
+    'price': ('price', 'pk'),
+    '-price': ('-price', '-pk'),
+}
+
+
+class ProductInfoCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация каталога по уникальному id предложения.
+
+    Курсор хранит id последнего предложения страницы, поэтому следующая страница
+    выбирается условием id > <курсор> по индексу, а не через OFFSET, и стоит
+    одинаково на любой глубине каталога. Размер страницы задается параметром page_size.
+    """
+    page_size = PRODUCTS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = PRODUCTS_MAX_PAGE_SIZE
+    ordering = 'pk'
+
+    def get_ordering(self, request, queryset, view):
+        # Сортировка по цене: курсор хранит цену последней строки, равные цены
+        # различает id предложения (и смещение внутри одной цены)
+        # CursorPagination записывает результат в self.ordering, поэтому значение по умолчанию берется у класса
+        return CATALOG_ORDERINGS.get(request.query_params.get('ordering'), (type(self).ordering,))
+
+
+class CatalogSearchPagination(LimitOffsetPagination):
+    """
+    Пагинация результатов поиска по релевантности. Поиск отдает не больше
+    CATALOG_SEARCH_LIMIT лучших совпадений, поэтому смещение ограничено.
+    """
+    default_limit = PRODUCTS_PAGE_SIZE
+    max_limit = PRODUCTS_MAX_PAGE_SIZE
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация лент заказов: новые первыми, курсор - id последней строки страницы
+    """
+    page_size = ORDERS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = ORDERS_MAX_PAGE_SIZE
+    ordering = '-id'
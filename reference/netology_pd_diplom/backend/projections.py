@@ -0,0 +1,195 @@
+from rest_framework import serializers
+from backend.models import STATE_CHOICES, CatalogEntry, Contact, OrderItem, ProductInfo
+from backend.serializers import ProductInfoSerializer
+
+# Колонки, которые читаются для заказов; ответ совпадает с OrderSerializer
+ORDER_COLUMNS = ('id', 'user_id', 'dt', 'state', 'contact_id', 'comment', 'items_total', 'items_count',
+                 'created_at', 'updated_at')
+CONTACT_COLUMNS = ('id', 'city', 'street', 'house', 'structure', 'building', 'apartment', 'phone',
+                   'created_at', 'updated_at')
+ORDER_ITEM_COLUMNS = ('id', 'order_id', 'product_info_id', 'quantity', 'created_at', 'updated_at')
+# Колонки краткой истории заказов покупателя
+ORDER_SUMMARY_COLUMNS = ('id', 'dt', 'state', 'items_total', 'items_count')
+# Колонки ленты заказов магазина: часть заказа вместе с полями самого заказа
+SHOP_ORDER_COLUMNS = ('id', 'order_id', 'shop_id', 'state', 'items_total', 'items_count', 'created_at', 'updated_at',
+                      'order__user_id', 'order__dt', 'order__contact_id', 'order__comment')
+
+STATE_NAMES = dict(STATE_CHOICES)
+
+# Даты форматируются полем DRF, чтобы формат и часовой пояс совпадали с сериализаторами
+_datetime = serializers.DateTimeField()
+
+
+def format_datetime(value):
+    return _datetime.to_representation(value)
+
+
+def offer_cards(offer_ids):
+    """
+    Карточки предложений в формате ProductInfoSerializer: готовые из каталога,
+    недостающие в каталоге собираются сериализатором
+    """
+    cards = dict(CatalogEntry.objects.filter(offer_id__in=offer_ids).values_list('offer_id', 'document'))
+    missing = set(offer_ids) - cards.keys()
+    if missing:
+        offers = ProductInfo.objects.filter(id__in=missing).select_related('shop', 'product__category') \
+            .prefetch_related('product_parameters__parameter')
+        cards.update((card['id'], card) for card in ProductInfoSerializer(offers, many=True).data)
+    return cards
+
+
+def project_contacts(contact_ids):
+    return {
+        contact['id']: {
+            key: format_datetime(value) if key in ('created_at', 'updated_at') else value
+            for key, value in contact.items()
+        }
+        for contact in Contact.objects.filter(id__in=contact_ids).values(*CONTACT_COLUMNS)
+    }
+
+
+def project_orders(queryset):
+    """
+    Заказы в формате OrderSerializer без ModelSerializer: нужные колонки читаются
+    через values() четырьмя запросами (заказы, контакты, позиции, карточки)
+    и собираются в простые словари, готовые для ORJSONRenderer
+    """
+    orders = list(queryset.values(*ORDER_COLUMNS))
+    if not orders:
+        return []
+
+    contacts = project_contacts({order['contact_id'] for order in orders if order['contact_id']})
+
+    items = {}
+    for item in OrderItem.objects.filter(order_id__in=[order['id'] for order in orders]) \
+            .order_by('id').values(*ORDER_ITEM_COLUMNS):
+        items.setdefault(item['order_id'], []).append(item)
+    cards = offer_cards({item['product_info_id'] for order_items in items.values() for item in order_items})
+
+    result = []
+    for order in orders:
+        order_items = items.get(order['id'], [])
+        result.append({
+            'id': order['id'],
+            'user': order['user_id'],
+            'dt': format_datetime(order['dt']),
+            'state': order['state'],
+            'status_display': STATE_NAMES.get(order['state'], 'Неизвестный статус'),
+            'contact': contacts.get(order['contact_id']),
+            'comment': order['comment'],
+            'ordered_items': [
+                {
+                    'id': item['id'],
+                    'product_info': cards.get(item['product_info_id']),
+                    'quantity': item['quantity'],
+                    'created_at': format_datetime(item['created_at']),
+                    'updated_at': format_datetime(item['updated_at']),
+                }
+                for item in order_items
+            ],
+            'total_sum': order['items_total'],
+            'items_count': order['items_count'],
+            'created_at': format_datetime(order['created_at']),
+            'updated_at': format_datetime(order['updated_at']),
+        })
+    return result
+
+
+def project_basket(basket):
+    """
+    Корзина из кэша (backend.baskets.CacheBasketStore) в формате OrderSerializer.
+    Строки корзины - предложения, поэтому id строки совпадает с id предложения.
+    """
+    lines = basket['lines']
+    cards = offer_cards([int(offer_id) for offer_id in lines])
+    ordered_items = [
+        {
+            'id': int(offer_id),
+            'product_info': cards.get(int(offer_id)),
+            'quantity': quantity,
+            'created_at': created_at,
+            'updated_at': updated_at,
+        }
+        for offer_id, (quantity, created_at, updated_at) in sorted(lines.items(), key=lambda line: int(line[0]))
+    ]
+    return {
+        'id': basket['order'],
+        'user': basket['user'],
+        'dt': basket['dt'],
+        'state': 'basket',
+        'status_display': STATE_NAMES['basket'],
+        'contact': None,
+        'comment': '',
+        'ordered_items': ordered_items,
+        'total_sum': sum(item['quantity'] * item['product_info']['price']
+                         for item in ordered_items if item['product_info']),
+        'items_count': sum(item['quantity'] for item in ordered_items),
+        'created_at': basket['created_at'],
+        'updated_at': basket['updated_at'],
+    }
+
+
+def project_order_summaries(rows):
+    """
+    Краткая строка истории заказов из Order.values(*ORDER_SUMMARY_COLUMNS): без позиций,
+    контакта и карточек - сумма и число товаров берутся из сохраненных полей
+    """
+    return [
+        {
+            'id': row['id'],
+            'dt': format_datetime(row['dt']),
+            'state': row['state'],
+            'status_display': STATE_NAMES.get(row['state'], 'Неизвестный статус'),
+            'total_sum': row['items_total'],
+            'items_count': row['items_count'],
+        }
+        for row in rows
+    ]
+
+
+def project_shop_orders(rows):
+    """
+    Лента заказов магазина: строки ShopOrder.values(*SHOP_ORDER_COLUMNS) с позициями
+    только этого магазина. Три запроса на страницу: контакты, позиции, карточки.
+    """
+    if not rows:
+        return []
+
+    contacts = project_contacts({row['order__contact_id'] for row in rows if row['order__contact_id']})
+    items = {}
+    for item in OrderItem.objects.filter(
+        order_id__in=[row['order_id'] for row in rows],
+        product_info__shop_id__in={row['shop_id'] for row in rows}
+    ).order_by('id').values(*ORDER_ITEM_COLUMNS, 'price', 'product_info__shop_id'):
+        items.setdefault((item['order_id'], item['product_info__shop_id']), []).append(item)
+    cards = offer_cards({item['product_info_id'] for order_items in items.values() for item in order_items})
+
+    return [
+        {
+            'id': row['id'],
+            'order': row['order_id'],
+            'user': row['order__user_id'],
+            'dt': format_datetime(row['order__dt']),
+            'state': row['state'],
+            'status_display': STATE_NAMES.get(row['state'], 'Неизвестный статус'),
+            'contact': contacts.get(row['order__contact_id']),
+            'comment': row['order__comment'],
+            'ordered_items': [
+                {
+                    'id': item['id'],
+                    'product_info': cards.get(item['product_info_id']),
+                    'quantity': item['quantity'],
+                    'price': item['price'],
+                    'created_at': format_datetime(item['created_at']),
+                    'updated_at': format_datetime(item['updated_at']),
+                }
+                for item in items.get((row['order_id'], row['shop_id']), [])
+            ],
+            'total_sum': row['items_total'],
+            'items_count': row['items_count'],
+            'created_at': format_datetime(row['created_at']),
+            'updated_at': format_datetime(row['updated_at']),
+        }
+        for row in rows
+    ]
+
@@ -0,0 +1,32 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    # orjson в разы быстрее стандартного json на больших ответах
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dumps(data):
+    """
+    Сериализует простые данные (dict, list, str, числа) в JSON-строку
+    в том же виде, что и JSONRenderer DRF: компактно и без экранирования кириллицы
+    """
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return JSONRenderer().render(data).decode('utf-8')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON-рендерер на orjson для горячих эндпоинтов чтения. Данные, которые
+    orjson не умеет сериализовать (ленивые строки и т.п.), отдаются стандартному рендереру.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
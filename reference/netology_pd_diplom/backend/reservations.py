@@ -0,0 +1,130 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from backend.catalog import refresh_catalog
+from backend.models import Order, OrderItem, ProductInfo, StockReservation
+from backend.shop_orders import split_order, sync_shop_orders
+from backend.totals import capture_prices
+from backend.versions import bump_shop_versions
+
+# Сколько (сек) подтвержденный покупателем заказ держит товар, пока его не примет магазин
+RESERVATION_TTL = getattr(settings, 'RESERVATION_TTL', 30 * 60)
+# Сколько просроченных заказов снимается с резерва за один проход задачи
+RESERVATION_EXPIRE_BATCH = getattr(settings, 'RESERVATION_EXPIRE_BATCH', 500)
+
+
+class ReservationError(ValueError):
+    """
+    Товара не хватает: заказ не подтвержден, остатки не изменились
+    """
+
+
+def confirm_order(order_id, contact_id, ttl=None):
+    """
+    Переводит корзину в статус new и резервирует ее товары одной транзакцией.
+
+    Остаток списывается условным UPDATE ... SET quantity = quantity - n
+    WHERE quantity >= n: проверка и списание атомарны без чтения строки,
+    поэтому параллельные покупатели не продадут больше, чем есть. Строки
+    предложений блокируются в порядке id, так что заказы с общими товарами
+    не взаимоблокируются. При нехватке первой же позиции транзакция
+    откатывается и блокировки снимаются. Возвращает False, если заказ не
+    корзина (уже подтвержден параллельным запросом).
+    """
+    ttl = RESERVATION_TTL if ttl is None else ttl
+    with transaction.atomic():
+        # Смена статуса первой блокирует заказ: повторное подтверждение ждет и ничего не списывает
+        if not Order.objects.filter(id=order_id, state='basket').update(contact_id=contact_id, state='new'):
+            return False
+
+        lines = list(OrderItem.objects.filter(order_id=order_id).order_by('product_info_id').values_list(
+            'product_info_id', 'quantity'
+        ))
+        if not lines:
+            raise ReservationError('Корзина пуста')
+        for offer_id, quantity in lines:
+            if not ProductInfo.objects.filter(id=offer_id, quantity__gte=quantity).update(
+                quantity=F('quantity') - quantity
+            ):
+                raise ReservationError(f'Недостаточно товара: предложение {offer_id}')
+        # Сумма заказа больше не зависит от последующих изменений цен
+        capture_prices(order_id)
+        split_order(order_id)
+
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        StockReservation.objects.bulk_create([
+            StockReservation(order_id=order_id, product_info_id=offer_id, quantity=quantity, expires_at=expires_at)
+            for offer_id, quantity in lines
+        ])
+        # Карточки каталога пересобираются после фиксации, вне блокировок строк
+        transaction.on_commit(lambda: _refresh_stock([offer_id for offer_id, _ in lines]))
+    return True
+
+
+def release_order(order_id):
+    """
+    Возвращает на склад резерв заказа (отмена заказа). Повторный вызов ничего не делает.
+    """
+    with transaction.atomic():
+        reservations = list(StockReservation.objects.select_for_update().filter(order_id=order_id).order_by(
+            'product_info_id'
+        ).values_list('id', 'product_info_id', 'quantity'))
+        for _, offer_id, quantity in reservations:
+            # Выведенному из прайса предложению (остаток 0, хеш сброшен) остаток не возвращается
+            ProductInfo.objects.filter(id=offer_id).exclude(quantity=0, content_hash='').update(
+                quantity=F('quantity') + quantity
+            )
+        StockReservation.objects.filter(id__in=[row[0] for row in reservations]).delete()
+        if reservations:
+            transaction.on_commit(lambda: _refresh_stock([row[1] for row in reservations]))
+    return len(reservations)
+
+
+def commit_order(order_id):
+    """
+    Магазин принял заказ: товар остается списанным, резерв больше не истекает
+    """
+    return StockReservation.objects.filter(order_id=order_id).delete()[0]
+
+
+def expire_reservations(now=None, limit=None):
+    """
+    Отменяет заказы, которые не приняты до истечения резерва, и возвращает их товар.
+    Возвращает число отмененных заказов.
+    """
+    now = now or timezone.now()
+    order_ids = list(StockReservation.objects.filter(expires_at__lte=now).order_by('order_id').values_list(
+        'order_id', flat=True
+    ).distinct()[:limit or RESERVATION_EXPIRE_BATCH])
+    expired = 0
+    for order_id in order_ids:
+        with transaction.atomic():
+            # Заказ, который магазин принял параллельно, не отменяется
+            if Order.objects.filter(id=order_id, state='new').update(state='canceled'):
+                sync_order_state(order_id, 'canceled')
+                expired += 1
+            else:
+                # Заказ успели принять или отменить: резерв приводится к его статусу
+                sync_order_state(order_id, Order.objects.filter(id=order_id).values_list('state', flat=True).first())
+    return expired
+
+
+def sync_order_state(order_id, state):
+    """
+    Приводит резерв и части заказа по магазинам в соответствие новому статусу
+    заказа (правка статуса в админке, истечение резерва)
+    """
+    sync_shop_orders(order_id, state)
+    if state == 'canceled':
+        return release_order(order_id)
+    if state not in ('basket', 'new'):
+        return commit_order(order_id)
+    return 0
+
+
+def _refresh_stock(offer_ids):
+    # Остатки в карточках каталога: несколько строк, вне транзакции с блокировками
+    refresh_catalog(offer_ids)
+    bump_shop_versions(product_infos__id__in=offer_ids)
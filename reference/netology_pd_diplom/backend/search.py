@@ -0,0 +1,101 @@
+import re
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import F
+
+# Сколько лучших совпадений поиска отдается постранично
+CATALOG_SEARCH_LIMIT = getattr(settings, 'CATALOG_SEARCH_LIMIT', 1000)
+# Порог похожести триграмм для поиска с опечатками (PostgreSQL)
+CATALOG_SEARCH_SIMILARITY = getattr(settings, 'CATALOG_SEARCH_SIMILARITY', 0.3)
+
+CATALOG_TABLE = 'backend_catalogentry'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Выражение полнотекстового индекса catalog_search_fts_idx (миграция 0004_search_indexes):
+# запрос строится тем же выражением, иначе PostgreSQL не сможет использовать индекс
+SEARCH_CONFIG = 'russian'
+SEARCH_VECTOR = SearchVector('product_name', config=SEARCH_CONFIG)
+
+
+def search_catalog(queryset, query, limit=None):
+    """
+    Ищет предложения каталога по названию товара внутри выборки queryset.
+
+    Сначала идет полнотекстовый поиск с ранжированием; если он ничего не нашел,
+    поиск по триграммам находит названия с опечатками. Возвращает список id
+    предложений, лучшие совпадения первыми.
+    """
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return []
+
+    limit = limit or CATALOG_SEARCH_LIMIT
+    search = {'postgresql': _search_postgres, 'sqlite': _search_sqlite}.get(connection.vendor, _search_like)
+    return search(tokens, queryset, limit)
+
+
+def _fetch_ids(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_postgres(tokens, queryset, limit):
+    query = SearchQuery(' '.join(tokens), config=SEARCH_CONFIG)
+    entries = queryset.model.objects.filter(offer_id__in=queryset.values('offer_id'))
+    offer_ids = list(
+        entries.annotate(search=SEARCH_VECTOR).filter(search=query)
+        .order_by(SearchRank(SEARCH_VECTOR, query, cover_density=True).desc(), 'offer_id')
+        .values_list('offer_id', flat=True)[:limit]
+    )
+    if offer_ids:
+        return offer_ids
+
+    # Поиск с опечатками: похожесть запроса на слова названия, порог задается явно
+    query = ' '.join(tokens)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, false)",
+                       [str(CATALOG_SEARCH_SIMILARITY)])
+    return list(
+        entries.filter(TrigramSimilar(F('product_name'), query))
+        .order_by(TrigramSimilarity('product_name', query).desc(), 'offer_id')
+        .values_list('offer_id', flat=True)[:limit]
+    )
+
+
+def _search_sqlite(tokens, queryset, limit):
+    base_sql, base_params = queryset.values('offer_id').query.sql_with_params()
+    # Окончания слов в unicode61 не отбрасываются, поэтому токены ищутся по префиксу
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    offer_ids = _fetch_ids(
+        f'SELECT rowid FROM catalog_search WHERE catalog_search MATCH %s AND rowid IN ({base_sql}) '
+        f'ORDER BY bm25(catalog_search), rowid LIMIT %s',
+        [match, *base_params, limit]
+    )
+    if offer_ids:
+        return offer_ids
+
+    # Поиск с опечатками: чем больше общих триграмм с запросом, тем выше в выдаче
+    trigrams = {token[index:index + 3] for token in tokens for index in range(len(token) - 2)}
+    if not trigrams:
+        return []
+    match = ' OR '.join(f'"{trigram}"' for trigram in sorted(trigrams))
+    return _fetch_ids(
+        f'SELECT rowid FROM catalog_search_trigram WHERE catalog_search_trigram MATCH %s '
+        f'AND rowid IN ({base_sql}) ORDER BY bm25(catalog_search_trigram), rowid LIMIT %s',
+        [match, *base_params, limit]
+    )
+
+
+def _search_like(tokens, queryset, limit):
+    # Прочие СУБД: все слова запроса как подстроки названия, без ранжирования
+    base_sql, base_params = queryset.values('offer_id').query.sql_with_params()
+    conditions = ' AND '.join('LOWER(product_name) LIKE %s' for _ in tokens)
+    return _fetch_ids(
+        f'SELECT offer_id FROM {CATALOG_TABLE} WHERE {conditions} AND offer_id IN ({base_sql}) '
+        f'ORDER BY offer_id LIMIT %s',
+        [*(f'%{token}%' for token in tokens), *base_params, limit]
+    )
@@ -2,7 +2,7 @@ from rest_framework import serializers
 from .models import (
     User, Shop, Category, Product, ProductInfo,
     Parameter, ProductParameter, Order, OrderItem, Contact,
-    ConfirmEmailToken
+    ConfirmEmailToken, ImportJob, PriceListUpload
 )
 from easy_thumbnails.templatetags.thumbnail import thumbnail_url
 
@@ -72,6 +72,14 @@ class ProductInfoSerializer(serializers.ModelSerializer):
                  'product_parameters', 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
+class CatalogEntrySerializer(serializers.BaseSerializer):
+    """
+    Строка каталога отдается готовой карточкой в формате ProductInfoSerializer
+    """
+
+    def to_representation(self, instance):
+        return instance.document
+
 class ContactSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
@@ -95,22 +103,39 @@ class OrderItemCreateSerializer(serializers.ModelSerializer):
 
 class OrderSerializer(serializers.ModelSerializer):
     ordered_items = OrderItemSerializer(read_only=True, many=True)
-    total_sum = serializers.SerializerMethodField()
+    total_sum = serializers.IntegerField(source='items_total', read_only=True)
     contact = ContactSerializer(read_only=True)
     status_display = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
         fields = ('id', 'user', 'dt', 'state', 'status_display', 'contact',
-                 'comment', 'ordered_items', 'total_sum', 'created_at', 'updated_at')
-        read_only_fields = ('id', 'dt', 'total_sum', 'created_at', 'updated_at')
-
-    def get_total_sum(self, obj):
-        return obj.total_sum()
+                 'comment', 'ordered_items', 'total_sum', 'items_count', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'dt', 'total_sum', 'items_count', 'created_at', 'updated_at')
 
     def get_status_display(self, obj):
         return obj.get_status_display()
 
+class ImportJobSerializer(serializers.ModelSerializer):
+    eta = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'source', 'state', 'phase', 'rows_parsed', 'rows_written', 'bytes_total', 'bytes_read',
+                  'timings', 'eta', 'result', 'error', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
+
+    def get_eta(self, obj):
+        return obj.eta()
+
+class PriceListUploadSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r'^[0-9a-f]{64}$', required=False)
+
+    class Meta:
+        model = PriceListUpload
+        fields = ('id', 'name', 'size', 'received', 'sha256', 'state', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'received', 'state', 'created_at', 'updated_at')
+
 class ConfirmEmailTokenSerializer(serializers.ModelSerializer):
     class Meta:
         model = ConfirmEmailToken
@@ -0,0 +1,29 @@
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from backend.models import OrderItem, ShopOrder
+
+
+def split_order(order_id, state='new'):
+    """
+    Делит заказ на части по магазинам (ShopOrder) одним агрегирующим запросом
+    и одной вставкой. Вызывается при подтверждении, после фиксации цен.
+    """
+    parts = OrderItem.objects.filter(order_id=order_id).values('product_info__shop_id').annotate(
+        total=Sum(F('quantity') * Coalesce(F('price'), F('product_info__price'))),
+        count=Sum('quantity'),
+    ).order_by('product_info__shop_id')
+    return ShopOrder.objects.bulk_create(
+        [
+            ShopOrder(order_id=order_id, shop_id=part['product_info__shop_id'], state=state,
+                      items_total=part['total'], items_count=part['count'])
+            for part in parts
+        ],
+        ignore_conflicts=True
+    )
+
+
+def sync_shop_orders(order_id, state):
+    """
+    Переносит новый статус заказа в его части по магазинам
+    """
+    return ShopOrder.objects.filter(order_id=order_id).exclude(state=state).update(state=state)
@@ -1,9 +1,10 @@
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_migrate
 from django.dispatch import receiver, Signal
 from django_rest_passwordreset.signals import reset_password_token_created
 from .models import ConfirmEmailToken, User
+from .versions import install_catalog_versions
 
 new_user_registered = Signal()
 new_order = Signal()
@@ -30,6 +31,12 @@ def new_user_registered_signal(sender: User, instance: User, created: bool, **kw
         )
         msg.send()
 
+@receiver(post_migrate)
+def catalog_versions_signal(sender, using, **kwargs):
+    # Индексы поиска создает миграция 0004_search_indexes, здесь - строки версий каталога
+    if sender.name == 'backend':
+        install_catalog_versions(using)
+
 @receiver(new_order)
 def new_order_signal(user_id, **kwargs):
     user = User.objects.get(id=user_id)
@@ -1,8 +1,12 @@
+import os
+import shutil
+import tempfile
 from celery import shared_task
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
-from .models import Order, User, Product
+from django.utils import timezone
+from .models import Order, User, Product, PriceListSource
 from easy_thumbnails.files import generate_all_aliases
 
 @shared_task
@@ -23,17 +27,123 @@ def send_order_confirmation_email(order_id):
 
 
 @shared_task
-def process_import_task(file_path, user_id):
-    from .utils import import_file
+def process_import_task(file_path, user_id, shards=None, job_id=None):
+    from .jobs import JobTracker
+    from .utils import import_file, import_file_sharded
     from django.contrib.auth import get_user_model
     User = get_user_model()
     user = User.objects.get(id=user_id)
+    tracker = JobTracker.for_job(job_id)
+    tracker.start()
     try:
-        result = import_file(file_path, user)
+        if shards and shards > 1:
+            # Задача завершается после сведения шардов в merge_import_stats_task
+            result = import_file_sharded(file_path, user, shards, tracker=tracker, job_id=job_id)
+            tracker.save(force=True)
+            return {'status': 'started', 'result': result}
+        result = import_file(file_path, user, tracker=tracker)
+        tracker.finish(result)
         return {'status': 'success', 'result': result}
     except Exception as e:
+        tracker.fail(e)
         return {'status': 'error', 'error': str(e)}
 
+
+@shared_task
+def partner_update_task(user_id, url, job_id=None):
+    """
+    Обновление прайса партнера по ссылке: условное потоковое скачивание
+    на диск и импорт через промежуточную таблицу
+    """
+    from .importers import import_feed
+    from .jobs import JobTracker
+    from .utils import download_price_list, feed_suffix, iter_file_feed
+    user = User.objects.get(id=user_id)
+    source, _ = PriceListSource.objects.get_or_create(user=user, url=url)
+    tracker = JobTracker.for_job(job_id)
+    tracker.start()
+
+    fd, file_path = tempfile.mkstemp(suffix=feed_suffix(url))
+    os.close(fd)
+    try:
+        with tracker.phase('download'):
+            versions = download_price_list(url, file_path, source.etag, source.last_modified)
+        source.checked_at = timezone.now()
+        if versions is None:
+            source.save(update_fields=['checked_at', 'updated_at'])
+            tracker.finish(state='skipped')
+            return {'status': 'not_modified'}
+
+        result = import_feed(iter_file_feed(file_path, tracker), user, retire_missing=True, staged=True,
+                             tracker=tracker)
+        # Версия запоминается только после успешного импорта, иначе прайс будет скачан снова
+        source.etag, source.last_modified = versions
+        source.save()
+        tracker.finish(result)
+        return {'status': 'success', 'result': result}
+    except Exception as e:
+        tracker.fail(e)
+        return {'status': 'error', 'error': str(e)}
+    finally:
+        os.remove(file_path)
+
+
+@shared_task
+def import_shard_task(shard_path, shop_id):
+    from .importers import import_shard
+    return import_shard(shard_path, shop_id)
+
+
+@shared_task
+def merge_import_stats_task(results, shop_id, shard_dir, retire_missing=False, started=None, first_pass=None,
+                            job_id=None):
+    from .importers import merge_import_stats
+    from .jobs import JobTracker
+    tracker = JobTracker.for_job(job_id)
+    try:
+        with tracker.phase('write'):
+            result = merge_import_stats([first_pass or {}] + results, shop_id, shard_dir, retire_missing, started)
+        tracker.add_written(result['added'] + result['changed'])
+        tracker.finish(result)
+        return {'status': 'success', 'result': result}
+    except Exception as e:
+        tracker.fail(e)
+        raise
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+
+@shared_task
+def import_shards_failed_task(request, exc, traceback, shard_dir, job_id=None):
+    # Если упал хотя бы один шард, chord не вызывает сведение статистики:
+    # временные файлы и задачу импорта закрывает этот обработчик ошибки
+    from .jobs import JobTracker
+    try:
+        JobTracker.for_job(job_id).fail(exc)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+@shared_task
+def flush_baskets_task():
+    # Корзины из кэша в базу (BASKET_BACKEND = 'cache'); с хранилищем в базе писать нечего
+    from .baskets import BASKET_BACKEND, CacheBasketStore
+    if BASKET_BACKEND != 'cache':
+        return 0
+    return CacheBasketStore().flush_all()
+
+
+@shared_task
+def release_expired_reservations_task():
+    from .reservations import expire_reservations
+    return expire_reservations()
+
+
+@shared_task
+def cleanup_uploads_task():
+    from .uploads import cleanup_uploads
+    return cleanup_uploads()
+
+
 @shared_task
 def generate_thumbnails(model_name, pk):
     model = User if model_name == 'user' else Product
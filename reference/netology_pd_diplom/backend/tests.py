@@ -1,11 +1,55 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import shutil
+import tempfile
+from functools import partial
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, TransactionTestCase, RequestFactory, skipUnlessDBFeature
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+from django.http.multipartparser import MultiPartParser
+from django.test.utils import CaptureQueriesContext
+from urllib.parse import urlparse, parse_qs
+from django.db import DatabaseError, connection, connections
+from django.db.models import Q
+from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
+from rest_framework.request import Request
 from rest_framework.test import APIClient
 from rest_framework import status
 from .models import (
-    Shop, Category, Product, ProductInfo,
-    Order, OrderItem, Contact, ConfirmEmailToken
+    Shop, Category, Product, ProductInfo, ProductParameter, StagedOffer, ImportJob, CatalogEntry,
+    CatalogFacet,
+    Order, OrderItem, Contact, ConfirmEmailToken, StockReservation, ShopOrder, PriceListUpload
 )
+from .benchmark import FEED_WRITERS, generate_price_list, write_price_list
+from .feeds import iter_price_list, iter_yaml_feed
+from .catalog import refresh_catalog_for, parse_catalog_filters, parse_facet_filters, filter_by_facets, facet_counts
+from .pagination import OrderCursorPagination, ProductInfoCursorPagination
+from .search import search_catalog
+from .serializers import ProductInfoSerializer, OrderSerializer
+from .baskets import BasketError, CacheBasketStore, add_items, delete_items, parse_lines, update_items
+from .projections import ORDER_SUMMARY_COLUMNS, SHOP_ORDER_COLUMNS, project_order_summaries, project_orders, \
+    project_shop_orders
+from .reservations import ReservationError, confirm_order, expire_reservations, release_order
+from .totals import update_order_totals
+from .renderers import ORJSONRenderer
+from .exports import FEED_EXPORTS, ORDER_EXPORTS, buffered, iter_shop_feed, iter_shop_orders
+from .versions import bump_shop_versions, catalog_state, products_etag, products_last_modified
+from .fragments import fragment_key, render_fragments, fragment_list_response
+from .importers import ShardWriter, import_feed, import_price_list, import_shard, merge_import_stats
+from .utils import import_file
+from .tasks import flush_baskets_task, import_shard_task, import_shards_failed_task, partner_update_task
+from .uploads import UploadStore, StagingUploadHandler, cleanup_uploads, reusable_upload_path
 
 User = get_user_model()
 
@@ -107,8 +151,8 @@ class ProductTests(TestCase):
         """
         response = self.client.get('/api/products/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], 'Test Product')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['product']['name'], 'Test Product')
 
     def test_filter_products_by_category(self):
         """
@@ -116,7 +160,7 @@ class ProductTests(TestCase):
         """
         response = self.client.get('/api/products/?category_id=1')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_filter_products_by_shop(self):
         """
@@ -124,7 +168,54 @@ class ProductTests(TestCase):
         """
         response = self.client.get('/api/products/?shop_id=1')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class ProductPaginationTests(TestCase):
+    """
+    Тесты keyset-пагинации каталога.
+    """
+
+    def setUp(self):
+        shop = Shop.objects.create(name='Test Shop')
+        category = Category.objects.create(name='Test Category')
+        for number in range(25):
+            product = Product.objects.create(name=f'Test Product {number}', category=category)
+            ProductInfo.objects.create(product=product, shop=shop, quantity=1, price=100, price_rrc=120,
+                                       external_id=number)
+
+    def get_page(self, params):
+        paginator = ProductInfoCursorPagination()
+        request = Request(RequestFactory().get('/products', params))
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.paginate_queryset(ProductInfo.objects.all(), request)
+        return page, paginator.get_next_link(), queries
+
+    def test_walk_pages(self):
+        """
+        Тест обхода каталога: все предложения по одному разу, без OFFSET.
+        """
+        params = {'page_size': 10}
+        seen = []
+        while True:
+            page, next_link, queries = self.get_page(params)
+            seen.extend(offer.id for offer in page)
+            self.assertNotIn('OFFSET', queries.captured_queries[-1]['sql'].upper())
+            if not next_link:
+                break
+            params = {key: value[0] for key, value in parse_qs(urlparse(next_link).query).items()}
+
+        self.assertEqual(seen, list(ProductInfo.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_page_size(self):
+        """
+        Тест размера страницы: по умолчанию и заданного клиентом.
+        """
+        page, _, _ = self.get_page({})
+        self.assertEqual(len(page), ProductInfoCursorPagination.page_size)
+        page, next_link, _ = self.get_page({'page_size': 5})
+        self.assertEqual(len(page), 5)
+        self.assertIn('page_size=5', next_link)
 
 
 class BasketTests(TestCase):
@@ -283,4 +374,1685 @@ class ContactTests(TestCase):
         )
         response = self.client.delete(f'/api/contacts/{contact.id}/')
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(Contact.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(Contact.objects.count(), 0)
+
+class PriceListImportTests(TestCase):
+    """
+    Тесты пакетного импорта прайс-листа.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='shop@example.com',
+            password='testpass123',
+            type='shop',
+            is_active=True
+        )
+        self.data = {
+            'shop': 'Test Shop',
+            'categories': [{'id': 224, 'name': 'Смартфоны'}],
+            'goods': [
+                {
+                    'id': 100 + index,
+                    'category': 224,
+                    'model': 'test/model',
+                    'name': f'Смартфон {index}',
+                    'price': 1000 + index,
+                    'price_rrc': 1200,
+                    'quantity': 5,
+                    'parameters': {'Цвет': 'черный', 'Встроенная память (Гб)': 256},
+                }
+                for index in range(50)
+            ]
+        }
+
+    def test_import_creates_and_updates_offers(self):
+        """
+        Тест повторного импорта: меняются только измененные предложения.
+        """
+        stats = import_price_list(self.data, self.user)
+        self.assertEqual(stats['added'], 50)
+        self.assertEqual(ProductInfo.objects.count(), 50)
+        self.assertEqual(ProductParameter.objects.count(), 100)
+        self.assertIn('rows_per_sec', stats)
+
+        self.data['goods'][0]['price'] = 5
+        self.data['goods'][1]['parameters'] = {'Цвет': 'белый'}
+        stats = import_price_list(self.data, self.user)
+        self.assertEqual(stats['added'], 0)
+        self.assertEqual(stats['changed'], 2)
+        self.assertEqual(stats['unchanged'], 48)
+        self.assertEqual(ProductInfo.objects.count(), 50)
+        self.assertEqual(ProductInfo.objects.get(external_id=100).price, 5)
+        self.assertEqual(
+            list(ProductParameter.objects.filter(product_info__external_id=101).values_list('value', flat=True)),
+            ['белый']
+        )
+
+    def test_unchanged_import_writes_nothing(self):
+        """
+        Тест импорта без изменений: обращения к базе только на чтение.
+        """
+        import_price_list(self.data, self.user)
+        with CaptureQueriesContext(connection) as queries:
+            stats = import_price_list(self.data, self.user)
+        self.assertEqual(stats['unchanged'], 50)
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+    def test_missing_offers_are_retired(self):
+        """
+        Тест вывода из прайса: заказанные предложения обнуляются, остальные удаляются.
+        """
+        import_price_list(self.data, self.user)
+        ordered = ProductInfo.objects.get(external_id=100)
+        order = Order.objects.create(user=self.user, state='new')
+        OrderItem.objects.create(order=order, product_info=ordered, quantity=1)
+
+        self.data['goods'] = self.data['goods'][2:]
+        stats = import_price_list(self.data, self.user, retire_missing=True)
+        self.assertEqual(stats['removed'], 2)
+        self.assertFalse(ProductInfo.objects.filter(external_id=101).exists())
+        ordered.refresh_from_db()
+        self.assertEqual(ordered.quantity, 0)
+
+        # Повторный импорт того же прайса ничего не выводит заново
+        version = Shop.objects.get(user=self.user).version
+        stats = import_price_list(self.data, self.user, retire_missing=True)
+        self.assertEqual(stats['removed'], 0)
+        self.assertEqual(Shop.objects.get(user=self.user).version, version)
+
+    def test_import_query_count_does_not_depend_on_size(self):
+        """
+        Тест числа запросов: справочники разрешаются пакетно, а не по одному товару.
+        """
+        self.data['goods'] = [
+            dict(item, id=1000 + index, name=f'Телевизор {index}')
+            for index, item in enumerate(self.data['goods'] * 10)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            stats = import_price_list(self.data, self.user)
+        self.assertEqual(stats['added'], 500)
+        self.assertLess(len(queries), 50)
+
+    def test_invalid_items_are_counted_as_errors(self):
+        """
+        Тест пропуска некорректных товаров без остановки импорта.
+        """
+        self.data['goods'][0].pop('price')
+        self.data['goods'][1]['quantity'] = 'много'
+        stats = import_price_list(self.data, self.user)
+        self.assertEqual(stats['errors'], 2)
+        self.assertEqual(stats['added'], 48)
+
+
+    def test_staged_import_publishes_new_catalog(self):
+        """
+        Тест импорта через промежуточную таблицу: каталог заменяется целиком.
+        """
+        import_price_list(self.data, self.user)
+        self.data['goods'] = self.data['goods'][10:]
+        self.data['goods'][0]['price'] = 1
+
+        stats = import_feed(iter_price_list(self.data), self.user, retire_missing=True, staged=True)
+        self.assertEqual(stats['staged'], 40)
+        self.assertEqual(stats['changed'], 1)
+        self.assertEqual(stats['removed'], 10)
+        self.assertEqual(ProductInfo.objects.count(), 40)
+        self.assertFalse(StagedOffer.objects.exists())
+
+    def test_invalid_staged_import_keeps_live_catalog(self):
+        """
+        Тест проверки в промежуточной таблице: пустой прайс не публикуется.
+        """
+        import_price_list(self.data, self.user)
+        for item in self.data['goods']:
+            item.pop('price')
+
+        with self.assertRaises(ValidationError):
+            import_feed(iter_price_list(self.data), self.user, retire_missing=True, staged=True)
+        self.assertEqual(ProductInfo.objects.count(), 50)
+        self.assertFalse(StagedOffer.objects.exists())
+
+    def test_broken_feed_leaves_no_staged_offers(self):
+        """
+        Тест ошибки разбора посреди прайса: промежуточные строки удаляются, каталог не меняется.
+        """
+        def broken_feed():
+            for index, pair in enumerate(iter_price_list(self.data)):
+                if index == 40:
+                    raise ValueError('Обрыв прайса')
+                yield pair
+
+        with self.assertRaises(ValueError):
+            import_feed(broken_feed(), self.user, staged=True, batch_size=10)
+        self.assertFalse(StagedOffer.objects.exists())
+        self.assertFalse(ProductInfo.objects.exists())
+
+    def test_sharded_import_matches_serial_import(self):
+        """
+        Тест параллельного импорта: шарды вместе дают тот же каталог без дублей справочников.
+        """
+        import_price_list(self.data, self.user)
+        self.data['goods'] = self.data['goods'][5:] + [
+            dict(item, id=500 + index) for index, item in enumerate(self.data['goods'][:20])
+        ]
+        shard_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, shard_dir)
+
+        manifest = import_feed(
+            iter_price_list(self.data), self.user, retire_missing=True, batch_size=10,
+            importer_class=partial(ShardWriter, shard_dir=shard_dir, shards=3)
+        )
+        self.assertEqual(len(manifest['shards']), 3)
+        parts = [import_shard(path, manifest['shop_id']) for path in reversed(manifest['shards'])]
+        stats = merge_import_stats(parts, manifest['shop_id'], shard_dir, retire_missing=True)
+
+        self.assertEqual(stats['added'], 20)
+        self.assertEqual(stats['removed'], 5)
+        self.assertEqual(stats['unchanged'], 45)
+        self.assertEqual(ProductInfo.objects.count(), 65)
+        self.assertEqual(Product.objects.count(), 50)
+
+    def test_failed_shard_cleans_up(self):
+        """
+        Тест падения шарда: обработчик ошибки chord удаляет шарды и закрывает задачу импорта.
+        """
+        shard_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, shard_dir, ignore_errors=True)
+        manifest = import_feed(
+            iter_price_list(self.data), self.user, batch_size=10,
+            importer_class=partial(ShardWriter, shard_dir=shard_dir, shards=3)
+        )
+        with open(manifest['shards'][1], 'w') as file:
+            file.write('{broken')
+        job = ImportJob.objects.create(user=self.user, source='price.yaml')
+
+        with self.assertRaises(ValueError) as failure:
+            for path in manifest['shards']:
+                import_shard_task(path, manifest['shop_id'])
+        import_shards_failed_task(None, failure.exception, None, shard_dir, job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, 'failed')
+        self.assertFalse(os.path.exists(shard_dir))
+
+class YamlFeedTests(TestCase):
+    """
+    Тесты потокового разбора YAML-прайса.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='shop@example.com',
+            password='testpass123',
+            type='shop',
+            is_active=True
+        )
+        goods = ''.join(
+            f'  - id: {index}\n'
+            f'    category: 224\n'
+            f'    name: "Смартфон {index}"\n'
+            f'    price: 110000\n'
+            f'    quantity: 14\n'
+            f'    parameters:\n'
+            f'      "Диагональ (дюйм)": 6.5\n'
+            for index in range(2000)
+        )
+        self.feed = (
+            'shop: Связной\n'
+            'categories:\n'
+            '  - id: 224\n'
+            '    name: Смартфоны\n'
+            'goods:\n' + goods
+        ).encode('utf-8')
+
+    def test_goods_are_yielded_before_whole_file_is_read(self):
+        """
+        Тест ленивого разбора: первый товар доступен до чтения всего файла.
+        """
+        stream = io.BytesIO(self.feed)
+        sections = iter_yaml_feed(stream)
+        self.assertEqual(next(sections), ('shop', 'Связной'))
+        self.assertEqual(next(sections), ('category', {'id': 224, 'name': 'Смартфоны'}))
+        section, item = next(sections)
+        self.assertEqual(section, 'good')
+        self.assertEqual(item['parameters'], {'Диагональ (дюйм)': 6.5})
+        self.assertLess(stream.tell(), len(self.feed) // 2)
+        self.assertEqual(sum(1 for _ in sections), 1999)
+
+    def test_import_yaml_file(self):
+        """
+        Тест потокового импорта YAML-файла через import_file.
+        """
+        with tempfile.NamedTemporaryFile(suffix='.yaml', delete=False) as file:
+            file.write(self.feed)
+        try:
+            stats = import_file(file.name, self.user)
+        finally:
+            os.remove(file.name)
+        self.assertEqual(stats['added'], 2000)
+        self.assertEqual(ProductInfo.objects.filter(shop__name='Связной').count(), 2000)
+
+
+class FeedFormatTests(TestCase):
+    """
+    Тесты потокового импорта CSV и JSON Lines.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='shop@example.com',
+            password='testpass123',
+            type='shop',
+            is_active=True
+        )
+
+    def import_text(self, suffix, text):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, encoding='utf-8', delete=False) as file:
+            file.write(text)
+        try:
+            return import_file(file.name, self.user)
+        finally:
+            os.remove(file.name)
+
+    def test_import_csv(self):
+        """
+        Тест импорта CSV: ошибочная строка пропускается, остальные загружаются.
+        """
+        stats = self.import_text('.csv', (
+            'shop;category;category_name;id;name;price;quantity;param:Цвет\n'
+            'Связной;224;Смартфоны;1;Смартфон 1;1000;5;черный\n'
+            'Связной;224;Смартфоны;2;Смартфон 2;цена;5;белый\n'
+            'Связной;15;Аксессуары;3;Чехол;100;50;\n'
+        ))
+        self.assertEqual(stats['added'], 2)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['error_rows'][0]['id'], '2')
+        self.assertEqual(Category.objects.get(id=15).name, 'Аксессуары')
+        self.assertEqual(ProductParameter.objects.get().value, 'черный')
+
+    def test_import_json_lines(self):
+        """
+        Тест импорта JSON Lines: битая строка учитывается как ошибка.
+        """
+        stats = self.import_text('.jsonl', (
+            '{"type": "shop", "name": "Связной"}\n'
+            '{"type": "category", "id": 224, "name": "Смартфоны"}\n'
+            '{"id": 1, "category": 224, "name": "Смартфон 1", "price": 1000, "quantity": 5,'
+            ' "parameters": {"Диагональ (дюйм)": 6.5}}\n'
+            '{"id": 2, "category": 224\n'
+            '{"id": 3, "category": 224, "name": "Смартфон 3", "price": 900, "quantity": 1}\n'
+        ))
+        self.assertEqual(stats['added'], 2)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['error_rows'][0]['line'], 4)
+        self.assertEqual(Shop.objects.get(user=self.user).name, 'Связной')
+        self.assertEqual(ProductParameter.objects.get().value, '6.5')
+
+    def test_json_lines_shop_without_name(self):
+        """
+        Тест JSON Lines: запись магазина без названия - ошибочная строка, а не ошибка базы.
+        """
+        feed = (
+            '{"type": "shop"}\n'
+            '{"type": "category", "id": 224, "name": "Смартфоны"}\n'
+            '{"id": 1, "category": 224, "name": "Смартфон 1", "price": 1000, "quantity": 5}\n'
+        )
+        with self.assertRaises(ValidationError):
+            self.import_text('.jsonl', feed)
+
+        Shop.objects.create(name='Связной', user=self.user)
+        stats = self.import_text('.jsonl', feed)
+        self.assertEqual(stats['added'], 1)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['error_rows'][0], {'line': 1, 'error': 'Не указано название магазина'})
+        self.assertEqual(Shop.objects.get().name, 'Связной')
+
+
+class PriceListHandler(BaseHTTPRequestHandler):
+    """
+    Локальная замена сервера партнера с поддержкой ETag.
+    """
+    body = b''
+    etag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        PriceListHandler.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PartnerUpdateTaskTests(TestCase):
+    """
+    Тесты фонового обновления прайса по ссылке.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='shop@example.com',
+            password='testpass123',
+            type='shop',
+            is_active=True
+        )
+        PriceListHandler.body = (
+            'shop: Связной\n'
+            'categories:\n'
+            '  - id: 224\n'
+            '    name: Смартфоны\n'
+            'goods:\n'
+            '  - id: 1\n'
+            '    category: 224\n'
+            '    name: Смартфон\n'
+            '    price: 1000\n'
+            '    quantity: 3\n'
+        ).encode('utf-8')
+        PriceListHandler.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), PriceListHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/price.yaml'
+
+    def test_unchanged_feed_is_skipped(self):
+        """
+        Тест условной загрузки: неизмененный прайс не скачивается и не импортируется.
+        """
+        result = partner_update_task(self.user.id, self.url)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['result']['added'], 1)
+
+        result = partner_update_task(self.user.id, self.url)
+        self.assertEqual(result, {'status': 'not_modified'})
+        self.assertEqual(PriceListHandler.requests[-1]['If-None-Match'], '"v1"')
+        self.assertEqual(ProductInfo.objects.count(), 1)
+
+    def test_job_progress(self):
+        """
+        Тест задачи импорта: прогресс, время фаз и пропуск неизмененного прайса.
+        """
+        job = ImportJob.objects.create(user=self.user, source=self.url)
+        partner_update_task(self.user.id, self.url, job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.rows_parsed, 1)
+        self.assertEqual(job.rows_written, 1)
+        self.assertEqual(job.bytes_read, job.bytes_total)
+        self.assertEqual(job.result['added'], 1)
+        for phase in ('download', 'parse', 'resolve', 'write', 'invalidate'):
+            self.assertIn(phase, job.timings)
+
+        job = ImportJob.objects.create(user=self.user, source=self.url)
+        partner_update_task(self.user.id, self.url, job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, 'skipped')
+        self.assertEqual(job.rows_parsed, 0)
+
+
+class UploadStoreTests(TestCase):
+    """
+    Тесты хранилища загруженных прайсов.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.store = UploadStore(self.root)
+        self.content = 'shop: Связной\ngoods: []\n'.encode('utf-8')
+
+    def test_resumable_upload(self):
+        """
+        Тест загрузки по кускам: повтор куска и докачка с принятой позиции.
+        """
+        received = self.store.append(1, 0, io.BytesIO(self.content[:10]))
+        self.assertEqual(received, 10)
+        # Повтор того же куска после обрыва не дублирует данные
+        received = self.store.append(1, 5, io.BytesIO(self.content[5:10]))
+        self.assertEqual(received, 10)
+        received = self.store.append(1, 10, io.BytesIO(self.content[10:]))
+        self.assertEqual(received, len(self.content))
+
+        sha256, path = self.store.complete(1, '.YAML')
+        self.assertEqual(path, self.store.blob_path(sha256, '.yaml'))
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(os.path.exists(self.store.partial_path(1)))
+
+    def test_duplicate_upload(self):
+        """
+        Тест дедупликации: повторная загрузка того же файла дает тот же путь.
+        """
+        self.store.append(1, 0, io.BytesIO(self.content))
+        sha256, path = self.store.complete(1, '.yaml')
+        self.store.append(2, 0, io.BytesIO(self.content))
+        self.assertEqual(self.store.complete(2, '.yaml'), (sha256, path))
+        self.assertTrue(self.store.exists(sha256, '.yaml'))
+        self.assertEqual(os.listdir(os.path.join(self.root, 'partial')), [])
+
+    def test_upload_handler(self):
+        """
+        Тест обработчика загрузки: файл пишется в хранилище, хеш считается при приеме.
+        """
+        request = RequestFactory().post('/', {'file': io.BytesIO(self.content)})
+        request.upload_handlers = [StagingUploadHandler(request, self.store)]
+        _, files = MultiPartParser(request.META, request, request.upload_handlers).parse()
+
+        uploaded_file = files['file']
+        uploaded_file.close()
+        self.assertTrue(uploaded_file.temporary_file_path().startswith(os.path.join(self.root, 'tmp')))
+        path = self.store.commit(uploaded_file.temporary_file_path(), uploaded_file.sha256, '.yaml')
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(os.listdir(os.path.join(self.root, 'tmp')), [])
+
+
+    def test_reuse_only_own_uploads(self):
+        """
+        Тест дедупликации по хешу от клиента: повторно используются только прайсы своего магазина.
+        """
+        owner = User.objects.create_user(email='owner@example.com', password='testpass123', type='shop')
+        other = User.objects.create_user(email='other@example.com', password='testpass123', type='shop')
+        shop = Shop.objects.create(name='Связной', user=owner)
+        other_shop = Shop.objects.create(name='Евросеть', user=other)
+        self.store.append(1, 0, io.BytesIO(self.content))
+        sha256, path = self.store.complete(1, '.yaml')
+        PriceListUpload.objects.create(user=owner, shop=shop, name='price.yaml', size=len(self.content),
+                                       received=len(self.content), sha256=sha256, path=path, state='complete')
+
+        self.assertEqual(reusable_upload_path(shop.id, sha256, '.yaml', self.store), path)
+        self.assertIsNone(reusable_upload_path(other_shop.id, sha256, '.yaml', self.store))
+
+    def test_cleanup(self):
+        """
+        Тест очистки: брошенные загрузки и прайсы без ссылок удаляются, используемые остаются.
+        """
+        owner = User.objects.create_user(email='owner@example.com', password='testpass123', type='shop')
+        shop = Shop.objects.create(name='Связной', user=owner)
+        self.store.append(1, 0, io.BytesIO(self.content))
+        _, kept = self.store.complete(1, '.yaml')
+        PriceListUpload.objects.create(user=owner, shop=shop, name='price.yaml', size=1, path=kept, state='complete')
+        self.store.append(2, 0, io.BytesIO(b'orphan'))
+        _, orphan = self.store.complete(2, '.yaml')
+        abandoned = PriceListUpload.objects.create(user=owner, shop=shop, name='price.yaml', size=100)
+        self.store.append(abandoned.id, 0, io.BytesIO(self.content[:10]))
+
+        self.assertEqual(cleanup_uploads(self.store), (0, 0))
+        self.assertEqual(cleanup_uploads(self.store, max_age=-1), (1, 1))
+        self.assertTrue(os.path.exists(kept))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(self.store.partial_path(abandoned.id)))
+        self.assertFalse(PriceListUpload.objects.filter(id=abandoned.id).exists())
+
+
+class ShopImportViewTests(TestCase):
+    """
+    Тесты запуска импорта файлом из запроса.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        root = mock.patch('backend.uploads.IMPORT_UPLOAD_ROOT', self.root)
+        root.start()
+        self.addCleanup(root.stop)
+        delay = mock.patch('backend.views.process_import_task.delay', return_value=mock.Mock(id='task'))
+        self.delay = delay.start()
+        self.addCleanup(delay.stop)
+
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        self.shop = Shop.objects.create(name='Связной', user=self.user)
+        self.url = f'/api/v1/shops/{self.shop.id}/import_products/'
+        self.content = 'shop: Связной\ngoods: []\n'.encode('utf-8')
+
+    def post_file(self, client, name='price.yaml', **extra):
+        file = io.BytesIO(self.content)
+        file.name = name
+        return client.post(self.url, {'file': file}, **extra)
+
+    def test_session_upload(self):
+        """
+        Тест загрузки под сессией: проверка CSRF разбирает тело раньше действия,
+        но файл все равно пишется в хранилище загрузок.
+        """
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        token = 'a' * 32
+        client.cookies['csrftoken'] = token
+
+        response = self.post_file(client, HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        path = UploadStore(self.root).blob_path(hashlib.sha256(self.content).hexdigest(), '.yaml')
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.delay.call_args.args[0], path)
+        self.assertEqual(ImportJob.objects.get(id=response.json()['job_id']).source, 'price.yaml')
+
+    def test_token_upload_rejects_unknown_format(self):
+        """
+        Тест загрузки по токену: файл неподдерживаемого формата не остается во временном каталоге.
+        """
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = self.post_file(client, name='price.xls')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(os.listdir(os.path.join(self.root, 'tmp')), [])
+        self.delay.assert_not_called()
+
+
+class ImportBenchmarkTests(TestCase):
+    """
+    Тесты генератора прайсов и замера импорта.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_generated_feeds_import(self):
+        """
+        Тест генератора: прайс во всех форматах импортируется без ошибок и одинаково.
+        """
+        self.assertEqual(list(generate_price_list(50, seed=1)), list(generate_price_list(50, seed=1)))
+
+        for fmt in sorted(FEED_WRITERS):
+            user = User.objects.create_user(email=f'{fmt}@example.com', password='testpass123', type='shop',
+                                            is_active=True)
+            ext, _ = FEED_WRITERS[fmt]
+            path = write_price_list(os.path.join(self.directory, f'price{ext}'), fmt, 50, seed=1)
+            result = import_file(path, user)
+            self.assertEqual((result['added'], result['errors']), (50, 0), fmt)
+
+        offers = ProductInfo.objects.filter(external_id=1000000).select_related('product__category')
+        self.assertEqual(len({(offer.product.name, offer.price, offer.quantity) for offer in offers}), 1)
+        parameters = [
+            sorted(offer.product_parameters.values_list('parameter__name', 'value')) for offer in offers
+        ]
+        self.assertEqual(len(parameters), 3)
+        self.assertTrue(parameters[0])
+        self.assertTrue(parameters[0] == parameters[1] == parameters[2])
+
+    def test_benchmark_command(self):
+        """
+        Тест команды benchmark_import: каждый импортер замеряется в холодном и повторном прогоне.
+        """
+        output = os.path.join(self.directory, 'results.json')
+        call_command('benchmark_import', goods=[20], formats=['csv'], output=output, stdout=io.StringIO())
+
+        with open(output) as file:
+            results = json.load(file)
+        self.assertEqual([(row['importer'], row['run']) for row in results],
+                         [('file', 'cold'), ('file', 'warm'), ('partner', 'cold'), ('partner', 'warm')])
+        for row in results:
+            self.assertEqual(row['added'], 20 if row['run'] == 'cold' else 0)
+            self.assertGreater(row['queries'], 0)
+            self.assertIn('peak_mb', row)
+
+
+class CatalogTests(TestCase):
+    """
+    Тесты каталога для поиска (CatalogEntry).
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        self.data = {
+            'shop': 'Test Shop',
+            'categories': [{'id': 224, 'name': 'Смартфоны'}, {'id': 15, 'name': 'Аксессуары'}],
+            'goods': [
+                {
+                    'id': 100 + index,
+                    'category': 224 if index % 2 else 15,
+                    'name': f'Смартфон {index}',
+                    'price': 1000 + index,
+                    'price_rrc': 1200,
+                    'quantity': 5,
+                    'parameters': {'Цвет': 'черный'},
+                }
+                for index in range(10)
+            ]
+        }
+        import_price_list(self.data, self.user)
+
+    def assertCatalogCurrent(self):
+        offers = ProductInfo.objects.order_by('id')
+        documents = [entry.document for entry in CatalogEntry.objects.order_by('pk')]
+        self.assertEqual(documents, ProductInfoSerializer(offers, many=True).data)
+
+    def test_import_keeps_catalog_current(self):
+        """
+        Тест импорта: каталог совпадает с карточками ProductInfoSerializer после каждого изменения.
+        """
+        self.assertEqual(CatalogEntry.objects.count(), 10)
+        self.assertCatalogCurrent()
+
+        self.data['goods'][0]['price'] = 5
+        self.data['goods'][1]['parameters'] = {'Цвет': 'белый'}
+        del self.data['goods'][2]
+        import_price_list(self.data, self.user, retire_missing=True)
+        self.assertEqual(CatalogEntry.objects.count(), 9)
+        self.assertEqual(CatalogEntry.objects.get(offer__external_id=100).price, 5)
+        self.assertCatalogCurrent()
+
+    def test_shop_state(self):
+        """
+        Тест изменения магазина: строки каталога пересобираются.
+        """
+        shop = Shop.objects.get()
+        Shop.objects.filter(id=shop.id).update(state=False)
+        refresh_catalog_for(shop_id=shop.id)
+        self.assertFalse(CatalogEntry.objects.filter(shop_state=True).exists())
+        self.assertCatalogCurrent()
+
+    def test_listing_queries(self):
+        """
+        Тест выдачи: страница каталога - один запрос, карточки берутся из кэша фрагментов.
+        """
+        cache.clear()
+        category = Category.objects.get(name='Смартфоны')
+        paginator = ProductInfoCursorPagination()
+        request = Request(RequestFactory().get('/products', {'page_size': 3}))
+        queryset = CatalogEntry.objects.filter(shop_state=True, category_id=category.id).only('offer_id', 'version')
+
+        with self.assertNumQueries(2):
+            page = paginator.paginate_queryset(queryset, request)
+            render_fragments([(entry.offer_id, entry.version) for entry in page])
+        with self.assertNumQueries(1):
+            page = paginator.paginate_queryset(queryset, request)
+            response = fragment_list_response(
+                render_fragments([(entry.offer_id, entry.version) for entry in page]),
+                next=paginator.get_next_link()
+            )
+
+        data = json.loads(response.content)
+        self.assertEqual(len(data['results']), 3)
+        self.assertIn('cursor=', data['next'])
+        self.assertTrue(all(item['product']['category'] == 'Смартфоны' for item in data['results']))
+        offer = ProductInfo.objects.get(id=data['results'][0]['id'])
+        self.assertEqual(data['results'][0], json.loads(json.dumps(ProductInfoSerializer(offer).data)))
+
+    def test_fragment_invalidation(self):
+        """
+        Тест кэша фрагментов: после импорта меняется только фрагмент измененного предложения.
+        """
+        cache.clear()
+        entries = list(CatalogEntry.objects.order_by('pk').values_list('offer_id', 'version'))
+        render_fragments(entries)
+
+        self.data['goods'][0]['price'] = 5
+        import_price_list(self.data, self.user)
+
+        changed = CatalogEntry.objects.get(offer__external_id=100)
+        self.assertEqual(changed.version, 2)
+        self.assertIsNone(cache.get(fragment_key(changed.offer_id, 1)))
+        self.assertEqual(CatalogEntry.objects.filter(version=1).count(), 9)
+
+        fragments = render_fragments(CatalogEntry.objects.order_by('pk').values_list('offer_id', 'version'))
+        self.assertEqual(json.loads(fragments[0])['price'], 5)
+        self.assertEqual(fragments[1:], render_fragments(entries[1:]))
+
+
+class CatalogFacetTests(TestCase):
+    """
+    Тесты фильтров каталога по параметрам.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                        is_active=True)
+        colors = ('черный', 'белый', 'синий')
+        memory = ('128', '256')
+        import_price_list({
+            'shop': 'Test Shop',
+            'categories': [{'id': 224, 'name': 'Смартфоны'}],
+            'goods': [
+                {
+                    'id': index,
+                    'category': 224,
+                    'name': f'Смартфон {index}',
+                    'price': 1000,
+                    'price_rrc': 1200,
+                    'quantity': 5,
+                    'parameters': {'Цвет': colors[index % 3], 'Встроенная память (Гб)': memory[index % 2]},
+                }
+                for index in range(12)
+            ]
+        }, user)
+        self.catalog = CatalogEntry.objects.filter(shop_state=True)
+
+    def external_ids(self, filters):
+        queryset = filter_by_facets(self.catalog, parse_facet_filters(filters))
+        return sorted(queryset.values_list('offer__external_id', flat=True))
+
+    def test_filters(self):
+        """
+        Тест фильтров: ИЛИ внутри параметра, И между параметрами.
+        """
+        self.assertEqual(CatalogFacet.objects.count(), 24)
+        self.assertEqual(self.external_ids(['Цвет:черный']), [0, 3, 6, 9])
+        self.assertEqual(self.external_ids(['Цвет:черный|белый']), [0, 1, 3, 4, 6, 7, 9, 10])
+        self.assertEqual(self.external_ids(['Цвет:черный|белый', 'Встроенная память (Гб):256']), [1, 3, 7, 9])
+        self.assertEqual(self.external_ids(['Цвет:зеленый']), [])
+        with self.assertRaises(ValueError):
+            parse_facet_filters(['Цвет'])
+
+    def test_facet_counts(self):
+        """
+        Тест счетчиков значений по текущей выборке.
+        """
+        queryset = filter_by_facets(self.catalog, parse_facet_filters(['Встроенная память (Гб):128']))
+        with self.assertNumQueries(1):
+            facets = facet_counts(queryset)
+        self.assertEqual(facets, {
+            'Встроенная память (Гб)': {'128': 6},
+            'Цвет': {'белый': 2, 'синий': 2, 'черный': 2},
+        })
+        self.assertEqual(facet_counts(self.catalog, limit=1)['Цвет'], {'белый': 4})
+
+
+class CatalogSearchTests(TestCase):
+    """
+    Тесты поиска по названию товара.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        self.names = [
+            'Смартфон Apple iPhone XR 256GB (красный)',
+            'Смартфон Samsung Galaxy S20 128GB (черный)',
+            'Телевизор Samsung QLED Q90R 65"',
+            'Кабель Apple Lightning',
+        ]
+        self.data = {
+            'shop': 'Test Shop',
+            'categories': [{'id': 224, 'name': 'Электроника'}],
+            'goods': [
+                {'id': index, 'category': 224, 'name': name, 'price': 1000, 'price_rrc': 1200, 'quantity': 1}
+                for index, name in enumerate(self.names)
+            ]
+        }
+        import_price_list(self.data, self.user)
+
+    def search(self, query):
+        offer_ids = search_catalog(CatalogEntry.objects.filter(shop_state=True), query)
+        names = dict(CatalogEntry.objects.values_list('offer_id', 'product_name'))
+        return [names[offer_id] for offer_id in offer_ids]
+
+    def test_full_text(self):
+        """
+        Тест полнотекстового поиска: все слова запроса, без учета регистра и окончаний.
+        """
+        self.assertEqual(sorted(self.search('samsung')), sorted(self.names[1:3]))
+        self.assertEqual(self.search('СМАРТФОН samsung'), [self.names[1]])
+        self.assertEqual(sorted(self.search('смартф')), sorted(self.names[:2]))
+        # Другое окончание находит поиск по триграммам
+        self.assertEqual(sorted(self.search('смартфоны')[:2]), sorted(self.names[:2]))
+        self.assertEqual(self.search('...'), [])
+
+    def test_typos(self):
+        """
+        Тест поиска с опечатками по триграммам.
+        """
+        self.assertEqual(self.search('телевизр')[0], self.names[2])
+        self.assertEqual(self.search('lightnig')[0], self.names[3])
+
+    def test_index_follows_import(self):
+        """
+        Тест обновления индекса при импорте: переименованный и удаленный товары.
+        """
+        self.data['goods'][3]['name'] = 'Кабель Apple USB-C'
+        del self.data['goods'][2]
+        import_price_list(self.data, self.user, retire_missing=True)
+
+        self.assertEqual(self.search('usb'), ['Кабель Apple USB-C'])
+        self.assertEqual(self.search('lightning'), [])
+        self.assertEqual(self.search('телевизор'), [])
+
+
+class OrderProjectionTests(TestCase):
+    """
+    Тесты быстрого пути чтения заказов (проекции values() и orjson).
+    """
+
+    def setUp(self):
+        self.shop_user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                                  is_active=True)
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='testpass123', is_active=True)
+        import_feed(generate_price_list(20, seed=2), self.shop_user)
+        contact = Contact.objects.create(user=self.buyer, city='Москва', street='Тверская', phone='+79991234567')
+        offers = list(ProductInfo.objects.order_by('id'))
+        for index, state in enumerate(('new', 'confirmed', 'basket')):
+            order = Order.objects.create(user=self.buyer, state=state, contact=contact if index else None)
+            for offer in offers[index::3][:4]:
+                OrderItem.objects.create(order=order, product_info=offer, quantity=index + 1)
+        Order.objects.create(user=self.buyer, state='canceled')
+        update_order_totals(user=self.buyer)
+
+    def test_projection_matches_serializer(self):
+        """
+        Тест проекции: ответ совпадает с OrderSerializer, в том числе для предложения вне каталога.
+        """
+        orders = Order.objects.filter(user=self.buyer).order_by('id')
+        expected = json.loads(json.dumps(OrderSerializer(orders, many=True).data))
+
+        with self.assertNumQueries(4):
+            projected = project_orders(orders)
+        self.assertEqual(json.loads(ORJSONRenderer().render(projected)), expected)
+
+        CatalogEntry.objects.filter(offer_id=ProductInfo.objects.order_by('id').first().id).delete()
+        self.assertEqual(json.loads(ORJSONRenderer().render(project_orders(orders))), expected)
+        self.assertEqual(project_orders(orders.none()), [])
+
+    def test_renderer(self):
+        """
+        Тест ORJSONRenderer: те же данные, что у JSONRenderer, и запасной путь для неизвестных типов.
+        """
+        from decimal import Decimal
+        from rest_framework.renderers import JSONRenderer
+        data = {'name': 'Смартфон', 'price': 10, 'items': [{'id': 1}], 'empty': None}
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        data = {'price': Decimal('1.50')}
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_benchmark_command(self):
+        """
+        Тест команды benchmark_read: оба пути замеряются и отдают одинаковые ответы.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = os.path.join(directory, 'results.json')
+        call_command('benchmark_read', goods=30, page_size=10, orders=3, items=5, no_memory=True, output=output,
+                     stdout=io.StringIO())
+
+        with open(output) as file:
+            results = json.load(file)
+        self.assertEqual([(row['endpoint'], row['path']) for row in results[::2]],
+                         [('products', 'serializer'), ('products', 'fast'),
+                          ('orders', 'serializer'), ('orders', 'fast')])
+        self.assertFalse(Order.objects.filter(user__email='benchmark-buyer@example.com').exists())
+
+
+class CatalogVersionTests(TestCase):
+    """
+    Тесты версий каталога и условных GET-запросов (ETag).
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        self.data = {
+            'shop': 'Test Shop',
+            'categories': [{'id': 224, 'name': 'Смартфоны'}],
+            'goods': [{'id': 100, 'category': 224, 'name': 'Смартфон', 'price': 1000, 'price_rrc': 1200,
+                       'quantity': 5, 'parameters': {'Цвет': 'черный'}}],
+        }
+        import_price_list(self.data, self.user)
+        self.view = condition(etag_func=products_etag, last_modified_func=products_last_modified)(
+            lambda request: HttpResponse('catalog')
+        )
+
+    def test_versions_follow_changes(self):
+        """
+        Тест версий: повторный импорт без изменений не меняет ETag, изменения - меняют.
+        """
+        shop = Shop.objects.get()
+        etag, last_modified = catalog_state()
+        self.assertIsNotNone(last_modified)
+
+        import_price_list(self.data, self.user)
+        self.assertEqual(catalog_state(), (etag, last_modified))
+
+        self.data['goods'][0]['price'] = 900
+        import_price_list(self.data, self.user)
+        changed = catalog_state()[0]
+        self.assertNotEqual(changed, etag)
+
+        self.data['categories'].append({'id': 15, 'name': 'Аксессуары'})
+        import_price_list(self.data, self.user)
+        self.assertNotEqual(catalog_state()[0], changed)
+        self.assertEqual(catalog_state(shop.id, categories=False), catalog_state(categories=False))
+
+        other = Shop.objects.create(name='Другой магазин')
+        bump_shop_versions(id=other.id)
+        self.assertNotEqual(catalog_state(shop.id, categories=False), catalog_state(categories=False))
+
+    def test_deleted_shop_does_not_repeat_etag(self):
+        """
+        Тест удаления магазина: то же число магазинов и та же сумма версий не возвращают старый ETag.
+        """
+        second = Shop.objects.create(name='Второй магазин', version=3)
+        Shop.objects.create(name='Третий магазин', version=2)
+        seen = {catalog_state()[0]}
+
+        second.delete()
+        seen.add(catalog_state()[0])
+        Shop.objects.create(name='Четвертый магазин')
+        for _ in range(3):
+            bump_shop_versions(name='Четвертый магазин')
+            self.assertNotIn(catalog_state()[0], seen)
+            seen.add(catalog_state()[0])
+
+    def test_retired_offers_change_etag(self):
+        """
+        Тест вывода из прайса: удаление предложений без заказов меняет ETag.
+        """
+        self.data['goods'].append(dict(self.data['goods'][0], id=101, name='Смартфон 2'))
+        import_price_list(self.data, self.user)
+        etag = catalog_state()[0]
+        self.data['goods'].pop()
+        stats = import_price_list(self.data, self.user, retire_missing=True)
+        self.assertEqual(stats['removed'], 1)
+        self.assertNotEqual(catalog_state()[0], etag)
+
+    def test_not_modified(self):
+        """
+        Тест If-None-Match: совпавший ETag дает 304 без запросов к таблицам каталога.
+        """
+        response = self.view(RequestFactory().get('/products'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.view(RequestFactory().get('/products', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in queries.captured_queries if 'catalogentry' in query['sql']])
+
+        Shop.objects.filter(user=self.user).update(state=False)
+        refresh_catalog_for(shop__user=self.user)
+        response = self.view(RequestFactory().get('/products', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(response.status_code, 200)
+
+
+class ExportTests(TestCase):
+    """
+    Тесты потоковой выгрузки каталога и заказов магазина.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        import_feed(generate_price_list(120, seed=3), self.user)
+        self.shop = Shop.objects.get(user=self.user)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def offers(self, user):
+        return sorted(
+            (offer.external_id, offer.product.name, offer.product.category_id, offer.model, offer.price,
+             offer.price_rrc, offer.quantity, offer.discount,
+             tuple(sorted(offer.product_parameters.values_list('parameter__name', 'value'))))
+            for offer in ProductInfo.objects.filter(shop__user=user).select_related('product')
+        )
+
+    def test_round_trip(self):
+        """
+        Тест выгрузки: файл в каждом формате заново импортируется в такой же каталог.
+        """
+        ProductInfo.objects.filter(shop=self.shop, external_id=1000000).update(discount=5)
+        for fmt, (ext, _, render) in FEED_EXPORTS.items():
+            path = os.path.join(self.directory, f'catalog{ext}')
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                file.writelines(buffered(render(iter_shop_feed(self.shop, chunk_size=50)), size=1000))
+
+            user = User.objects.create_user(email=f'{fmt}@example.com', password='testpass123', type='shop',
+                                            is_active=True)
+            result = import_file(path, user)
+            self.assertEqual((result['added'], result['errors']), (120, 0), fmt)
+            self.assertEqual(self.offers(user), self.offers(self.user), fmt)
+
+    def test_chunked_reads(self):
+        """
+        Тест курсора: число запросов растет с числом кусков, а не с числом товаров.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            sections = list(iter_shop_feed(self.shop, chunk_size=50))
+        self.assertEqual(len([section for section, _ in sections if section == 'good']), 120)
+        self.assertLessEqual(len(queries), 2 + 3)
+
+    def test_orders(self):
+        """
+        Тест выгрузки заказов: только позиции этого магазина и без корзин.
+        """
+        buyer = User.objects.create_user(email='buyer@example.com', password='testpass123', is_active=True)
+        other = User.objects.create_user(email='other@example.com', password='testpass123', type='shop',
+                                         is_active=True)
+        import_feed(generate_price_list(5, seed=4, shop='Другой'), other)
+        order = Order.objects.create(user=buyer, state='new')
+        OrderItem.objects.create(order=order, product_info=ProductInfo.objects.filter(shop=self.shop).first(),
+                                 quantity=2)
+        OrderItem.objects.create(order=order, product_info=ProductInfo.objects.filter(shop__user=other).first(),
+                                 quantity=1)
+        basket = Order.objects.create(user=buyer, state='basket')
+        OrderItem.objects.create(order=basket, product_info=ProductInfo.objects.filter(shop=self.shop).last(),
+                                 quantity=1)
+
+        rows = list(iter_shop_orders(self.shop))
+        self.assertEqual([(row['order'], row['quantity'], row['email']) for row in rows], [(order.id, 2, buyer.email)])
+        self.assertEqual(rows[0]['sum'], 2 * rows[0]['price'])
+
+        for fmt, (_, _, render) in ORDER_EXPORTS.items():
+            lines = ''.join(render(iter_shop_orders(self.shop))).splitlines()
+            self.assertEqual(len(lines), 2 if fmt == 'csv' else 1, fmt)
+
+
+class QueryPlanMixin:
+    """
+    Проверка плана запроса страницы выдачи: нужный индекс и отсутствие сортировки в памяти
+    """
+
+    def assertUsesIndex(self, queryset, index):
+        if connection.vendor == 'postgresql':
+            # Свежая статистика и только упорядоченные просмотры индекса: на маленькой
+            # таблице PostgreSQL иначе выбрал бы полный или bitmap-просмотр с сортировкой
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(queryset.model._meta.db_table)}')
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_bitmapscan = off')
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        # SQLite сортирует во временном B-дереве, PostgreSQL - узлом Sort
+        self.assertNotIn('TEMP B-TREE', plan.upper())
+        self.assertIsNone(re.search(r'^\s*(->\s*)?(Incremental )?Sort(\s+\(|$)', plan, re.MULTILINE), plan)
+
+
+class CatalogIndexTests(QueryPlanMixin, TestCase):
+    """
+    Тесты фильтров по цене, наличию и скидке и планов их запросов.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        import_feed(generate_price_list(300, seed=5), self.user)
+        ProductInfo.objects.filter(external_id__lt=1000030).update(discount=10)
+        refresh_catalog_for(shop__user=self.user)
+
+    def catalog(self, **params):
+        return CatalogEntry.objects.filter(Q(shop_state=True) & parse_catalog_filters(params))
+
+    @staticmethod
+    def page(queryset, *ordering):
+        # Выдача всегда читается страницами: курсор ограничивает выборку LIMIT
+        return queryset.order_by(*ordering)[:ProductInfoCursorPagination.page_size + 1]
+
+    def test_filters(self):
+        """
+        Тест фильтров: диапазон цен, наличие и скидка.
+        """
+        entries = self.catalog(price_min='5000', price_max='40000', in_stock='1')
+        self.assertTrue(entries.exists())
+        self.assertFalse(entries.exclude(price__range=(5000, 40000), quantity__gt=0).exists())
+        self.assertEqual(self.catalog(discount_min='5').count(), 30)
+        self.assertEqual(self.catalog(discount_min='0').count(), 300)
+        for params in ({'price_min': '-1'}, {'discount_min': 'много'}, {'in_stock': 'может быть'}):
+            with self.assertRaises(ValueError):
+                parse_catalog_filters(params)
+
+    def test_price_ordering(self):
+        """
+        Тест сортировки по цене: обход страниц курсором дает все предложения по возрастанию цены.
+        """
+        params = {'ordering': 'price', 'page_size': 40, 'in_stock': '1'}
+        seen = []
+        while True:
+            paginator = ProductInfoCursorPagination()
+            request = Request(RequestFactory().get('/products', params))
+            page = paginator.paginate_queryset(self.catalog(**params).only('offer_id', 'version', 'price'), request)
+            seen.extend((entry.price, entry.offer_id) for entry in page)
+            next_link = paginator.get_next_link()
+            if not next_link:
+                break
+            params = {key: value[0] for key, value in parse_qs(urlparse(next_link).query).items()}
+
+        self.assertEqual(seen, sorted(self.catalog(in_stock='1').values_list('price', 'offer_id')))
+
+    def test_query_plans(self):
+        """
+        Тест планов: каждый шаблон выдачи идет по своему составному индексу без сортировки в памяти.
+        """
+        category = Category.objects.order_by('id').first()
+        self.assertUsesIndex(self.page(self.catalog(price_min='1000', price_max='5000'), 'price', 'pk'),
+                             'catalog_state_price_idx')
+        self.assertUsesIndex(self.page(self.catalog(in_stock='1'), 'pk'), 'catalog_instock_offer_idx')
+        self.assertUsesIndex(self.page(self.catalog(in_stock='1', price_max='5000'), '-price', '-pk'),
+                             'catalog_instock_price_idx')
+        self.assertUsesIndex(self.page(self.catalog(discount_min='10'), 'pk'), 'catalog_discount_offer_idx')
+        self.assertUsesIndex(self.page(self.catalog(price_min='1000').filter(category=category), 'price', 'pk'),
+                             'catalog_category_price_idx')
+
+    def test_migrations_match_models(self):
+        """
+        Тест миграций: индексы из планов созданы миграциями, а не только описаны в моделях.
+        """
+        call_command('makemigrations', 'backend', check=True, dry_run=True, verbosity=0)
+
+
+class BasketWriteTests(TestCase):
+    """
+    Тесты пакетного изменения корзины.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        import_feed(generate_price_list(40, seed=6), self.user)
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='testpass123', is_active=True)
+        self.basket = Order.objects.create(user=self.buyer, state='basket')
+        self.offer_ids = list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+
+    def test_add_items(self):
+        """
+        Тест добавления: число запросов не зависит от числа строк, повтор заменяет количество.
+        """
+        with self.assertNumQueries(5):
+            add_items(self.basket, {offer_id: 1 for offer_id in self.offer_ids[:30]})
+        with self.assertNumQueries(5):
+            add_items(self.basket, {self.offer_ids[0]: 5, self.offer_ids[35]: 2})
+
+        self.assertEqual(self.basket.ordered_items.count(), 31)
+        self.assertEqual(self.basket.ordered_items.get(product_info_id=self.offer_ids[0]).quantity, 5)
+
+    def test_all_or_nothing(self):
+        """
+        Тест ошибок: одна неверная строка отменяет весь запрос.
+        """
+        Shop.objects.update(state=False)
+        with self.assertRaises(BasketError):
+            add_items(self.basket, {self.offer_ids[0]: 1})
+        Shop.objects.update(state=True)
+        with self.assertRaises(BasketError):
+            add_items(self.basket, {self.offer_ids[0]: 1, 10 ** 9: 1})
+        self.assertFalse(self.basket.ordered_items.exists())
+
+        add_items(self.basket, {offer_id: 1 for offer_id in self.offer_ids[:3]})
+        item_ids = list(self.basket.ordered_items.order_by('id').values_list('id', flat=True))
+        with self.assertRaises(BasketError):
+            update_items(self.basket, {item_ids[0]: 7, 10 ** 9: 1})
+        self.assertEqual(set(self.basket.ordered_items.values_list('quantity', flat=True)), {1})
+
+        with self.assertNumQueries(5):
+            self.assertEqual(update_items(self.basket, {item_id: 3 for item_id in item_ids}), 3)
+        self.assertEqual(set(self.basket.ordered_items.values_list('quantity', flat=True)), {3})
+        self.assertEqual(delete_items(self.basket, item_ids[:2]), 2)
+
+    def test_parse_lines(self):
+        """
+        Тест разбора запроса: повторы суммируются, неверные значения отклоняются.
+        """
+        self.assertEqual(parse_lines([{'id': 1, 'quantity': 2}, {'id': 1, 'quantity': 3}], 'id'), {1: 5})
+        for items in ([], {'id': 1}, [{'id': 1, 'quantity': 0}], [{'id': '1', 'quantity': 1}],
+                      [{'id': 1, 'quantity': True}]):
+            with self.assertRaises(BasketError):
+                parse_lines(items, 'id')
+
+
+class BasketStoreTests(TestCase):
+    """
+    Тесты корзины в кэше с отложенной записью в базу.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        import_feed(generate_price_list(20, seed=7), self.user)
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='testpass123', is_active=True)
+        self.offer_ids = list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+        self.store = CacheBasketStore()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_edits_do_not_write_items(self):
+        """
+        Тест правок: строки меняются только в кэше, в базе одна строка корзины.
+        """
+        self.store.add(self.buyer.id, {offer_id: 1 for offer_id in self.offer_ids[:5]})
+        with self.assertNumQueries(1):
+            self.store.add(self.buyer.id, {self.offer_ids[0]: 4})
+        with self.assertNumQueries(0):
+            self.store.update(self.buyer.id, {self.offer_ids[1]: 2})
+            self.store.delete(self.buyer.id, [self.offer_ids[4], 10 ** 9])
+        with self.assertRaises(BasketError):
+            self.store.update(self.buyer.id, {10 ** 9: 1})
+
+        basket = Order.objects.get(user=self.buyer, state='basket')
+        self.assertFalse(basket.ordered_items.exists())
+        items = self.store.orders(self.buyer.id)[0]['ordered_items']
+        self.assertEqual([(item['id'], item['quantity']) for item in items],
+                         list(zip(self.offer_ids[:4], [4, 2, 1, 1])))
+
+    def test_flush(self):
+        """
+        Тест записи: корзина из кэша совпадает с корзиной в базе и по ответу GET.
+        """
+        self.store.add(self.buyer.id, {offer_id: 1 for offer_id in self.offer_ids[:3]})
+        self.store.add(self.buyer.id, {self.offer_ids[0]: 5})
+        self.assertEqual(flush_baskets_task(), 0)
+        with self.assertNumQueries(7):
+            self.assertEqual(self.store.flush_all(), 1)
+        self.assertEqual(self.store.flush_all(), 0)
+
+        self.store.delete(self.buyer.id, [self.offer_ids[2]])
+        self.store.flush(self.buyer.id)
+        basket = Order.objects.get(user=self.buyer, state='basket')
+        self.assertEqual(dict(basket.ordered_items.values_list('product_info_id', 'quantity')),
+                         {self.offer_ids[0]: 5, self.offer_ids[1]: 1})
+
+        cached = self.store.orders(self.buyer.id)[0]
+        stored = project_orders(Order.objects.filter(id=basket.id))[0]
+        self.assertEqual(cached['total_sum'], stored['total_sum'])
+        self.assertEqual(cached.keys(), stored.keys())
+        self.assertEqual([(item['product_info'], item['quantity']) for item in cached['ordered_items']],
+                         [(item['product_info'], item['quantity']) for item in stored['ordered_items']])
+
+        # После истечения кэша корзина читается из базы
+        self.store.forget(self.buyer.id)
+        self.assertEqual([item['quantity'] for item in self.store.orders(self.buyer.id)[0]['ordered_items']], [5, 1])
+
+    def test_flush_skips_deleted_offers(self):
+        """
+        Тест записи после импорта: строки удаленных предложений выбрасываются, остальные записываются.
+        """
+        self.store.add(self.buyer.id, {offer_id: 1 for offer_id in self.offer_ids[:3]})
+        ProductInfo.objects.filter(id=self.offer_ids[1]).delete()
+        self.store.flush(self.buyer.id)
+        basket = Order.objects.get(user=self.buyer, state='basket')
+        self.assertEqual(set(basket.ordered_items.values_list('product_info_id', flat=True)),
+                         {self.offer_ids[0], self.offer_ids[2]})
+        self.assertEqual([item['id'] for item in self.store.orders(self.buyer.id)[0]['ordered_items']],
+                         [self.offer_ids[0], self.offer_ids[2]])
+
+    def test_flush_after_checkout(self):
+        """
+        Тест записи устаревшей копии: оформленный заказ не меняется.
+        """
+        self.store.add(self.buyer.id, {offer_id: 1 for offer_id in self.offer_ids[:2]})
+        self.store.flush(self.buyer.id)
+        order = Order.objects.get(user=self.buyer, state='basket')
+        Order.objects.filter(id=order.id).update(state='new')
+        self.store.add(self.buyer.id, {self.offer_ids[0]: 7, self.offer_ids[2]: 1})
+
+        self.store.flush(self.buyer.id)
+        self.assertEqual(dict(order.ordered_items.values_list('product_info_id', 'quantity')),
+                         {self.offer_ids[0]: 1, self.offer_ids[1]: 1})
+        self.assertEqual(Order.objects.get(id=order.id).items_count, 2)
+
+    def test_flush_all_keeps_failed(self):
+        """
+        Тест периодической записи: ошибка одной корзины не мешает остальным, она остается в реестре.
+        """
+        other = User.objects.create_user(email='other@example.com', password='testpass123', is_active=True)
+        failing = self.buyer.id
+
+        class FailingStore(CacheBasketStore):
+            def flush(self, user_id):
+                if user_id == failing:
+                    raise DatabaseError('сбой записи')
+                super().flush(user_id)
+
+        store = FailingStore()
+        store.add(self.buyer.id, {self.offer_ids[0]: 1})
+        store.add(other.id, {self.offer_ids[1]: 2})
+        self.assertEqual(store.flush_all(), 1)
+        self.assertTrue(Order.objects.get(user=other, state='basket').ordered_items.exists())
+        self.assertEqual(cache.get('basket:dirty'), {failing})
+
+
+class ReservationTests(TestCase):
+    """
+    Тесты резерва товара при подтверждении заказа.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        import_feed(generate_price_list(5, seed=8), self.user)
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='testpass123', is_active=True)
+        self.contact = Contact.objects.create(user=self.buyer, city='Москва', street='Тверская', phone='+79990000000')
+        self.offers = list(ProductInfo.objects.order_by('id'))
+        ProductInfo.objects.update(quantity=10)
+
+    def basket(self, quantities):
+        basket = Order.objects.create(user=self.buyer, state='basket')
+        add_items(basket, {offer.id: quantity for offer, quantity in zip(self.offers, quantities)})
+        return basket
+
+    def stock(self):
+        return list(ProductInfo.objects.order_by('id').values_list('quantity', flat=True))
+
+    def test_confirm_reserves_stock(self):
+        """
+        Тест подтверждения: остатки списаны, повторное подтверждение ничего не меняет.
+        """
+        basket = self.basket([3, 10])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(confirm_order(basket.id, self.contact.id))
+        self.assertFalse(confirm_order(basket.id, self.contact.id))
+        self.assertEqual(self.stock(), [7, 0, 10, 10, 10])
+        self.assertEqual(basket.reservations.count(), 2)
+        self.assertEqual(Order.objects.get(id=basket.id).state, 'new')
+        self.assertEqual(CatalogEntry.objects.get(offer=self.offers[1]).quantity, 0)
+
+    def test_shortage_rolls_back(self):
+        """
+        Тест нехватки: заказ остается корзиной, ни один остаток не списан.
+        """
+        basket = self.basket([3, 4, 11])
+        with self.assertRaises(ReservationError):
+            confirm_order(basket.id, self.contact.id)
+        self.assertEqual(self.stock(), [10] * 5)
+        self.assertEqual(Order.objects.get(id=basket.id).state, 'basket')
+        self.assertFalse(basket.reservations.exists())
+
+    def test_release_and_expire(self):
+        """
+        Тест возврата: отмена и истечение срока возвращают товар один раз.
+        """
+        canceled, expired, accepted = self.basket([2]), self.basket([0, 3]), self.basket([0, 0, 4])
+        for order in (canceled, expired, accepted):
+            confirm_order(order.id, self.contact.id, ttl=0)
+        self.assertEqual(release_order(canceled.id), 1)
+        self.assertEqual(release_order(canceled.id), 0)
+        Order.objects.filter(id=accepted.id).update(state='confirmed')
+
+        self.assertEqual(expire_reservations(), 1)
+        self.assertEqual(expire_reservations(), 0)
+        self.assertEqual(self.stock(), [10, 10, 6, 10, 10])
+        self.assertEqual(Order.objects.get(id=expired.id).state, 'canceled')
+        self.assertEqual(Order.objects.get(id=accepted.id).state, 'confirmed')
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_import_keeps_reservations(self):
+        """
+        Тест импорта при активном резерве: остаток прайса уменьшается на резерв,
+        а отмена заказа не возвращает товар выведенному из прайса предложению.
+        """
+        basket = self.basket([3, 0, 2])
+        confirm_order(basket.id, self.contact.id)
+        feed = [
+            (section, dict(value, quantity=10) if section == 'good' else value)
+            for section, value in generate_price_list(5, seed=8)
+            if section != 'good' or value['id'] != self.offers[2].external_id
+        ]
+
+        import_feed(iter(feed), self.user, retire_missing=True)
+        self.assertEqual(self.stock(), [7, 10, 0, 10, 10])
+        import_feed(iter(feed), self.user, retire_missing=True)
+        self.assertEqual(self.stock(), [7, 10, 0, 10, 10])
+
+        release_order(basket.id)
+        self.assertEqual(self.stock(), [10, 10, 0, 10, 10])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockContentionTests(TransactionTestCase):
+    """
+    Нагрузочный тест резерва: много покупателей одновременно подтверждают один товар.
+    Нужна СУБД с блокировками строк (PostgreSQL): SQLite блокирует базу целиком.
+    """
+    buyers = 200
+    stock = 50
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        import_feed(generate_price_list(2, seed=9), self.user)
+        first, second = ProductInfo.objects.order_by('id')
+        ProductInfo.objects.filter(id=first.id).update(quantity=self.stock)
+        ProductInfo.objects.filter(id=second.id).update(quantity=self.buyers)
+        buyers = User.objects.bulk_create([User(email=f'buyer{number}@example.com', username=f'buyer{number}')
+                                           for number in range(self.buyers)])
+        baskets = Order.objects.bulk_create([Order(user=buyer, state='basket') for buyer in buyers])
+        # Половина заказов берет товары в обратном порядке: блокировки все равно идут по id
+        OrderItem.objects.bulk_create([
+            OrderItem(order=basket, product_info_id=offer_id, quantity=1)
+            for number, basket in enumerate(baskets)
+            for offer_id in ((first.id, second.id) if number % 2 else (second.id, first.id))
+        ])
+        self.orders = [basket.id for basket in baskets]
+        self.offers = first.id, second.id
+
+    def test_no_oversell(self):
+        """
+        Тест параллельных подтверждений: продано ровно столько, сколько было, без взаимоблокировок.
+        """
+        results, errors = [], []
+        barrier = threading.Barrier(20)
+
+        def confirm(order_ids):
+            barrier.wait()
+            try:
+                for order_id in order_ids:
+                    try:
+                        results.append(confirm_order(order_id, None))
+                    except ReservationError:
+                        results.append(False)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=confirm, args=(self.orders[number::20],)) for number in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), self.buyers)
+        self.assertEqual(results.count(True), self.stock)
+        first, second = (ProductInfo.objects.get(id=offer_id).quantity for offer_id in self.offers)
+        self.assertEqual(first, 0)
+        self.assertEqual(second, self.buyers - self.stock)
+        self.assertEqual(StockReservation.objects.filter(product_info_id=self.offers[0]).count(), self.stock)
+        self.assertEqual(Order.objects.filter(state='new').count(), self.stock)
+
+
+class OrderTotalsTests(TestCase):
+    """
+    Тесты сохраненных сумм заказов.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        self.feed = list(generate_price_list(6, seed=10))
+        import_feed(self.feed, self.user)
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='testpass123', is_active=True)
+        self.offers = list(ProductInfo.objects.order_by('id'))
+        ProductInfo.objects.update(quantity=100)
+
+    def totals(self, order):
+        order = Order.objects.get(id=order.id)
+        expected = sum(item.quantity * (item.product_info.price if item.price is None else item.price)
+                       for item in order.ordered_items.select_related('product_info'))
+        self.assertEqual(order.items_total, expected)
+        return order.items_total, order.items_count
+
+    def test_basket_changes(self):
+        """
+        Тест корзины: сумма и число товаров следуют за добавлением, изменением и удалением.
+        """
+        basket = Order.objects.create(user=self.buyer, state='basket')
+        add_items(basket, {self.offers[0].id: 2, self.offers[1].id: 1})
+        self.assertEqual(self.totals(basket)[1], 3)
+        item = basket.ordered_items.get(product_info=self.offers[0])
+        update_items(basket, {item.id: 5})
+        self.assertEqual(self.totals(basket)[1], 6)
+        delete_items(basket, [item.id])
+        self.assertEqual(self.totals(basket), (self.offers[1].price, 1))
+        self.assertEqual(OrderSerializer(Order.objects.get(id=basket.id)).data['total_sum'], self.offers[1].price)
+
+    def test_reprice(self):
+        """
+        Тест смены цен импортом: корзина пересчитывается, оформленный заказ хранит цену оформления.
+        """
+        contact = Contact.objects.create(user=self.buyer, city='Москва', street='Тверская', phone='+79990000000')
+        ordered = Order.objects.create(user=self.buyer, state='basket')
+        add_items(ordered, {self.offers[0].id: 1})
+        confirm_order(ordered.id, contact.id)
+        basket = Order.objects.create(user=self.buyer, state='basket')
+        add_items(basket, {self.offers[0].id: 2})
+        price = self.offers[0].price
+
+        for section, value in self.feed:
+            if section == 'good' and value['id'] == self.offers[0].external_id:
+                value['price'] = price + 100
+        import_feed(self.feed, self.user)
+
+        self.assertEqual(self.totals(ordered), (price, 1))
+        self.assertEqual(self.totals(basket), ((price + 100) * 2, 2))
+        self.assertEqual(project_orders(Order.objects.filter(id=ordered.id))[0]['total_sum'], price)
+
+
+class ShopOrderTests(QueryPlanMixin, TestCase):
+    """
+    Тесты частей заказа по магазинам и ленты заказов магазина.
+    """
+
+    def setUp(self):
+        self.shops = []
+        for number in range(2):
+            user = User.objects.create_user(email=f'shop{number}@example.com', password='testpass123', type='shop',
+                                            is_active=True)
+            import_feed(generate_price_list(4, seed=11 + number, shop=f'Магазин {number}'), user)
+            self.shops.append(Shop.objects.get(user=user))
+        ProductInfo.objects.update(quantity=100)
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='testpass123', is_active=True)
+        self.contact = Contact.objects.create(user=self.buyer, city='Москва', street='Тверская', phone='+79990000000')
+        self.offers = {shop.id: list(shop.product_infos.order_by('id')) for shop in self.shops}
+
+    def confirm(self, quantities):
+        basket = Order.objects.create(user=self.buyer, state='basket')
+        add_items(basket, {offer.id: quantity for shop in self.shops
+                           for offer, quantity in zip(self.offers[shop.id], quantities)})
+        confirm_order(basket.id, self.contact.id)
+        return basket
+
+    def feed(self, shop, params):
+        paginator = OrderCursorPagination()
+        request = Request(RequestFactory().get('/partner/orders', params))
+        queryset = ShopOrder.objects.filter(shop=shop, **({'state': params['state']} if 'state' in params else {}))
+        page = paginator.paginate_queryset(queryset.values(*SHOP_ORDER_COLUMNS), request)
+        return project_shop_orders(page), paginator.get_next_link()
+
+    def test_split_on_confirm(self):
+        """
+        Тест подтверждения: по части на магазин, суммы частей складываются в сумму заказа.
+        """
+        order = self.confirm([1, 2])
+        parts = list(order.shop_orders.order_by('shop_id'))
+        self.assertEqual([part.shop_id for part in parts], [shop.id for shop in self.shops])
+        self.assertEqual([part.items_count for part in parts], [3, 3])
+        order.refresh_from_db()
+        self.assertEqual(sum(part.items_total for part in parts), order.items_total)
+
+        Order.objects.filter(id=order.id).update(state='new')
+        expire_reservations(now=timezone.now() + timedelta(days=1))
+        self.assertEqual(set(order.shop_orders.values_list('state', flat=True)), {'canceled'})
+
+    def test_partner_feed(self):
+        """
+        Тест ленты магазина: только свои позиции, новые первыми, фильтр по статусу и постраничный обход.
+        """
+        orders = [self.confirm([1, 1, 1]) for _ in range(5)]
+        ShopOrder.objects.filter(order=orders[0], shop=self.shops[0]).update(state='confirmed')
+        own = {offer.id for offer in self.offers[self.shops[0].id]}
+
+        seen, params = [], {'page_size': 2}
+        while True:
+            with self.assertNumQueries(4):
+                page, next_link = self.feed(self.shops[0], params)
+            seen.extend(page)
+            if not next_link:
+                break
+            params = {key: value[0] for key, value in parse_qs(urlparse(next_link).query).items()}
+
+        self.assertEqual([row['order'] for row in seen], [order.id for order in reversed(orders)])
+        self.assertTrue(all(item['product_info']['id'] in own for row in seen for item in row['ordered_items']))
+        self.assertEqual([len(row['ordered_items']) for row in seen], [3] * 5)
+
+        page, _ = self.feed(self.shops[0], {'state': 'confirmed'})
+        self.assertEqual([row['order'] for row in page], [orders[0].id])
+
+    def test_feed_uses_shop_index(self):
+        """
+        Тест плана: лента магазина с фильтром по статусу и без него читается по индексу, без сортировки.
+        """
+        self.assertUsesIndex(ShopOrder.objects.filter(shop=self.shops[0], state='new').order_by('-id')[:20],
+                             'shoporder_shop_state_idx')
+        self.assertUsesIndex(ShopOrder.objects.filter(shop=self.shops[0]).order_by('-id')[:20],
+                             'shoporder_shop_id_idx')
+
+
+class OrderHistoryTests(QueryPlanMixin, TestCase):
+    """
+    Тесты краткой истории заказов покупателя.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='shop@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        import_feed(generate_price_list(10, seed=12), self.user)
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='testpass123', is_active=True)
+        offer_ids = list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+        self.orders = Order.objects.bulk_create([Order(user=self.buyer, state='new') for _ in range(7)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_info_id=offer_id, quantity=number + 1)
+            for number, order in enumerate(self.orders)
+            for offer_id in offer_ids[number:number + 3]
+        ])
+        Order.objects.create(user=self.buyer, state='basket')
+        update_order_totals(user=self.buyer)
+
+    def history(self):
+        return Order.objects.filter(user=self.buyer).exclude(state='basket')
+
+    def test_walk_pages(self):
+        """
+        Тест обхода истории: один запрос на страницу, корзины нет, сумма из сохраненных полей.
+        """
+        seen, params = [], {'page_size': 3}
+        while True:
+            paginator = OrderCursorPagination()
+            request = Request(RequestFactory().get('/order', params))
+            with self.assertNumQueries(1):
+                page = paginator.paginate_queryset(self.history().values(*ORDER_SUMMARY_COLUMNS), request)
+            seen.extend(project_order_summaries(page))
+            next_link = paginator.get_next_link()
+            if not next_link:
+                break
+            params = {key: value[0] for key, value in parse_qs(urlparse(next_link).query).items()}
+
+        self.assertEqual([row['id'] for row in seen], [order.id for order in reversed(self.orders)])
+        self.assertEqual(set(seen[0]), {'id', 'dt', 'state', 'status_display', 'total_sum', 'items_count'})
+        detail = {order['id']: order for order in project_orders(self.history())}
+        for row in seen:
+            self.assertEqual((row['total_sum'], row['items_count'], row['dt']),
+                             (detail[row['id']]['total_sum'], detail[row['id']]['items_count'],
+                              detail[row['id']]['dt']))
+            self.assertEqual(row['items_count'], sum(item['quantity'] for item in detail[row['id']]['ordered_items']))
+
+    def test_history_uses_user_index(self):
+        """
+        Тест плана: история читается по индексу (user, id), без сортировки.
+        """
+        self.assertUsesIndex(self.history().values(*ORDER_SUMMARY_COLUMNS).order_by('-id')[:20],
+                             'order_user_id_idx')
+
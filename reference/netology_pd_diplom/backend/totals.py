@@ -0,0 +1,42 @@
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from backend.models import Order, OrderItem, ProductInfo
+
+
+def _items_sum(expression):
+    # Агрегат по позициям заказа как подзапрос: пересчет многих заказов - один UPDATE
+    return Coalesce(Subquery(
+        OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id').annotate(
+            value=Sum(expression)
+        ).values('value')
+    ), 0)
+
+
+def update_order_totals(**filters):
+    """
+    Пересчитывает сохраненные сумму и число товаров заказов, выбранных фильтром Order,
+    например update_order_totals(id=order_id) после изменения позиций.
+    Зафиксированная при оформлении цена позиции важнее текущей цены предложения.
+    """
+    return Order.objects.filter(**filters).update(
+        items_total=_items_sum(F('quantity') * Coalesce(F('price'), F('product_info__price'))),
+        items_count=_items_sum(F('quantity')),
+    )
+
+
+def capture_prices(order_id):
+    """
+    Фиксирует текущие цены предложений в позициях заказа (оформление корзины)
+    """
+    OrderItem.objects.filter(order_id=order_id).update(
+        price=Subquery(ProductInfo.objects.filter(id=OuterRef('product_info_id')).values('price'))
+    )
+    update_order_totals(id=order_id)
+
+
+def reprice_baskets(offer_ids):
+    """
+    Пересчитывает корзины с предложениями, у которых изменилась цена.
+    Оформленные заказы не меняются: у них цены зафиксированы.
+    """
+    return update_order_totals(state='basket', ordered_items__product_info_id__in=offer_ids)
@@ -0,0 +1,203 @@
+import hashlib
+import os
+import tempfile
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.utils import timezone
+from backend.models import PriceListUpload
+
+# Каталог хранилища загруженных прайсов; должен быть доступен воркерам Celery
+IMPORT_UPLOAD_ROOT = getattr(settings, 'IMPORT_UPLOAD_ROOT', os.path.join(tempfile.gettempdir(), 'price-uploads'))
+
+# Размер куска при чтении тела запроса и пересчете хеша
+IMPORT_UPLOAD_CHUNK_SIZE = getattr(settings, 'IMPORT_UPLOAD_CHUNK_SIZE', 64 * 1024)
+
+# Сколько (сек) хранятся брошенные загрузки и файлы, на которые не ссылается ни одна загрузка.
+# Должно быть больше времени импорта: файл из запроса импорта читается воркером без записи в базе
+IMPORT_UPLOAD_RETENTION = getattr(settings, 'IMPORT_UPLOAD_RETENTION', 24 * 60 * 60)
+
+
+class UploadStore:
+    """
+    Хранилище загруженных прайсов с адресацией по содержимому.
+
+    Готовый файл лежит по пути blobs/<sha256[:2]>/<sha256><расширение>, поэтому
+    повторная загрузка того же прайса не занимает места, а воркер читает файл
+    прямо из хранилища. Незавершенные загрузки копятся в partial/<id>,
+    временные файлы пишутся в tmp/ на той же файловой системе, чтобы перенос
+    в blobs/ был атомарным переименованием без копирования.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or IMPORT_UPLOAD_ROOT
+        for name in ('blobs', 'partial', 'tmp'):
+            os.makedirs(os.path.join(self.root, name), exist_ok=True)
+
+    def blob_path(self, sha256, ext):
+        return os.path.join(self.root, 'blobs', sha256[:2], f'{sha256}{ext.lower()}')
+
+    def partial_path(self, upload_id):
+        return os.path.join(self.root, 'partial', str(upload_id))
+
+    def temp_file(self):
+        return tempfile.NamedTemporaryFile(dir=os.path.join(self.root, 'tmp'), delete=False)
+
+    def exists(self, sha256, ext):
+        return os.path.exists(self.blob_path(sha256, ext))
+
+    def commit(self, file_path, sha256, ext):
+        """
+        Переносит файл в хранилище под его хешем. Если такой прайс уже
+        загружался, новый файл удаляется. Возвращает путь к файлу в хранилище.
+        """
+        path = self.blob_path(sha256, ext)
+        if os.path.exists(path):
+            os.remove(file_path)
+            # Файл снова нужен импорту: очистка отсчитывает срок хранения заново
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(file_path, path)
+        return path
+
+    def append(self, upload_id, offset, stream):
+        """
+        Дописывает кусок загрузки с позиции offset, читая поток по частям.
+        Возвращает новый размер принятых данных.
+        """
+        path = self.partial_path(upload_id)
+        with open(path, 'ab') as file:
+            file.truncate(offset)
+            file.seek(offset)
+            while True:
+                chunk = stream.read(IMPORT_UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                file.write(chunk)
+            return file.tell()
+
+    def complete(self, upload_id, ext):
+        """
+        Завершает загрузку по кускам: считает хеш и переносит файл в хранилище
+        """
+        path = self.partial_path(upload_id)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(IMPORT_UPLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        return sha256, self.commit(path, sha256, ext)
+
+    def discard(self, upload_id):
+        path = self.partial_path(upload_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _files(self, name):
+        for directory, _, files in os.walk(os.path.join(self.root, name)):
+            for file_name in files:
+                yield os.path.join(directory, file_name)
+
+    def remove_stale(self, referenced, max_age=None):
+        """
+        Удаляет файлы старше max_age секунд: незавершенные загрузки (partial/, tmp/)
+        и прайсы в blobs/, путей которых нет в referenced. Возвращает число файлов.
+        """
+        deadline = time.time() - (IMPORT_UPLOAD_RETENTION if max_age is None else max_age)
+        referenced = set(referenced)
+        removed = 0
+        for name in ('partial', 'tmp', 'blobs'):
+            for path in self._files(name):
+                if name == 'blobs' and path in referenced:
+                    continue
+                try:
+                    if os.path.getmtime(path) < deadline:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    # Файл успели завершить или удалить параллельно
+                    pass
+        return removed
+
+
+def reusable_upload_path(shop_id, sha256, ext, store=None):
+    """
+    Путь к уже принятому прайсу с тем же хешем, который загружал этот же магазин.
+    Хешу от клиента верить нельзя: зная чужой хеш, можно было бы получить чужой
+    прайс, поэтому повторно используются только файлы, которые сервер сам принял
+    и посчитал от этого магазина.
+    """
+    store = store or UploadStore()
+    path = PriceListUpload.objects.filter(shop_id=shop_id, sha256=sha256, state='complete').exclude(
+        path=''
+    ).values_list('path', flat=True).first()
+    if path and path == store.blob_path(sha256, ext) and os.path.exists(path):
+        os.utime(path)
+        return path
+    return None
+
+
+def cleanup_uploads(store=None, max_age=None):
+    """
+    Удаляет брошенные загрузки по кускам (записи и файлы partial/) и прайсы,
+    на которые не ссылается ни одна загрузка. Возвращает (записей, файлов).
+    """
+    store = store or UploadStore()
+    max_age = IMPORT_UPLOAD_RETENTION if max_age is None else max_age
+    abandoned = PriceListUpload.objects.filter(
+        state='uploading', updated_at__lt=timezone.now() - timedelta(seconds=max_age)
+    )
+    for upload_id in abandoned.values_list('id', flat=True):
+        store.discard(upload_id)
+    deleted = abandoned.delete()[0]
+    referenced = PriceListUpload.objects.exclude(path='').values_list('path', flat=True)
+    return deleted, store.remove_stale(referenced.iterator(), max_age)
+
+
+class StagedUploadedFile(UploadedFile):
+    """
+    Файл, принятый StagingUploadHandler: уже лежит на диске в хранилище,
+    хеш содержимого посчитан при приеме
+    """
+
+    def __init__(self, file, name, content_type, size, charset, sha256):
+        super().__init__(file, name, content_type, size, charset)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class StagingUploadHandler(FileUploadHandler):
+    """
+    Обработчик загрузки, который пишет файл кусками во временный каталог
+    хранилища и по пути считает sha256, не держа файл в памяти
+    """
+
+    def __init__(self, request=None, store=None):
+        super().__init__(request)
+        self.store = store or UploadStore()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = self.store.temp_file()
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.write(raw_data)
+        self.digest.update(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        return StagedUploadedFile(
+            self.file, self.file_name, self.content_type, file_size, self.charset, self.digest.hexdigest()
+        )
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+            os.remove(self.file.name)
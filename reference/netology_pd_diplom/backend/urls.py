@@ -3,7 +3,8 @@ from django_rest_passwordreset.views import reset_password_request_token, reset_
 from .views import (PartnerUpdate, RegisterAccount, LoginAccount,
                     CategoryView, ShopView, ProductInfoView, BasketView,
                     AccountDetails, ContactView, OrderView, PartnerState,
-                    PartnerOrders, ConfirmAccount, ShopViewSet, TriggerErrorView, UserAvatarUploadView)
+                    PartnerOrders, ConfirmAccount, ShopViewSet, TriggerErrorView, UserAvatarUploadView,
+                    ImportJobView, PartnerExport, PartnerOrdersExport, OrderDetailView)
 
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
@@ -25,6 +26,9 @@ urlpatterns = [
     path('partner/update', PartnerUpdate.as_view(), name='partner-update'),
     path('partner/state', PartnerState.as_view(), name='partner-state'),
     path('partner/orders', PartnerOrders.as_view(), name='partner-orders'),
+    path('partner/export', PartnerExport.as_view(), name='partner-export'),
+    path('partner/orders/export', PartnerOrdersExport.as_view(), name='partner-orders-export'),
+    path('imports/<int:pk>', ImportJobView.as_view(), name='import-job'),
     path('user/register', RegisterAccount.as_view(), name='user-register'),
     path('user/register/confirm', ConfirmAccount.as_view(), name='user-register-confirm'),
     path('user/details', AccountDetails.as_view(), name='user-details'),
@@ -37,6 +41,7 @@ urlpatterns = [
     path('products', ProductInfoView.as_view(), name='products'),
     path('basket', BasketView.as_view(), name='basket'),
     path('order', OrderView.as_view(), name='order'),
+    path('order/<int:pk>', OrderDetailView.as_view(), name='order-detail'),
 
     # Документация
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
@@ -49,6 +54,9 @@ urlpatterns = [
          name='shop-detail'),
     path('shops/<int:pk>/import_products/', ShopViewSet.as_view({'post': 'import_products'}),
          name='shop-import-products'),
+    path('shops/<int:pk>/uploads/', ShopViewSet.as_view({'post': 'create_upload'}), name='shop-uploads'),
+    path('shops/<int:pk>/uploads/<int:upload_id>/', ShopViewSet.as_view({'get': 'upload_chunk', 'put': 'upload_chunk'}),
+         name='shop-upload-detail'),
 
     # social autorization
     path('social-auth/', include('social_django.urls', namespace='social')),
@@ -1,86 +1,141 @@
 import os
+import shutil
+import tempfile
+import time
+from functools import partial
+from urllib.parse import urlparse
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from yaml import load as load_yaml, Loader
-import csv
-import json
-from datetime import datetime
-from backend.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+from requests import get
+from yaml import load as load_yaml
+from backend.feeds import FeedLoader, iter_yaml_feed, iter_csv_feed, iter_json_feed
+from backend.importers import ShardWriter, import_feed, import_price_list
 
 
-def import_file(file_path, user):
+# Потоковые парсеры по расширению файла и режим открытия файла для них
+FEED_PARSERS = {
+    '.yaml': (iter_yaml_feed, 'rb'),
+    '.yml': (iter_yaml_feed, 'rb'),
+    '.csv': (iter_csv_feed, 'r'),
+    '.json': (iter_json_feed, 'r'),
+    '.jsonl': (iter_json_feed, 'r'),
+    '.ndjson': (iter_json_feed, 'r'),
+}
+
+# Каталог для файлов-шардов параллельного импорта, общий для всех воркеров
+IMPORT_SHARD_ROOT = getattr(settings, 'IMPORT_SHARD_ROOT', None)
+
+# Скачивание прайсов по ссылке: размер куска и таймауты (соединение, чтение)
+IMPORT_DOWNLOAD_CHUNK_SIZE = getattr(settings, 'IMPORT_DOWNLOAD_CHUNK_SIZE', 64 * 1024)
+IMPORT_DOWNLOAD_TIMEOUT = getattr(settings, 'IMPORT_DOWNLOAD_TIMEOUT', (10, 300))
+
+
+def iter_file_feed(file_path, tracker=None):
+    _, ext = os.path.splitext(file_path)
+    if ext.lower() not in FEED_PARSERS:
+        raise ValidationError("Неподдерживаемый формат файла")
+
+    parser, mode = FEED_PARSERS[ext.lower()]
+    if mode == 'rb':
+        file = open(file_path, 'rb')
+    else:
+        file = open(file_path, 'r', encoding='utf-8-sig', newline='')
+    with file:
+        if tracker is not None:
+            tracker.watch_file(file)
+        yield from parser(file)
+
+
+def import_file(file_path, user, tracker=None):
     _, ext = os.path.splitext(file_path)
     ext = ext.lower()
 
     if ext in ('.yaml', '.yml'):
-        return import_yaml(file_path, user)
+        return import_yaml(file_path, user, tracker=tracker)
     elif ext == '.csv':
-        return import_csv(file_path, user)
-    elif ext == '.json':
-        return import_json(file_path, user)
+        return import_csv(file_path, user, tracker=tracker)
+    elif ext in ('.json', '.jsonl', '.ndjson'):
+        return import_json(file_path, user, tracker=tracker)
     else:
         raise ValidationError("Неподдерживаемый формат файла")
 
 
-def import_yaml(file_path, user):
-    stats = {'created': 0, 'updated': 0, 'errors': 0}
-    with open(file_path, 'r', encoding='utf-8') as file:
-        data = load_yaml(file, Loader=Loader)
-        shop_name = data['shop']
-        shop, _ = Shop.objects.get_or_create(name=shop_name, user=user)
-
-        for category_data in data.get('categories', []):
-            category, _ = Category.objects.get_or_create(
-                id=category_data['id'],
-                defaults={'name': category_data['name']}
-            )
-            category.shops.add(shop)
-            category.save()
-
-        for product_data in data.get('goods', []):
-            try:
-                product, _ = Product.objects.get_or_create(
-                    name=product_data['name'],
-                    category_id=product_data['category']
-                )
-
-                product_info, created = ProductInfo.objects.update_or_create(
-                    product=product,
-                    shop=shop,
-                    external_id=product_data['id'],
-                    defaults={
-                        'model': product_data.get('model', ''),
-                        'price': product_data['price'],
-                        'price_rrc': product_data.get('price_rrc', product_data['price']),
-                        'quantity': product_data['quantity'],
-                        'discount': product_data.get('discount', 0)
-                    }
-                )
-
-                if created:
-                    stats['created'] += 1
-                else:
-                    stats['updated'] += 1
-
-                for name, value in product_data.get('parameters', {}).items():
-                    parameter, _ = Parameter.objects.get_or_create(name=name)
-                    ProductParameter.objects.update_or_create(
-                        product_info=product_info,
-                        parameter=parameter,
-                        defaults={'value': value}
-                    )
-
-            except Exception as e:
-                stats['errors'] += 1
-                continue
-
-    return stats
-
-
-def import_csv(file_path, user):
-    # Реализация импорта из CSV
-    pass
-
-
-def import_json(file_path, user):
-    # Реализация импорта из JSON
-    pass
\ No newline at end of file
+def import_yaml(file_path, user, streaming=True, tracker=None):
+    if streaming:
+        # Товары разбираются и пишутся пакетами, документ целиком не строится
+        return import_feed(iter_file_feed(file_path, tracker), user, tracker=tracker)
+    with open(file_path, 'rb') as file:
+        data = load_yaml(file, Loader=FeedLoader)
+    return import_price_list(data, user)
+
+
+def import_csv(file_path, user, tracker=None):
+    return import_feed(iter_file_feed(file_path, tracker), user, tracker=tracker)
+
+
+def import_json(file_path, user, tracker=None):
+    return import_feed(iter_file_feed(file_path, tracker), user, tracker=tracker)
+
+
+def import_file_sharded(file_path, user, shards, retire_missing=False, tracker=None, job_id=None):
+    """
+    Параллельный импорт: прайс разбирается один раз и раскладывается по шардам,
+    которые импортирует группа задач Celery, а chord сводит итоговую статистику.
+    """
+    from celery import chord
+    from backend.tasks import import_shard_task, import_shards_failed_task, merge_import_stats_task
+
+    started = time.time()
+    shard_dir = tempfile.mkdtemp(prefix='import-', dir=IMPORT_SHARD_ROOT)
+    try:
+        manifest = import_feed(
+            iter_file_feed(file_path, tracker),
+            user,
+            retire_missing=retire_missing,
+            importer_class=partial(ShardWriter, shard_dir=shard_dir, shards=shards),
+            tracker=tracker
+        )
+    except Exception:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        raise
+
+    first_pass = {'errors': manifest['errors'], 'error_rows': manifest['error_rows']}
+    merge = merge_import_stats_task.s(manifest['shop_id'], shard_dir, retire_missing, started, first_pass, job_id)
+    # Ошибка любого шарда отменяет сведение: шарды удаляются, задача импорта помечается упавшей
+    merge.link_error(import_shards_failed_task.s(shard_dir, job_id))
+    result = chord(
+        import_shard_task.s(shard_path, manifest['shop_id']) for shard_path in manifest['shards']
+    )(merge)
+
+    return {'shards': len(manifest['shards']), 'sharded': manifest['sharded'], 'task_id': result.id}
+
+
+def download_price_list(url, file_path, etag='', last_modified=''):
+    """
+    Скачивает прайс по ссылке на диск кусками, не держа его в памяти.
+    Если переданы ETag/Last-Modified прошлой загрузки, запрос условный:
+    при ответе 304 файл не пишется и функция возвращает None.
+    Иначе возвращает пару (etag, last_modified) новой версии.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    with get(url, headers=headers, stream=True, timeout=IMPORT_DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        with open(file_path, 'wb') as file:
+            for chunk in response.iter_content(chunk_size=IMPORT_DOWNLOAD_CHUNK_SIZE):
+                file.write(chunk)
+        return response.headers.get('ETag', ''), response.headers.get('Last-Modified', '')
+
+
+def feed_suffix(url):
+    """
+    Расширение файла прайса по ссылке; по умолчанию прайс считается YAML
+    """
+    _, ext = os.path.splitext(urlparse(url).path)
+    return ext.lower() if ext.lower() in FEED_PARSERS else '.yaml'
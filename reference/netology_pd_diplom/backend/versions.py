@@ -0,0 +1,101 @@
+import hashlib
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+from backend.models import CatalogVersion, Shop
+
+CATEGORIES_VERSION = 'categories'
+
+
+def install_catalog_versions(using=None):
+    """
+    Создает строки общих версий каталога, чтобы увеличение версии было одним UPDATE
+    """
+    CatalogVersion.objects.using(using or 'default').get_or_create(name=CATEGORIES_VERSION)
+
+
+def bump_shop_versions(**filters):
+    """
+    Увеличивает версию каталога магазинов, выбранных фильтром Shop,
+    например bump_shop_versions(id__in=shop_ids) после пересборки каталога
+    """
+    Shop.objects.filter(**filters).update(version=F('version') + 1, modified_at=timezone.now())
+
+
+def bump_category_version():
+    """
+    Увеличивает версию дерева категорий
+    """
+    now = timezone.now()
+    if not CatalogVersion.objects.filter(name=CATEGORIES_VERSION).update(version=F('version') + 1, modified_at=now):
+        # Строки нет, если база создана без post_migrate: ее создает первый из параллельных импортов
+        CatalogVersion.objects.bulk_create([CatalogVersion(name=CATEGORIES_VERSION, modified_at=now)],
+                                           ignore_conflicts=True)
+
+
+def catalog_state(shop_id=None, categories=True):
+    """
+    Состояние каталога по счетчикам версий: (etag, last_modified).
+
+    Читаются только магазины и версия категорий, таблицы каталога не затрагиваются.
+    Одних числа магазинов и суммы версий мало: после удаления магазина и увеличения
+    версий других та же пара может вернуться. Поэтому в ETag входят еще наибольший id
+    магазина и время последнего изменения - оно растет при каждом увеличении версии.
+    """
+    shops = Shop.objects.all()
+    if shop_id:
+        shops = shops.filter(id=shop_id)
+    state = shops.aggregate(count=Count('id'), last_id=Max('id'), version=Sum('version'),
+                            modified_at=Max('modified_at'))
+    parts = [state['count'], state['last_id'], state['version'] or 0, state['modified_at']]
+    modified = [state['modified_at']]
+
+    if categories:
+        version = CatalogVersion.objects.filter(name=CATEGORIES_VERSION).values_list('version', 'modified_at').first()
+        version, modified_at = version or (0, None)
+        parts += [version, modified_at]
+        modified.append(modified_at)
+
+    etag = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    modified = [value for value in modified if value is not None]
+    return etag, max(modified) if modified else None
+
+
+def _request_state(request, shop_id=None, categories=True):
+    # condition() спрашивает ETag и Last-Modified по отдельности, состояние читается один раз за запрос
+    cached = request.__dict__.setdefault('_catalog_state', {})
+    key = (shop_id, categories)
+    if key not in cached:
+        cached[key] = catalog_state(shop_id, categories)
+    return cached[key]
+
+
+def _shop_id(request):
+    shop_id = request.GET.get('shop_id')
+    return int(shop_id) if shop_id and shop_id.isdigit() else None
+
+
+# Функции для django.views.decorators.http.condition: первый аргумент - запрос
+
+def shops_etag(request, *args, **kwargs):
+    return _request_state(request, categories=False)[0]
+
+
+def shops_last_modified(request, *args, **kwargs):
+    return _request_state(request, categories=False)[1]
+
+
+def categories_etag(request, *args, **kwargs):
+    # В категориях выводятся названия магазинов, поэтому версии магазинов тоже учитываются
+    return _request_state(request)[0]
+
+
+def categories_last_modified(request, *args, **kwargs):
+    return _request_state(request)[1]
+
+
+def products_etag(request, *args, **kwargs):
+    return _request_state(request, _shop_id(request))[0]
+
+
+def products_last_modified(request, *args, **kwargs):
+    return _request_state(request, _shop_id(request))[1]
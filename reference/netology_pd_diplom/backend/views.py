@@ -6,8 +6,7 @@ from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
 from django.db import IntegrityError
 from django.db.models import Q, Sum, F
-from django.http import JsonResponse
-from requests import get
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.authtoken.models import Token
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
@@ -16,26 +15,45 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from ujson import loads as load_json
-from yaml import load as load_yaml, Loader
-from django.core.files.storage import FileSystemStorage
-import tempfile
+import io
 import os
+import re
 from .models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
-    Contact, ConfirmEmailToken, User
+    Contact, ConfirmEmailToken, User, ImportJob, PriceListUpload, CatalogEntry, ShopOrder
 from .serializers import UserSerializer, CategorySerializer, ShopSerializer, ProductInfoSerializer, \
-    OrderItemSerializer, OrderSerializer, ContactSerializer, UserRegisterSerializer, ConfirmEmailTokenSerializer, ProductSerializer
+    OrderItemSerializer, OrderSerializer, ContactSerializer, UserRegisterSerializer, ConfirmEmailTokenSerializer, ProductSerializer, \
+    ImportJobSerializer, PriceListUploadSerializer, CatalogEntrySerializer
 from .signals import new_user_registered, new_order
-from .tasks import send_order_confirmation_email, process_import_task
+from .tasks import send_order_confirmation_email, process_import_task, partner_update_task
+from .catalog import refresh_catalog_for, parse_catalog_filters, parse_facet_filters, filter_by_facets, facet_counts
+from .pagination import CATALOG_ORDERINGS, OrderCursorPagination, ProductInfoCursorPagination, CatalogSearchPagination
+from .search import search_catalog
+from .fragments import render_fragments, fragment_list_response
+from .baskets import get_basket_store, parse_lines
+from .projections import ORDER_SUMMARY_COLUMNS, SHOP_ORDER_COLUMNS, STATE_NAMES, project_order_summaries, \
+    project_orders, project_shop_orders
+from .reservations import ReservationError, confirm_order
+from .renderers import ORJSONRenderer
+from .exports import FEED_EXPORTS, ORDER_EXPORTS, buffered, iter_shop_feed, iter_shop_orders
+from .versions import bump_shop_versions, categories_etag, categories_last_modified, shops_etag, \
+    shops_last_modified, products_etag, products_last_modified
+from .uploads import UploadStore, StagingUploadHandler, reusable_upload_path
+from .utils import FEED_PARSERS
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from social_django.utils import psa
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+from django.utils.decorators import method_decorator
 from cachalot.api import cachalot_disabled
 import sentry_sdk
 from .tasks import generate_thumbnails
 
+# Заголовок куска загрузки: bytes <начало>-<конец>/<размер>
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
 
 class RegisterAccount(APIView):
     """
@@ -145,6 +163,7 @@ class LoginAccount(APIView):
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
 
+@method_decorator(condition(etag_func=categories_etag, last_modified_func=categories_last_modified), name='get')
 class CategoryView(ListAPIView):
     """
     Просмотр категорий
@@ -153,6 +172,7 @@ class CategoryView(ListAPIView):
     serializer_class = CategorySerializer
 
 
+@method_decorator(condition(etag_func=shops_etag, last_modified_func=shops_last_modified), name='get')
 class ShopView(ListAPIView):
     """
     Просмотр списка магазинов
@@ -161,29 +181,73 @@ class ShopView(ListAPIView):
     serializer_class = ShopSerializer
 
 
-class ProductInfoView(APIView):
+@method_decorator(condition(etag_func=products_etag, last_modified_func=products_last_modified), name='get')
+class ProductInfoView(ListAPIView):
     """
-    Поиск товаров
+    Поиск товаров.
+
+    Фильтры по параметрам: filter=Цвет:черный|белый&filter=Встроенная память (Гб):256,
+    значения одного параметра объединяются через ИЛИ, разные параметры - через И.
+    С facets=1 в ответ добавляются счетчики значений параметров по всей выборке.
+    С q=<запрос> выдача ищется по названию товара и упорядочена по релевантности,
+    страницы задаются параметрами limit и offset.
+    Фильтры price_min, price_max, in_stock=1 и discount_min сужают выдачу,
+    ordering=price или -price сортирует ее по цене (кроме поиска по q).
+    Ответ несет ETag по версиям магазинов и категорий: на If-None-Match
+    с тем же значением отдается 304 без запросов к каталогу.
     """
+    serializer_class = CatalogEntrySerializer
+    pagination_class = ProductInfoCursorPagination
+    # Порядок задает пагинация: сортировка по другим полям сломала бы курсор
+    filter_backends = []
 
-    def get(self, request, *args, **kwargs):
-        query = Q(shop__state=True)
+    def list(self, request, *args, **kwargs):
+        try:
+            self.facet_filters = parse_facet_filters(request.query_params.getlist('filter'))
+            self.catalog_filters = parse_catalog_filters(request.query_params)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)}, status=400)
+        ordering = request.query_params.get('ordering')
+        if ordering and ordering not in CATALOG_ORDERINGS:
+            return JsonResponse({'Status': False, 'Errors': f'Неверная сортировка {ordering}'}, status=400)
+
+        queryset = self.get_queryset()
+        query = request.query_params.get('q', '').strip()
+        if query:
+            offer_ids = search_catalog(queryset, query)
+            paginator = CatalogSearchPagination()
+            page = paginator.paginate_queryset(offer_ids, request, view=self)
+            versions = dict(CatalogEntry.objects.filter(offer_id__in=page).values_list('offer_id', 'version'))
+            entries = [(offer_id, versions[offer_id]) for offer_id in page if offer_id in versions]
+            extra = {'count': paginator.count}
+            queryset = queryset.filter(offer_id__in=offer_ids)
+        else:
+            paginator = self.paginator
+            entries = [(entry.offer_id, entry.version) for entry in paginator.paginate_queryset(queryset, request, self)]
+            extra = {}
+
+        extra.update(next=paginator.get_next_link(), previous=paginator.get_previous_link())
+        if request.query_params.get('facets'):
+            extra['facets'] = facet_counts(queryset)
+        # Карточки берутся готовыми JSON-фрагментами из кэша и не сериализуются заново
+        return fragment_list_response(render_fragments(entries), **extra)
 
-        shop_id = request.query_params.get('shop_id')
+    def get_queryset(self):
+        # Выдача идет из каталога (CatalogEntry): карточки уже собраны, join-ы не нужны
+        query = Q(shop_state=True)
+
+        shop_id = self.request.query_params.get('shop_id')
         if shop_id:
             query &= Q(shop_id=shop_id)
 
-        category_id = request.query_params.get('category_id')
+        category_id = self.request.query_params.get('category_id')
         if category_id:
-            query &= Q(product__category_id=category_id)
-
-        queryset = ProductInfo.objects.filter(query) \
-            .select_related('shop', 'product__category') \
-            .prefetch_related('product_parameters__parameter') \
-            .distinct()
+            query &= Q(category_id=category_id)
 
-        serializer = ProductInfoSerializer(queryset, many=True)
-        return Response(serializer.data)
+        query &= getattr(self, 'catalog_filters', Q())
+        # Цена нужна курсору при сортировке по цене
+        queryset = CatalogEntry.objects.filter(query).only('offer_id', 'version', 'price')
+        return filter_by_facets(queryset, getattr(self, 'facet_filters', {}))
 
 
 class BasketView(APIView):
@@ -191,49 +255,25 @@ class BasketView(APIView):
     Управление корзиной пользователя
     """
     permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
 
     def get(self, request, *args, **kwargs):
-        basket = Order.objects.filter(
-            user_id=request.user.id,
-            state='basket'
-        ).prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter'
-        ).annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))
-        ).distinct()
-
-        serializer = OrderSerializer(basket, many=True)
-        return Response(serializer.data)
+        return Response(get_basket_store().orders(request.user.id))
 
     def post(self, request, *args, **kwargs):
+        """
+        Добавление товаров: items - JSON-список [{"product_info": id, "quantity": n}, ...].
+        Все строки проверяются и записываются вместе: при ошибке в одной корзина не меняется.
+        """
         items = request.data.get('items')
         if not items:
             return JsonResponse({'Status': False, 'Errors': 'Не указаны товары'})
 
         try:
-            items_dict = load_json(items)
-        except ValueError:
-            return JsonResponse({'Status': False, 'Errors': 'Неверный формат запроса'})
-
-        basket, _ = Order.objects.get_or_create(
-            user_id=request.user.id,
-            state='basket'
-        )
-        objects_created = 0
-
-        for order_item in items_dict:
-            order_item.update({'order': basket.id})
-            serializer = OrderItemSerializer(data=order_item)
-
-            if serializer.is_valid():
-                try:
-                    serializer.save()
-                    objects_created += 1
-                except IntegrityError as error:
-                    return JsonResponse({'Status': False, 'Errors': str(error)})
-            else:
-                return JsonResponse({'Status': False, 'Errors': serializer.errors})
+            lines = parse_lines(load_json(items) if isinstance(items, str) else items, 'product_info')
+            objects_created = get_basket_store().add(request.user.id, lines)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error) or 'Неверный формат запроса'})
 
         return JsonResponse({'Status': True, 'Создано объектов': objects_created})
 
@@ -242,47 +282,27 @@ class BasketView(APIView):
         if not items:
             return JsonResponse({'Status': False, 'Errors': 'Не указаны товары'})
 
-        items_list = items.split(',')
-        basket, _ = Order.objects.get_or_create(
-            user_id=request.user.id,
-            state='basket'
-        )
-        query = Q()
-        objects_deleted = False
-
-        for order_item_id in items_list:
-            if order_item_id.isdigit():
-                query |= Q(order_id=basket.id, id=order_item_id)
-                objects_deleted = True
-
-        if objects_deleted:
-            deleted_count = OrderItem.objects.filter(query).delete()[0]
-            return JsonResponse({'Status': True, 'Удалено объектов': deleted_count})
+        item_ids = [int(item_id) for item_id in items.split(',') if item_id.isdigit()]
+        if not item_ids:
+            return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
-        return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
+        deleted_count = get_basket_store().delete(request.user.id, item_ids)
+        return JsonResponse({'Status': True, 'Удалено объектов': deleted_count})
 
     def put(self, request, *args, **kwargs):
+        """
+        Изменение количества: items - JSON-список [{"id": id строки, "quantity": n}, ...],
+        все строки обновляются одним запросом или не обновляется ни одна
+        """
         items = request.data.get('items')
         if not items:
             return JsonResponse({'Status': False, 'Errors': 'Не указаны товары'})
 
         try:
-            items_dict = load_json(items)
-        except ValueError:
-            return JsonResponse({'Status': False, 'Errors': 'Неверный формат запроса'})
-
-        basket, _ = Order.objects.get_or_create(
-            user_id=request.user.id,
-            state='basket'
-        )
-        objects_updated = 0
-
-        for order_item in items_dict:
-            if isinstance(order_item.get('id'), int) and isinstance(order_item.get('quantity'), int):
-                objects_updated += OrderItem.objects.filter(
-                    order_id=basket.id,
-                    id=order_item['id']
-                ).update(quantity=order_item['quantity'])
+            lines = parse_lines(load_json(items) if isinstance(items, str) else items, 'id')
+            objects_updated = get_basket_store().update(request.user.id, lines)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error) or 'Неверный формат запроса'})
 
         return JsonResponse({'Status': True, 'Обновлено объектов': objects_updated})
 
@@ -307,49 +327,25 @@ class PartnerUpdate(APIView):
         except ValidationError as e:
             return JsonResponse({'Status': False, 'Error': str(e)})
 
-        stream = get(url).content
-        data = load_yaml(stream, Loader=Loader)
+        # Скачивание и импорт идут в фоне, запрос не держит воркер
+        job = ImportJob.objects.create(user=request.user, source=url)
+        task = partner_update_task.delay(request.user.id, url, job.id)
+        return JsonResponse({'Status': True, 'task_id': task.id, 'job_id': job.id})
 
-        shop, _ = Shop.objects.get_or_create(
-            name=data['shop'],
-            user_id=request.user.id
-        )
-
-        for category in data['categories']:
-            category_object, _ = Category.objects.get_or_create(
-                id=category['id'],
-                name=category['name']
-            )
-            category_object.shops.add(shop.id)
-            category_object.save()
-
-        ProductInfo.objects.filter(shop_id=shop.id).delete()
 
-        for item in data['goods']:
-            product, _ = Product.objects.get_or_create(
-                name=item['name'],
-                category_id=item['category']
-            )
-
-            product_info = ProductInfo.objects.create(
-                product_id=product.id,
-                external_id=item['id'],
-                model=item.get('model', ''),
-                price=item['price'],
-                price_rrc=item.get('price_rrc', item['price']),
-                quantity=item['quantity'],
-                shop_id=shop.id
-            )
+class ImportJobView(APIView):
+    """
+    Прогресс задачи импорта прайса
+    """
+    permission_classes = [IsAuthenticated]
 
-            for name, value in item.get('parameters', {}).items():
-                parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                ProductParameter.objects.create(
-                    product_info_id=product_info.id,
-                    parameter_id=parameter_object.id,
-                    value=value
-                )
+    def get(self, request, pk, *args, **kwargs):
+        job = ImportJob.objects.filter(id=pk, user_id=request.user.id).first()
+        if job is None:
+            return JsonResponse({'Status': False, 'Errors': 'Задача импорта не найдена'}, status=404)
 
-        return JsonResponse({'Status': True})
+        serializer = ImportJobSerializer(job)
+        return Response(serializer.data)
 
 
 class PartnerState(APIView):
@@ -378,32 +374,89 @@ class PartnerState(APIView):
             Shop.objects.filter(user_id=request.user.id).update(
                 state=strtobool(state)
             )
+            refresh_catalog_for(shop__user_id=request.user.id)
+            bump_shop_versions(user_id=request.user.id)
             return JsonResponse({'Status': True})
         except ValueError as error:
             return JsonResponse({'Status': False, 'Errors': str(error)})
 
 
+def _partner_export(request, formats, rows, name):
+    """
+    Общая часть выгрузок партнера: проверки и потоковый ответ.
+    rows(shop) отдает данные, formats - словарь форматов backend.exports.
+    """
+    if request.user.type != 'shop':
+        return JsonResponse({'Status': False, 'Error': 'Только для магазинов'}, status=403)
+
+    fmt = request.query_params.get('type', 'yaml' if 'yaml' in formats else 'csv')
+    if fmt not in formats:
+        return JsonResponse({'Status': False, 'Errors': f'Неизвестный формат {fmt}, доступны: {", ".join(formats)}'},
+                            status=400)
+    shop = Shop.objects.filter(user_id=request.user.id).first()
+    if shop is None:
+        return JsonResponse({'Status': False, 'Errors': 'Магазин не найден'}, status=404)
+
+    ext, content_type, render = formats[fmt]
+    response = StreamingHttpResponse(buffered(render(rows(shop))), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{name}-{shop.id}{ext}"'
+    return response
+
+
+class PartnerExport(APIView):
+    """
+    Выгрузка каталога магазина: type=yaml (схема data/shop1.yaml), csv или jsonl.
+    Файл потоково читается из базы и снова загружается через PartnerUpdate или import_products.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return _partner_export(request, FEED_EXPORTS, iter_shop_feed, 'catalog')
+
+
+class PartnerOrdersExport(APIView):
+    """
+    Выгрузка позиций заказов магазина: type=csv или jsonl
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return _partner_export(request, ORDER_EXPORTS, iter_shop_orders, 'orders')
+
+
 class PartnerOrders(APIView):
     """
     Получение заказов поставщиками
     """
     permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
 
     def get(self, request, *args, **kwargs):
+        """
+        Страница заказов магазина, новые первыми: state - фильтр по статусу,
+        page_size и cursor - как у каталога. В заказе только позиции этого магазина.
+        """
         if request.user.type != 'shop':
             return JsonResponse({'Status': False, 'Error': 'Только для магазинов'}, status=403)
 
-        orders = Order.objects.filter(
-            ordered_items__product_info__shop__user_id=request.user.id
-        ).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter'
-        ).select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))
-        ).distinct()
+        shop_id = Shop.objects.filter(user_id=request.user.id).values_list('id', flat=True).first()
+        if shop_id is None:
+            return JsonResponse({'Status': False, 'Errors': 'Магазин не найден'}, status=404)
 
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        queryset = ShopOrder.objects.filter(shop_id=shop_id)
+        state = request.query_params.get('state')
+        if state:
+            if state not in STATE_NAMES or state == 'basket':
+                return JsonResponse({'Status': False, 'Errors': f'Неизвестный статус {state}'}, status=400)
+            queryset = queryset.filter(state=state)
+
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(queryset.values(*SHOP_ORDER_COLUMNS), request, view=self)
+        return Response({
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'results': project_shop_orders(page),
+        })
 
 
 class ContactView(APIView):
@@ -482,19 +535,21 @@ class OrderView(APIView):
     Управление заказами пользователей
     """
     permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
 
     def get(self, request, *args, **kwargs):
-        orders = Order.objects.filter(
-            user_id=request.user.id
-        ).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter'
-        ).select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))
-        ).distinct()
-
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        """
+        История заказов постранично, новые первыми: id, дата, статус, сумма и число товаров.
+        Позиции заказа отдает order/<id>. Параметры page_size и cursor - как у каталога.
+        """
+        orders = Order.objects.filter(user_id=request.user.id).exclude(state='basket')
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(orders.values(*ORDER_SUMMARY_COLUMNS), request, view=self)
+        return Response({
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'results': project_order_summaries(page),
+        })
 
     def post(self, request, *args, **kwargs):
         if not {'id', 'contact'}.issubset(request.data):
@@ -511,17 +566,18 @@ class OrderView(APIView):
         except Order.DoesNotExist:
             return JsonResponse({'Status': False, 'Errors': 'Заказ не найден'})
 
+        # Корзина из кэша записывается в базу до смены статуса, чтобы заказ ушел с актуальными строками
+        store = get_basket_store()
         try:
-            is_updated = Order.objects.filter(
-                id=order.id
-            ).update(
-                contact_id=request.data['contact'],
-                state='new'
-            )
+            store.flush(request.user.id)
+            is_updated = confirm_order(order.id, request.data['contact'])
         except IntegrityError:
             return JsonResponse({'Status': False, 'Errors': 'Неправильно указаны аргументы'})
+        except ReservationError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)})
 
         if is_updated:
+            store.forget(request.user.id)
             send_order_confirmation_email.delay(order.id)
             new_order.send(sender=self.__class__, user_id=request.user.id)
             return JsonResponse({'Status': True})
@@ -529,6 +585,20 @@ class OrderView(APIView):
         return JsonResponse({'Status': False, 'Errors': 'Не удалось обновить заказ'})
 
 
+class OrderDetailView(APIView):
+    """
+    Заказ пользователя целиком: позиции с карточками товаров и контакт
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+
+    def get(self, request, pk, *args, **kwargs):
+        orders = project_orders(Order.objects.filter(id=pk, user_id=request.user.id).exclude(state='basket'))
+        if not orders:
+            return JsonResponse({'Status': False, 'Errors': 'Заказ не найден'}, status=404)
+        return Response(orders[0])
+
+
 class ShopViewSet(viewsets.ModelViewSet):
     """
     Управление магазинами (расширенное API)
@@ -537,40 +607,165 @@ class ShopViewSet(viewsets.ModelViewSet):
     serializer_class = ShopSerializer
     permission_classes = [IsAuthenticated]
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
-    def import_products(self, request, pk=None):
-        shop = self.get_object()
+    def perform_update(self, serializer):
+        shop = serializer.save()
+        refresh_catalog_for(shop_id=shop.id)
+        bump_shop_versions(id=shop.id)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'import_products':
+            # Обработчик нужно подменить до разбора тела: SessionAuthentication
+            # читает request.POST при проверке CSRF еще до вызова действия
+            request._request.upload_handlers = [StagingUploadHandler(request._request, UploadStore())]
+        return request
+
+    def _check_owner(self, request, shop):
         if request.user != shop.user and not request.user.is_superuser:
             return Response(
                 {'status': False, 'error': 'Недостаточно прав'},
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        if 'file' not in request.FILES:
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def import_products(self, request, pk=None):
+        """
+        Запуск импорта: файл из запроса или завершенная загрузка по кускам (upload).
+        Файл пишется прямо в хранилище загрузок и не удаляется после запроса,
+        воркер читает его оттуда же.
+        """
+        store = UploadStore()
+        shop = self.get_object()
+        forbidden = self._check_owner(request, shop)
+        if forbidden:
+            return forbidden
+
+        if 'file' in request.FILES:
+            uploaded_file = request.FILES['file']
+            uploaded_file.close()
+            _, ext = os.path.splitext(uploaded_file.name)
+            if ext.lower() not in FEED_PARSERS:
+                os.remove(uploaded_file.temporary_file_path())
+                return Response(
+                    {'status': False, 'error': 'Неподдерживаемый формат файла'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            file_path = store.commit(uploaded_file.temporary_file_path(), uploaded_file.sha256, ext)
+            source = uploaded_file.name
+        elif request.data.get('upload'):
+            upload = PriceListUpload.objects.filter(
+                id=request.data['upload'], shop=shop, state='complete'
+            ).first() if str(request.data['upload']).isdigit() else None
+            if upload is None:
+                return Response(
+                    {'status': False, 'error': 'Загрузка не найдена или не завершена'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            file_path = upload.path
+            source = upload.name
+        else:
             return Response(
                 {'status': False, 'error': 'Файл не предоставлен'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        uploaded_file = request.FILES['file']
-        fs = FileSystemStorage(location=tempfile.gettempdir())
-        filename = fs.save(uploaded_file.name, uploaded_file)
-        file_path = os.path.join(tempfile.gettempdir(), filename)
+        shards = request.data.get('shards')
+        shards = int(shards) if str(shards).isdigit() else None
 
         try:
-            task = process_import_task.delay(file_path, request.user.id)
+            job = ImportJob.objects.create(user=request.user, source=source)
+            task = process_import_task.delay(file_path, request.user.id, shards, job.id)
             return Response({
                 'status': True,
-                'task_id': task.id
+                'task_id': task.id,
+                'job_id': job.id
             })
         except Exception as e:
             return Response(
                 {'status': False, 'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='uploads')
+    def create_upload(self, request, pk=None):
+        """
+        Начало загрузки прайса по кускам. Если передан sha256 файла, который этот
+        магазин уже загружал, загрузка сразу считается завершенной и данные не передаются.
+        """
+        shop = self.get_object()
+        forbidden = self._check_owner(request, shop)
+        if forbidden:
+            return forbidden
+
+        serializer = PriceListUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'status': False, 'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        _, ext = os.path.splitext(serializer.validated_data['name'])
+        if ext.lower() not in FEED_PARSERS:
+            return Response(
+                {'status': False, 'error': 'Неподдерживаемый формат файла'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Хеш от клиента не проверен: в загрузку пишется только посчитанный сервером
+        sha256 = serializer.validated_data.pop('sha256', '')
+        upload = serializer.save(user=request.user, shop=shop)
+        path = reusable_upload_path(shop.id, sha256, ext) if sha256 else None
+        if path:
+            upload.sha256 = sha256
+            upload.received = upload.size
+            upload.path = path
+            upload.state = 'complete'
+            upload.save()
+        return Response(PriceListUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get', 'put'], permission_classes=[IsAuthenticated],
+            url_path=r'uploads/(?P<upload_id>\d+)')
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        """
+        Прием очередного куска загрузки. Позиция берется из заголовка
+        Content-Range (bytes <начало>-<конец>/<размер>), без него кусок
+        дописывается в конец. GET возвращает принятый объем для докачки.
+        """
+        shop = self.get_object()
+        forbidden = self._check_owner(request, shop)
+        if forbidden:
+            return forbidden
+
+        upload = PriceListUpload.objects.filter(id=upload_id, shop=shop).first()
+        if upload is None:
+            return Response({'status': False, 'error': 'Загрузка не найдена'}, status=status.HTTP_404_NOT_FOUND)
+        if request.method == 'GET' or upload.state == 'complete':
+            return Response(PriceListUploadSerializer(upload).data)
+
+        offset = upload.received
+        content_range = request.headers.get('Content-Range')
+        if content_range:
+            match = CONTENT_RANGE_RE.match(content_range)
+            if not match:
+                return Response({'status': False, 'error': 'Неверный заголовок Content-Range'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            offset = int(match.group(1))
+        if offset > upload.received:
+            # Пропущен кусок: клиент должен продолжить с принятой позиции
+            return Response(PriceListUploadSerializer(upload).data, status=status.HTTP_409_CONFLICT)
+
+        store = UploadStore()
+        received = store.append(upload.id, offset, request.stream or io.BytesIO())
+        if received > upload.size:
+            store.discard(upload.id)
+            upload.received = 0
+            upload.save()
+            return Response({'status': False, 'error': 'Размер данных превышает размер файла'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        upload.received = received
+        if received == upload.size:
+            _, ext = os.path.splitext(upload.name)
+            upload.sha256, upload.path = store.complete(upload.id, ext)
+            upload.state = 'complete'
+        upload.save()
+        return Response(PriceListUploadSerializer(upload).data)
 
 class SocialAuthView(APIView):
     @psa()
@@ -238,6 +238,21 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Europe/Moscow'
 CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 15 * 60
+# Периодические задачи (celery beat): запись корзин из кэша в базу
+CELERY_BEAT_SCHEDULE = {
+    'flush-baskets': {
+        'task': 'backend.tasks.flush_baskets_task',
+        'schedule': 60.0,
+    },
+    'release-expired-reservations': {
+        'task': 'backend.tasks.release_expired_reservations_task',
+        'schedule': 60.0,
+    },
+    'cleanup-uploads': {
+        'task': 'backend.tasks.cleanup_uploads_task',
+        'schedule': 60 * 60.0,
+    },
+}
 
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
@@ -317,6 +332,53 @@ USER_TYPES = {
     'buyer': 'Покупатель',
 }
 
+# Импорт прайс-листов: размер пакета для bulk-операций
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_ERROR_ROWS = 100
+# Каталог шардов параллельного импорта: должен быть общим для всех воркеров Celery
+IMPORT_SHARD_ROOT = None
+# Скачивание прайса по ссылке: размер куска (байт) и таймауты соединения и чтения (сек)
+IMPORT_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+IMPORT_DOWNLOAD_TIMEOUT = (10, 300)
+
+# Как часто (сек) сохранять прогресс задачи импорта
+IMPORT_PROGRESS_INTERVAL = 1.0
+
+# Хранилище загруженных прайсов (общий диск веб-сервера и воркеров Celery)
+IMPORT_UPLOAD_ROOT = os.path.join(BASE_DIR, 'uploads')
+# Сколько (сек) хранятся брошенные загрузки и прайсы без ссылок на них (очищает cleanup_uploads_task)
+IMPORT_UPLOAD_RETENTION = 24 * 60 * 60
+
+# Каталог товаров: размер страницы по умолчанию и максимальный page_size
+PRODUCTS_PAGE_SIZE = 20
+PRODUCTS_MAX_PAGE_SIZE = 100
+# Ленты заказов (покупателя и магазина): размер страницы по умолчанию и максимальный page_size
+ORDERS_PAGE_SIZE = 20
+ORDERS_MAX_PAGE_SIZE = 100
+# Сколько значений каждого параметра отдавать в счетчиках фильтров каталога
+CATALOG_FACET_LIMIT = 50
+# Поиск по названию: сколько лучших совпадений отдавать и порог похожести триграмм (PostgreSQL)
+CATALOG_SEARCH_LIMIT = 1000
+CATALOG_SEARCH_SIMILARITY = 0.3
+# Кэш JSON-фрагментов карточек каталога и время их жизни (сек)
+CATALOG_FRAGMENT_CACHE = 'default'
+CATALOG_FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+# Выгрузка каталога и заказов партнера: строк из курсора базы за раз
+EXPORT_CHUNK_SIZE = 2000
+
+# Хранилище корзин: 'database' - каждая правка пишется в базу, 'cache' - корзина живет
+# в кэше BASKET_CACHE и пишется в базу при оформлении и задачей flush_baskets_task
+BASKET_BACKEND = 'database'
+BASKET_CACHE = 'default'
+# Сколько корзина живет в кэше без изменений (сек)
+BASKET_TIMEOUT = 7 * 24 * 60 * 60
+
+# Резерв товара подтвержденного заказа: сколько держится до приема магазином (сек)
+# и сколько просроченных заказов отменяется за проход release_expired_reservations_task
+RESERVATION_TTL = 30 * 60
+RESERVATION_EXPIRE_BATCH = 500
+
 
 BATON = {
     'SITE_HEADER': 'Netology PD Diploma Admin',